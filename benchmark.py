@@ -0,0 +1,409 @@
+from universe.world import World
+from universe.pheromone import Pheromone
+from universe.actions import Move
+import lib.computations as compute
+from lib.location import Location
+from lib.orientation import Orientation
+from lib.rlocation import RadialLocation
+
+import argparse
+import collections
+import gc
+import heapq
+import json
+import math
+import os
+import platform
+import random as rand
+import statistics
+import sys
+import time
+
+MS_PER_TICK = 100.0
+WARMUP_TICKS = 5
+MEASURED_TICKS = 30
+ANT_SPAWN_PERIOD = 10
+FOOD_MIN_DISTANCE_TO_NEST = 125.0
+FOOD_MIN_DISTANCE_TO_WORLD_EDGE = 5.0
+MAX_MOVE_DURATION_IN_SEC = 1.0
+REGRESSION_THRESHOLD = 0.1
+
+# Every scaling case starts from the base scenario and changes a single axis
+BASE_SCENARIO = {'ants': 24, 'pheromones': 0, 'size': 480, 'food': 3}
+DEFAULT_AXES = {'ants': [24, 240, 2400, 10000],
+                'pheromones': [0, 10000, 100000],
+                'size': [480, 1024, 2048, 4096],
+                'food': [3, 30, 300]}
+# Random points in a 1000 x 1000 square, as in the usual uniform TSP instances
+GRAPH_ACO_SIZES = [100, 200, 500, 1000]
+GRAPH_ACO_ITERATIONS = 20
+GRAPH_ACO_NEIGHBOURS = 8
+# Worlds per EnsembleWorld, each as the default headless colony; the first minute is not measured so that every world
+# has its ants out and trails laid
+ENSEMBLE_SIZES = [1, 16, 64, 128]
+ENSEMBLE_WARMUP_TICKS = 600
+# Scenarios whose constructor calls per tick are counted
+ALLOCATION_SCENARIOS = {'ants=240,pheromones=10000': {'ants': 240, 'pheromones': 10000, 'size': 480, 'food': 3}}
+
+
+def create_world(engine, ants, pheromones, size, food, seed):
+    rng = rand.Random(seed)
+    food_min_dist_to_nest = min(FOOD_MIN_DISTANCE_TO_NEST, 0.25 * size)
+    if engine == 'vectorized':
+        # Imported here so that numpy is only needed for the vectorized engine
+        from universe.vectorizedworld import VectorizedWorld
+        world = VectorizedWorld(size, size, ants, ANT_SPAWN_PERIOD, food, food_min_dist_to_nest,
+                                FOOD_MIN_DISTANCE_TO_WORLD_EDGE, MAX_MOVE_DURATION_IN_SEC, seed=seed)
+        num_placed = ants - 1  # The first ant waits in the nest
+        world.add_ants([rng.uniform(10.0, size - 10.0) for _ in range(num_placed)],
+                       [rng.uniform(10.0, size - 10.0) for _ in range(num_placed)],
+                       [rng.uniform(0.0, 2.0 * math.pi) for _ in range(num_placed)])
+        for _ in range(pheromones):
+            pheromone_type = rng.choice((Pheromone.Type.FOOD, Pheromone.Type.NEST))
+            y, x = rng.randrange(size), rng.randrange(size)
+            world.add_pheromones(pheromone_type, [x], [y], [rng.uniform(0.5, 1.0)])
+        return world
+    world = World(size, size, ants, ANT_SPAWN_PERIOD, food, food_min_dist_to_nest,
+                  FOOD_MIN_DISTANCE_TO_WORLD_EDGE, MAX_MOVE_DURATION_IN_SEC,
+                  use_pheromone_field=(engine == 'field'), seed=seed)
+    nest = next(iter(world.get_nests()))
+    for _ in range(ants - 1):
+        world.add_ant(nest.create_ant(), Orientation(rng.uniform(10.0, size - 10.0),
+                                                     rng.uniform(10.0, size - 10.0),
+                                                     rng.uniform(0.0, 2.0 * math.pi)))
+    config = world.get_config()
+    decay_factors = {Pheromone.Type.FOOD: config.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC,
+                     Pheromone.Type.NEST: config.ANT_NEST_PHEROMONE_DECAY_FACTOR_PER_SEC}
+    for _ in range(pheromones):
+        pheromone_type = rng.choice((Pheromone.Type.FOOD, Pheromone.Type.NEST))
+        world.add_pheromone(Pheromone(pheromone_type, None, decay_factors[pheromone_type], rng.uniform(0.5, 1.0)),
+                            Location(rng.uniform(0.0, size - 1.0), rng.uniform(0.0, size - 1.0)))
+    return world
+
+
+def summarize_latencies(latencies_in_sec, unit):
+    total = sum(latencies_in_sec)
+    summary = {'rate': len(latencies_in_sec) / total if 0.0 < total else math.inf,
+               'unit': unit,
+               'samples': len(latencies_in_sec),
+               'mean_ms': 1000.0 * statistics.fmean(latencies_in_sec),
+               'max_ms': 1000.0 * max(latencies_in_sec)}
+    if 2 <= len(latencies_in_sec):
+        percentiles = statistics.quantiles(latencies_in_sec, n=100, method='inclusive')
+        summary['p50_ms'] = 1000.0 * percentiles[49]
+        summary['p90_ms'] = 1000.0 * percentiles[89]
+        summary['p99_ms'] = 1000.0 * percentiles[98]
+    return summary
+
+
+def time_calls(function, arguments):
+    latencies = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def benchmark_world_update(engine, scenario, num_ticks, seed):
+    world = create_world(engine, seed=seed, **scenario)
+    context = {}
+    for _ in range(WARMUP_TICKS):
+        world.update(MS_PER_TICK, context)
+    latencies = time_calls(lambda _: world.update(MS_PER_TICK, context), range(num_ticks))
+    return summarize_latencies(latencies, 'ticks/s')
+
+
+def run_scaling_benchmarks(engine, axes, num_ticks, seed, results):
+    for axis, values in axes.items():
+        for value in values:
+            scenario = dict(BASE_SCENARIO)
+            scenario[axis] = value
+            name = 'world_update/{}/{}={}'.format(engine, axis, value)
+            print('running {}'.format(name), file=sys.stderr, flush=True)
+            results[name] = benchmark_world_update(engine, scenario, num_ticks, seed)
+            results[name]['scenario'] = scenario
+
+
+def run_micro_benchmarks(num_ticks, seed, results):
+    # A crowded World with many live pheromones, so that sensing has plenty to look at
+    size = 480
+    world = create_world('world', ants=240, pheromones=50000, size=size, food=3, seed=seed)
+    for _ in range(WARMUP_TICKS):
+        world.update(MS_PER_TICK, {})
+    ants = list(world.get_ants())
+    sensing_range = world.get_config().ANT_SENSING_RANGE
+
+    def create_sensable_region(ant):
+        return world._create_sensable_region(world.get_drawing_context(ant)[Orientation], sensing_range, ant,
+                                             ant.get_sensing_query())
+
+    name = 'micro/world_create_sensable_region'
+    print('running {}'.format(name), file=sys.stderr, flush=True)
+    results[name] = summarize_latencies(time_calls(create_sensable_region, ants * num_ticks), 'calls/s')
+
+    regions = [(ant, create_sensable_region(ant)) for ant in ants]
+
+    def calculate_heading_delta(ant_and_region):
+        ant, region = ant_and_region
+        # An ant's sensing query names its current target and target pheromone
+        sensing_query = ant.get_sensing_query()
+        ant._calculate_heading_delta(region, sensing_query.all_around_categories[0],
+                                     sensing_query.forward_categories[0])
+
+    name = 'micro/ant_calculate_heading_delta'
+    print('running {}'.format(name), file=sys.stderr, flush=True)
+    results[name] = summarize_latencies(time_calls(calculate_heading_delta, regions * num_ticks), 'calls/s')
+
+    rng = rand.Random(seed)
+    line_ends = [(Location(rng.uniform(0.0, size), rng.uniform(0.0, size)),
+                  Location(rng.uniform(0.0, size), rng.uniform(0.0, size))) for _ in range(1000)]
+    name = 'micro/computations_heading_of_line'
+    print('running {}'.format(name), file=sys.stderr, flush=True)
+    # Single calls are too short to time one by one, so each sample is a batch of 1000 calls
+    batch_latencies = time_calls(lambda _: [compute.heading_of_line(start, end) for start, end in line_ends],
+                                 range(10 * num_ticks))
+    results[name] = summarize_latencies([latency / len(line_ends) for latency in batch_latencies], 'calls/s')
+
+    run_view_benchmarks(world, size, num_ticks, results)
+
+
+def run_view_benchmarks(world, size, num_ticks, results):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        import pygame
+        from graphics.view import View
+    except ImportError:
+        print('skipping view benchmarks: pygame is not installed', file=sys.stderr)
+        return
+    pygame.init()
+    try:
+        surface = pygame.Surface((size, size))
+        view = View(surface, world)
+        name = 'micro/view_update'
+        print('running {}'.format(name), file=sys.stderr, flush=True)
+        results[name] = summarize_latencies(time_calls(lambda _: view.update(), range(num_ticks)), 'frames/s')
+        name = 'micro/view_draw'
+        print('running {}'.format(name), file=sys.stderr, flush=True)
+        results[name] = summarize_latencies(time_calls(lambda _: view.draw(), range(num_ticks)), 'frames/s')
+    finally:
+        pygame.quit()
+
+
+def create_graph_instance(num_nodes, seed):
+    # Imported here so that numpy is only needed for the graph benchmarks
+    import numpy as np
+    from universe.graphaco import euclidean_distances
+    rng = np.random.default_rng(seed)
+    return euclidean_distances(rng.uniform(0.0, 1000.0, num_nodes), rng.uniform(0.0, 1000.0, num_nodes))
+
+
+def find_shortest_path_length(distances, source, target):
+    # Dijkstra, to know how far the colony is off
+    lengths = {source: 0.0}
+    queue = [(0.0, source)]
+    while queue:
+        length, node = heapq.heappop(queue)
+        if node == target:
+            return length
+        if lengths[node] < length:
+            continue
+        for neighbour, edge_length in enumerate(distances[node].tolist()):
+            if neighbour != node and length + edge_length < lengths.get(neighbour, math.inf):
+                lengths[neighbour] = length + edge_length
+                heapq.heappush(queue, (length + edge_length, neighbour))
+    return math.inf
+
+
+def run_graph_aco_benchmarks(sizes, num_iterations, seed, results):
+    # Time per iteration of the graph colonies, and how good their best solution is after num_iterations compared to
+    # the nearest neighbour tour and to the exact shortest path
+    import numpy as np
+    from universe.graphaco import TspColony, ShortestPathColony, nearest_neighbour_tour
+    for num_nodes in sizes:
+        distances = create_graph_instance(num_nodes, seed)
+        name = 'graph_aco/tsp/nodes={}'.format(num_nodes)
+        print('running {}'.format(name), file=sys.stderr, flush=True)
+        colony = TspColony(distances, seed=seed)
+        results[name] = summarize_latencies(time_calls(lambda _: colony.step(), range(num_iterations)),
+                                            'iterations/s')
+        results[name]['best_length'] = colony.get_best_length()
+        results[name]['nearest_neighbour_length'] = colony.get_path_length(nearest_neighbour_tour(distances))
+        # From node 0 to the node furthest from it, with only the nearest neighbours of every node connected so that
+        # paths have to find their way across
+        target = int(np.argmax(distances[0]))
+        far = np.argsort(distances, axis=1)[:, GRAPH_ACO_NEIGHBOURS + 1:]
+        np.put_along_axis(distances, far, math.inf, axis=1)
+        distances = np.minimum(distances, distances.T)
+        name = 'graph_aco/shortest_path/nodes={}'.format(num_nodes)
+        print('running {}'.format(name), file=sys.stderr, flush=True)
+        colony = ShortestPathColony(distances, 0, target, seed=seed)
+        results[name] = summarize_latencies(time_calls(lambda _: colony.step(), range(num_iterations)),
+                                            'iterations/s')
+        results[name]['best_length'] = colony.get_best_length()
+        results[name]['shortest_length'] = find_shortest_path_length(distances, 0, target)
+
+
+def run_ensemble_benchmarks(sizes, num_ticks, seed, results):
+    # Time per simulated tick of one world, whether it runs alone (size 1) or in a batch
+    from universe.ensembleworld import EnsembleWorld
+    import headless
+    for num_worlds in sizes:
+        name = 'ensemble/worlds={}'.format(num_worlds)
+        print('running {}'.format(name), file=sys.stderr, flush=True)
+        world = EnsembleWorld(seeds=range(seed, seed + num_worlds), **headless.get_default_world_parameters())
+        for _ in range(ENSEMBLE_WARMUP_TICKS):
+            world.update(MS_PER_TICK, {})
+        latencies = time_calls(lambda _: world.update(MS_PER_TICK, {}), range(num_ticks))
+        results[name] = summarize_latencies([latency / num_worlds for latency in latencies], 'world-ticks/s')
+
+
+def measure_allocations(engine, scenario, num_ticks, seed):
+    # Counts the objects constructed per tick by class, through the __init__ calls the profiler hook sees,
+    # and the generation 0 garbage collections they cause
+    world = create_world(engine, seed=seed, **scenario)
+    for _ in range(WARMUP_TICKS):
+        world.update(MS_PER_TICK, {})
+    constructions = collections.Counter()
+
+    def count_constructions(frame, event, arg):
+        if event == 'call' and frame.f_code.co_name == '__init__':
+            constructions[frame.f_code.co_qualname.rpartition('.')[0]] += 1
+
+    collections_before = gc.get_stats()[0]['collections']
+    sys.setprofile(count_constructions)
+    try:
+        for _ in range(num_ticks):
+            world.update(MS_PER_TICK, {})
+    finally:
+        sys.setprofile(None)
+    return {'constructions_per_tick': {name: count / num_ticks for name, count in constructions.items()},
+            'gc_collections_per_tick': (gc.get_stats()[0]['collections'] - collections_before) / num_ticks}
+
+
+def measure_object_sizes():
+    # Bytes per instance, including the instance dict for classes without __slots__
+    objects = {'Location': Location(0.0, 0.0),
+               'Orientation': Orientation(0.0, 0.0, 0.0),
+               'RadialLocation': RadialLocation(0.0, 0.0),
+               'Pheromone': Pheromone(Pheromone.Type.FOOD, None, 0.985, 1.0),
+               'Move': Move(0.0, 0.0)}
+    sizes = {}
+    for name, world_object in objects.items():
+        sizes[name] = sys.getsizeof(world_object)
+        if hasattr(world_object, '__dict__'):
+            sizes[name] += sys.getsizeof(world_object.__dict__)
+    return sizes
+
+
+def run_allocation_benchmarks(engine, num_ticks, seed, allocations):
+    for scenario_name, scenario in ALLOCATION_SCENARIOS.items():
+        name = 'allocations/{}/{}'.format(engine, scenario_name)
+        print('running {}'.format(name), file=sys.stderr, flush=True)
+        allocations[name] = measure_allocations(engine, scenario, num_ticks, seed)
+    allocations['object_sizes_in_bytes'] = measure_object_sizes()
+
+
+def print_allocations(allocations):
+    for name, allocation in sorted(allocations.items()):
+        if name == 'object_sizes_in_bytes':
+            for class_name, size in sorted(allocation.items()):
+                print('{:60s} {:12d} bytes'.format('size/' + class_name, size))
+            continue
+        print('{:60s} {:12.2f} gc collections/tick'.format(name, allocation['gc_collections_per_tick']))
+        for class_name, count in sorted(allocation['constructions_per_tick'].items(), key=lambda item: -item[1]):
+            print('    {:56s} {:12.1f} constructed/tick'.format(class_name, count))
+
+
+def compare_with_baseline(results, baseline_results, threshold):
+    # A case regresses when its rate drops by more than threshold relative to the baseline
+    regressions = []
+    for name, result in sorted(results.items()):
+        baseline = baseline_results.get(name)
+        if baseline is None:
+            continue
+        change = result['rate'] / baseline['rate'] - 1.0
+        marker = 'REGRESSION' if change < -threshold else ''
+        print('{:60s} {:12.1f} {:12.1f} {:+7.1%} {}'.format(name, baseline['rate'], result['rate'], change, marker))
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def parse_axis(text):
+    name, _, values = text.partition('=')
+    if name not in DEFAULT_AXES or not values:
+        raise argparse.ArgumentTypeError('expected one of {} as NAME=V1,V2'.format(', '.join(DEFAULT_AXES)))
+    return name, [int(value) for value in values.split(',')]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark World.update scaling and the simulation hot paths.')
+    parser.add_argument('--engine', choices=('world', 'field', 'vectorized'), default='world',
+                        help='World with Pheromone objects, World with a PheromoneField, or VectorizedWorld')
+    parser.add_argument('--axis', type=parse_axis, action='append', default=None, metavar='NAME=V1,V2',
+                        help='only run these axis values (names: {}); may be repeated'.format(', '.join(DEFAULT_AXES)))
+    parser.add_argument('--ticks', type=int, default=MEASURED_TICKS, help='measured ticks per case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-scaling', action='store_true')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--skip-allocations', action='store_true')
+    parser.add_argument('--graph-aco', action='store_true',
+                        help='also benchmark the graph colonies of universe/graphaco.py (requires numpy)')
+    parser.add_argument('--graph-aco-sizes', type=int, nargs='+', default=GRAPH_ACO_SIZES, metavar='NODES')
+    parser.add_argument('--graph-aco-iterations', type=int, default=GRAPH_ACO_ITERATIONS,
+                        help='measured iterations per graph (default: %(default)s)')
+    parser.add_argument('--ensemble', action='store_true',
+                        help='also benchmark universe/ensembleworld.py at several batch sizes (requires numpy)')
+    parser.add_argument('--ensemble-sizes', type=int, nargs='+', default=ENSEMBLE_SIZES, metavar='WORLDS')
+    parser.add_argument('--output', default=None, help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='relative slowdown that counts as a regression (default: %(default)s)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = {}
+    if not args.skip_scaling:
+        axes = dict(args.axis) if args.axis is not None else DEFAULT_AXES
+        run_scaling_benchmarks(args.engine, axes, args.ticks, args.seed, results)
+    if not args.skip_micro:
+        run_micro_benchmarks(args.ticks, args.seed, results)
+    if args.graph_aco:
+        run_graph_aco_benchmarks(args.graph_aco_sizes, args.graph_aco_iterations, args.seed, results)
+    if args.ensemble:
+        run_ensemble_benchmarks(args.ensemble_sizes, args.ticks, args.seed, results)
+    allocations = {}
+    if not args.skip_allocations and args.engine != 'vectorized':
+        run_allocation_benchmarks(args.engine, args.ticks, args.seed, allocations)
+    report = {'meta': {'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'ticks': args.ticks,
+                       'seed': args.seed},
+              'results': results,
+              'allocations': allocations}
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    for name, result in sorted(results.items()):
+        print('{:60s} {:12.1f} {:8s} p50 {:8.3f} ms  p99 {:8.3f} ms'.format(
+            name, result['rate'], result['unit'], result.get('p50_ms', result['mean_ms']),
+            result.get('p99_ms', result['max_ms'])))
+        if 'best_length' in result:
+            reference = result.get('nearest_neighbour_length', result.get('shortest_length'))
+            print('    {:56s} {:12.1f} best, {:.1f} reference'.format('', result['best_length'], reference))
+    print_allocations(allocations)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline_results = json.load(baseline_file)['results']
+        regressions = compare_with_baseline(results, baseline_results, args.threshold)
+        if regressions:
+            print('{} case(s) regressed by more than {:.0%}'.format(len(regressions), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
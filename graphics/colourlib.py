@@ -6,3 +6,4 @@ class Colours:
     GREEN = (0, 255, 0)
     BLUE = (0, 0, 255)
     BROWN = (200, 100, 0)
+    MAGENTA = (255, 0, 255)
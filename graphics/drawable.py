@@ -9,6 +9,7 @@ class Drawable:
         NEST = 3
         NEST_PHEROMONE = 4
         FOOD_PHEROMONE = 5
+        PHEROMONE_RASTER = 6
 
     def __init__(self, object_represented, drawable_type, drawing_context):
         self._object_represented = object_represented
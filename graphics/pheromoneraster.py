@@ -0,0 +1,82 @@
+from .colourlib import Colours
+import universe.constants as const
+
+import numpy as np
+import pygame
+import pygame.surfarray
+
+
+class PheromoneRaster:
+    # Pixels without any pheromone get this colour, which is keyed out when the raster is blitted
+    _TRANSPARENT_COLOUR = Colours.MAGENTA
+    # Even the weakest pheromone still drawn is moved at least this far from the background towards its colour
+    _MIN_COLOUR_WEIGHT = 0.25
+
+    def __init__(self, width, height, background_colour, colours_by_type):
+        self._width = width
+        self._height = height
+        self._BACKGROUND_COLOUR = np.array(background_colour, dtype=np.float32)
+        self._COLOURS_BY_TYPE = {pheromone_type: np.array(colour, dtype=np.float32)
+                                 for pheromone_type, colour in colours_by_type.items()}
+        self._FULL_COLOUR_INTENSITY = const.ANT_MAX_PHEROMONE_INTENSITY
+        self._MIN_INTENSITY = const.ANT_MIN_PHEROMONE_INTENSITY
+        # Everything below is indexed [x, y] like pygame.surfarray
+        self._colours = np.empty((width, height, 3), dtype=np.float32)
+        self._covered = np.zeros((width, height), dtype=bool)
+        self._pixels = np.empty((width, height, 3), dtype=np.uint8)
+        self._pixels[...] = self._TRANSPARENT_COLOUR
+        # Flat indices of the pixels that are not transparent
+        self._painted = np.empty(0, dtype=np.intp)
+        self._surface = pygame.Surface((width, height))
+        self._surface.set_colorkey(self._TRANSPARENT_COLOUR)
+
+    def get_surface(self):
+        return self._surface
+
+    def render_samples(self, samples_by_type):
+        # samples_by_type maps a pheromone type to (xs, ys, intensities) of its deposits. Deposits only cover a small
+        # part of the raster, so only their pixels are coloured, and only the ones painted last time are cleared.
+        num_pixels = self._width * self._height
+        intensities_by_type = {}
+        for pheromone_type, (xs, ys, intensities) in samples_by_type.items():
+            if len(intensities) == 0:
+                continue
+            xs = np.clip(np.asarray(xs, dtype=np.float64).astype(np.intp), 0, self._width - 1)
+            ys = np.clip(np.asarray(ys, dtype=np.float64).astype(np.intp), 0, self._height - 1)
+            # Deposits that fall into the same pixel add up, like they would on a PheromoneField
+            intensities_by_type[pheromone_type] = np.bincount(xs * self._height + ys, weights=intensities,
+                                                              minlength=num_pixels)
+        covered = np.zeros(num_pixels, dtype=bool)
+        for pixel_intensities in intensities_by_type.values():
+            covered |= self._MIN_INTENSITY <= pixel_intensities
+        covered = np.flatnonzero(covered)
+        colours = np.empty((len(covered), 3), dtype=np.float32)
+        colours[...] = self._BACKGROUND_COLOUR
+        for pheromone_type, pixel_intensities in intensities_by_type.items():
+            self._paint(pheromone_type, pixel_intensities[covered].astype(np.float32), colours)
+        pixels = self._pixels.reshape(-1, 3)
+        pixels[self._painted] = self._TRANSPARENT_COLOUR
+        pixels[covered] = colours
+        self._painted = covered
+        pygame.surfarray.blit_array(self._surface, self._pixels)
+
+    def render_grids(self, grids_by_type):
+        # grids_by_type maps a pheromone type to an intensity grid indexed [y, x], as PheromoneField keeps them
+        self._colours[...] = self._BACKGROUND_COLOUR
+        self._covered.fill(False)
+        for pheromone_type, grid in grids_by_type.items():
+            intensities = grid.T
+            self._covered |= self._MIN_INTENSITY <= intensities
+            self._paint(pheromone_type, intensities, self._colours)
+        self._pixels[...] = self._colours
+        self._pixels[~self._covered] = self._TRANSPARENT_COLOUR
+        self._painted = np.flatnonzero(self._covered)
+        pygame.surfarray.blit_array(self._surface, self._pixels)
+
+    def _paint(self, pheromone_type, intensities, colours):
+        # Blends colours towards the pheromone's colour wherever intensities are visible
+        visible = self._MIN_INTENSITY <= intensities
+        weights = np.clip(intensities[visible] / self._FULL_COLOUR_INTENSITY, self._MIN_COLOUR_WEIGHT, 1.0)
+        visible_colours = colours[visible]
+        visible_colours += weights[:, np.newaxis] * (self._COLOURS_BY_TYPE[pheromone_type] - visible_colours)
+        colours[visible] = visible_colours
@@ -15,7 +15,8 @@ class Renderer:
                               Drawable.Type.NEST: self._draw_nest,
                               Drawable.Type.FOOD: self._draw_food,
                               Drawable.Type.FOOD_PHEROMONE: self._draw_pheromone,
-                              Drawable.Type.NEST_PHEROMONE: self._draw_pheromone}
+                              Drawable.Type.NEST_PHEROMONE: self._draw_pheromone,
+                              Drawable.Type.PHEROMONE_RASTER: self._draw_pheromone_raster}
 
     def draw(self, drawable_item):
         self._draw_methods[drawable_item.get_type()](drawable_item.get_desired_colour(),
@@ -55,3 +56,6 @@ class Renderer:
     def _draw_pheromone(self, colour, drawing_context):
         location = drawing_context[Location]
         pygame.draw.line(self._drawing_surface, colour, (location.x, location.y), (location.x, location.y), 1)
+
+    def _draw_pheromone_raster(self, colour, drawing_context):
+        self._drawing_surface.blit(drawing_context['surface'], (0, 0))
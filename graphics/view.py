@@ -1,7 +1,14 @@
 from .drawable import Drawable
 from .renderer import Renderer
+from .colourlib import Colours
 from universe.pheromone import Pheromone
 
+try:
+    from .pheromoneraster import PheromoneRaster
+except ImportError:
+    # Without numpy every pheromone is drawn on its own
+    PheromoneRaster = None
+
 
 class View:
     _ANT_LAYER_INDEX = 3
@@ -17,6 +24,16 @@ class View:
         self._drawable_layers[self._MAP_LAYER_INDEX].append(Drawable(world_map, Drawable.Type.WORLD, None))
         self._pheromone_type_to_drawable_type_map = {Pheromone.Type.FOOD: Drawable.Type.FOOD_PHEROMONE,
                                                      Pheromone.Type.NEST: Drawable.Type.NEST_PHEROMONE}
+        self._pheromone_raster = None
+        if PheromoneRaster is not None:
+            width, height = self._drawing_surface.get_size()
+            self._pheromone_raster = PheromoneRaster(width, height, Colours.LIGHT_GREY,
+                                                     {Pheromone.Type.FOOD: Colours.RED,
+                                                      Pheromone.Type.NEST: Colours.GREEN})
+            # The whole pheromone layer is a single image, blitted once per frame
+            self._drawable_layers[self._PHEROMONE_LAYER_INDEX].append(
+                Drawable(self._pheromone_raster, Drawable.Type.PHEROMONE_RASTER,
+                         {'surface': self._pheromone_raster.get_surface()}))
 
     def draw(self):
         for layer in self._drawable_layers:
@@ -26,7 +43,6 @@ class View:
     def update(self):
         self._drawable_layers[self._WORLD_OBJECT_LAYER_INDEX].clear()
         self._drawable_layers[self._ANT_LAYER_INDEX].clear()
-        self._drawable_layers[self._PHEROMONE_LAYER_INDEX].clear()
         for nest in self._world_map.get_nests():
             drawable_nest = Drawable(nest, Drawable.Type.NEST, self._world_map.get_drawing_context(nest))
             self._drawable_layers[self._WORLD_OBJECT_LAYER_INDEX].append(drawable_nest)
@@ -37,7 +53,23 @@ class View:
             drawable_food_source = Drawable(food_source, Drawable.Type.FOOD,
                                             self._world_map.get_drawing_context(food_source))
             self._drawable_layers[self._WORLD_OBJECT_LAYER_INDEX].append(drawable_food_source)
+        if self._pheromone_raster is not None:
+            self._update_pheromone_raster()
+        else:
+            self._update_pheromone_drawables()
+
+    def _update_pheromone_drawables(self):
+        self._drawable_layers[self._PHEROMONE_LAYER_INDEX].clear()
         for pheromone in self._world_map.get_pheromones():
             drawable_pheromone = Drawable(pheromone, self._pheromone_type_to_drawable_type_map[pheromone.get_type()],
                                           self._world_map.get_drawing_context(pheromone))
             self._drawable_layers[self._PHEROMONE_LAYER_INDEX].append(drawable_pheromone)
+
+    def _update_pheromone_raster(self):
+        pheromone_field = self._world_map.get_pheromone_field()
+        if pheromone_field is not None:
+            self._pheromone_raster.render_grids({pheromone_type: pheromone_field.get_grid(pheromone_type)
+                                                 for pheromone_type in pheromone_field.get_types()})
+        else:
+            self._pheromone_raster.render_samples({pheromone_type: self._world_map.get_pheromone_samples(pheromone_type)
+                                                   for pheromone_type in self._pheromone_type_to_drawable_type_map})
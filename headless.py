@@ -0,0 +1,199 @@
+from universe.world import World
+from universe.simulation import Simulation
+from universe.checkpoint import save_world, load_world
+from universe.instrumentation import Instrumentation
+from universe.colonymetrics import ColonyMetrics, StableMetric
+from lib.bitmap import find_dark_pixels
+
+import argparse
+
+MS_PER_TICK = 100.0
+NUM_TICKS = 6000
+WIDTH = 480
+HEIGHT = 480
+NUM_ANTS_TO_SPAWN = 24
+ANT_SPAWN_PERIOD = 10
+NUM_FOOD_SOURCES = 3
+FOOD_MIN_DISTANCE_TO_NEST = 125.0
+FOOD_MIN_DISTANCE_TO_WORLD_EDGE = 5.0
+MAX_MOVE_DURATION_IN_SEC = 1.0
+INSTRUMENTATION_DUMP_PERIOD = 100
+RECORDING_CHUNK_TICKS = 600
+STABLE_METRICS = (ColonyMetrics.Metric.DELIVERY_RATE,
+                  ColonyMetrics.Metric.TRAIL_CONCENTRATION,
+                  ColonyMetrics.Metric.MEAN_ROUND_TRIP_LENGTH)
+STABILITY_TOLERANCE = 0.05
+STABILITY_MINUTES = 2.0
+
+
+def get_default_world_parameters():
+    # The World arguments above by name, for tools that create worlds from keyword arguments
+    return {'width': WIDTH,
+            'height': HEIGHT,
+            'num_ants_to_spawn': NUM_ANTS_TO_SPAWN,
+            'ant_spawn_period': ANT_SPAWN_PERIOD,
+            'num_food_sources': NUM_FOOD_SOURCES,
+            'food_min_dist_to_nest': FOOD_MIN_DISTANCE_TO_NEST,
+            'food_min_dist_to_world_edge': FOOD_MIN_DISTANCE_TO_WORLD_EDGE,
+            'max_move_duration_in_sec': MAX_MOVE_DURATION_IN_SEC}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the ant colony simulation without a display.')
+    parser.add_argument('--ticks', type=int, default=NUM_TICKS,
+                        help='number of simulation ticks to run (default: %(default)s)')
+    parser.add_argument('--ms-per-tick', type=float, default=MS_PER_TICK,
+                        help='simulated milliseconds per tick (default: %(default)s)')
+    parser.add_argument('--max-wall-seconds', type=float, default=None,
+                        help='stop early once this much wall clock time has passed')
+    parser.add_argument('--width', type=int, default=WIDTH)
+    parser.add_argument('--height', type=int, default=HEIGHT)
+    parser.add_argument('--ants', type=int, default=NUM_ANTS_TO_SPAWN)
+    parser.add_argument('--food-sources', type=int, default=NUM_FOOD_SOURCES)
+    parser.add_argument('--pheromone-field', action='store_true',
+                        help='store pheromones in dense per-type intensity grids (requires numpy)')
+    parser.add_argument('--chunk-size', type=int, default=None, metavar='CELLS',
+                        help='split the pheromone grids into lazily created chunks of this size, so memory follows '
+                             'occupancy rather than area (implies --pheromone-field)')
+    parser.add_argument('--max-pheromones', type=int, default=None, metavar='COUNT',
+                        help='keep at most this many pheromones, making room for new deposits as --pheromone-overflow '
+                             'says')
+    parser.add_argument('--pheromone-overflow', default=World.PheromoneOverflow.EVICT_WEAKEST,
+                        choices=(World.PheromoneOverflow.EVICT_WEAKEST, World.PheromoneOverflow.MERGE),
+                        help='drop the pheromone that expires soonest, or first try to add the deposit to one in the '
+                             'same cell (default: %(default)s)')
+    parser.add_argument('--ant-collisions', action='store_true',
+                        help='ants avoid and cannot walk through each other')
+    parser.add_argument('--obstacles', default=None, metavar='IMAGE',
+                        help='PNG or netpbm image whose dark pixels are walls, one pixel per world unit')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='simulate the colony with the NumPy structure-of-arrays engine')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the world\'s random generator')
+    parser.add_argument('--resume', default=None, metavar='PATH',
+                        help='continue from a checkpoint instead of creating a new world')
+    parser.add_argument('--checkpoint', default=None, metavar='PATH',
+                        help='save the world here when the run ends (and periodically with --checkpoint-every)')
+    parser.add_argument('--checkpoint-every', type=int, default=None, metavar='TICKS',
+                        help='also save the checkpoint every this many ticks')
+    parser.add_argument('--instrument', default=None, metavar='PATH',
+                        help='time the phases of World.update and append per-period JSON lines to this file')
+    parser.add_argument('--instrument-every', type=int, default=INSTRUMENTATION_DUMP_PERIOD, metavar='TICKS',
+                        help='ticks summed up per instrumentation line (default: %(default)s)')
+    parser.add_argument('--record', default=None, metavar='PATH',
+                        help='record ant trajectories and pheromone and nest events to this file (requires numpy)')
+    parser.add_argument('--record-chunk-ticks', type=int, default=RECORDING_CHUNK_TICKS, metavar='TICKS',
+                        help='ticks per compressed chunk of the recording (default: %(default)s)')
+    parser.add_argument('--metrics', action='store_true',
+                        help='keep convergence metrics (delivery rate, round trips, trail concentration) '
+                             'and print them')
+    parser.add_argument('--until-stable', default=None, choices=STABLE_METRICS, metavar='METRIC',
+                        help='stop once METRIC has settled, with --ticks as the limit (implies --metrics); one of '
+                             '{}'.format(', '.join(STABLE_METRICS)))
+    parser.add_argument('--stability-tolerance', type=float, default=STABILITY_TOLERANCE,
+                        help='relative change that still counts as stable (default: %(default)s)')
+    parser.add_argument('--stability-minutes', type=float, default=STABILITY_MINUTES,
+                        help='simulated minutes the metric has to stay stable (default: %(default)s)')
+    return parser.parse_args()
+
+
+def create_world(args):
+    if args.resume is not None:
+        return load_world(args.resume)
+    if args.vectorized:
+        if args.obstacles is not None or args.ant_collisions or args.max_pheromones is not None or \
+           args.pheromone_field or args.chunk_size is not None:
+            raise SystemExit('--obstacles, --ant-collisions, --max-pheromones, --pheromone-field and --chunk-size are '
+                             'only supported by World')
+        # Imported here so that numpy is only needed for the vectorized engine
+        from universe.vectorizedworld import VectorizedWorld
+        return VectorizedWorld(args.width, args.height, args.ants, ANT_SPAWN_PERIOD,
+                               args.food_sources, FOOD_MIN_DISTANCE_TO_NEST, FOOD_MIN_DISTANCE_TO_WORLD_EDGE,
+                               MAX_MOVE_DURATION_IN_SEC, seed=args.seed)
+    if args.max_pheromones is not None and (args.pheromone_field or args.chunk_size is not None):
+        raise SystemExit('--max-pheromones can\'t be combined with the pheromone field')
+    return World(args.width, args.height, args.ants, ANT_SPAWN_PERIOD,
+                 args.food_sources, FOOD_MIN_DISTANCE_TO_NEST, FOOD_MIN_DISTANCE_TO_WORLD_EDGE,
+                 MAX_MOVE_DURATION_IN_SEC, use_pheromone_field=args.pheromone_field or args.chunk_size is not None,
+                 seed=args.seed, chunk_size=args.chunk_size,
+                 obstacle_cells=find_dark_pixels(args.obstacles) if args.obstacles is not None else None,
+                 use_ant_collisions=args.ant_collisions, max_pheromones=args.max_pheromones,
+                 pheromone_overflow=args.pheromone_overflow)
+
+
+def main():
+    args = parse_args()
+    world = create_world(args)
+    instrumentation = None
+    if args.instrument is not None:
+        if not hasattr(world, 'set_instrumentation'):
+            raise SystemExit('--instrument is only supported by World')
+        instrumentation = Instrumentation(args.instrument, args.instrument_every)
+        world.set_instrumentation(instrumentation)
+    recorder = None
+    if args.record is not None:
+        if not hasattr(world, 'set_recorder'):
+            raise SystemExit('--record is only supported by World')
+        # Imported here so that numpy is only needed for recording
+        from universe.trajectory import TrajectoryRecorder
+        recorder = TrajectoryRecorder(args.record, args.record_chunk_ticks)
+        world.set_recorder(recorder)
+    metrics = None
+    stable_metric = None
+    if args.metrics or args.until_stable is not None:
+        if not hasattr(world, 'set_metrics'):
+            raise SystemExit('--metrics and --until-stable are only supported by World')
+        metrics = world.get_metrics()
+        if metrics is None:
+            metrics = ColonyMetrics()
+            world.set_metrics(metrics)
+        if args.until_stable is not None:
+            stable_metric = StableMetric(metrics, args.until_stable, args.stability_tolerance,
+                                         60.0 * args.stability_minutes)
+    simulation = Simulation(world, args.ms_per_tick)
+
+    def stop_condition(sim):
+        if args.max_wall_seconds is not None and args.max_wall_seconds <= sim.get_wall_time_in_sec():
+            return True
+        return stable_metric is not None and stable_metric(sim)
+    ticks_per_run = args.ticks
+    if args.checkpoint is not None and args.checkpoint_every is not None:
+        ticks_per_run = min(args.ticks, args.checkpoint_every)
+    ticks_remaining = args.ticks
+    try:
+        while 0 < ticks_remaining:
+            ticks_requested = min(ticks_per_run, ticks_remaining)
+            ticks_run = simulation.run(ticks_requested, stop_condition)
+            ticks_remaining -= ticks_run
+            if args.checkpoint is not None:
+                save_world(world, args.checkpoint)
+            if ticks_run < ticks_requested:
+                break
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if instrumentation is not None:
+            instrumentation.flush()
+    wall_time = simulation.get_wall_time_in_sec()
+    print('ticks: {}'.format(simulation.get_ticks()))
+    print('simulated seconds: {:.1f}'.format(simulation.get_simulated_time_in_sec()))
+    print('wall seconds: {:.3f}'.format(wall_time))
+    if 0.0 < wall_time:
+        print('ticks/sec: {:.1f}'.format(simulation.get_ticks() / wall_time))
+    if hasattr(world, 'get_num_pheromones'):
+        print('pheromones: {}'.format(world.get_num_pheromones()))
+        print('pheromone memory estimate: {:.1f} MiB'.format(world.get_pheromone_memory_estimate() / 2.0**20))
+    if instrumentation is not None:
+        totals = instrumentation.get_totals()
+        for phase, ms in sorted(totals['phase_times_ms'].items(), key=lambda item: -item[1]):
+            print('{:20s} {:10.1f} ms'.format(phase, ms))
+        for counter, count in sorted(totals['counters'].items()):
+            print('{:20s} {:10d}'.format(counter, count))
+    if stable_metric is not None:
+        print('{} stable: {}'.format(args.until_stable, 'yes' if stable_metric.is_met() else 'no'))
+    if metrics is not None:
+        for name, value in sorted(metrics.get_summary().items()):
+            print('{}: {}'.format(name, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import struct
+import zlib
+
+# Just enough image reading for obstacle maps, without an imaging library: non-interlaced PNG of any colour type and
+# the netpbm formats (PBM, PGM, PPM, plain and raw). Images come back as a list of rows of 0-255 grey levels, with
+# transparent PNG pixels as white.
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_CHANNELS_BY_COLOUR_TYPE = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def read_grey_levels(path):
+    with open(path, 'rb') as image_file:
+        data = image_file.read()
+    if data.startswith(_PNG_SIGNATURE):
+        return _read_png(data)
+    if data[:1] == b'P' and data[1:2] in b'123456':
+        return _read_netpbm(data)
+    raise ValueError('{} is neither a PNG nor a netpbm image'.format(path))
+
+
+def find_dark_pixels(path, threshold=128):
+    # (x, y) of every pixel darker than threshold
+    rows = read_grey_levels(path)
+    return [(x, y) for y, row in enumerate(rows) for x, level in enumerate(row) if level < threshold]
+
+
+def _grey(red, green, blue):
+    return (299 * red + 587 * green + 114 * blue) // 1000
+
+
+def _read_png(data):
+    offset = len(_PNG_SIGNATURE)
+    header = None
+    palette = None
+    transparency = None
+    compressed = bytearray()
+    while offset < len(data):
+        length, chunk_type = struct.unpack_from('>I4s', data, offset)
+        chunk = data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+        if chunk_type == b'IHDR':
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif chunk_type == b'PLTE':
+            palette = [_grey(*chunk[i:i + 3]) for i in range(0, len(chunk) - 2, 3)]
+        elif chunk_type == b'tRNS':
+            transparency = chunk
+        elif chunk_type == b'IDAT':
+            compressed += chunk
+        elif chunk_type == b'IEND':
+            break
+    if header is None:
+        raise ValueError('PNG without a header')
+    width, height, bit_depth, colour_type, _, _, interlace = header
+    if interlace != 0:
+        raise ValueError('Interlaced PNGs are not supported')
+    if colour_type not in _PNG_CHANNELS_BY_COLOUR_TYPE:
+        raise ValueError('Unknown PNG colour type {}'.format(colour_type))
+    channels = _PNG_CHANNELS_BY_COLOUR_TYPE[colour_type]
+    bits_per_pixel = channels * bit_depth
+    row_size = (width * bits_per_pixel + 7) // 8
+    # Filters work on whole bytes, with a distance of one pixel or one byte when pixels are smaller than that
+    filter_distance = max(bits_per_pixel // 8, 1)
+    raw = zlib.decompress(bytes(compressed))
+    previous = bytearray(row_size)
+    rows = []
+    for y in range(height):
+        start = y * (row_size + 1)
+        filter_type = raw[start]
+        row = bytearray(raw[start + 1:start + 1 + row_size])
+        _unfilter(row, previous, filter_type, filter_distance)
+        rows.append(_png_row_to_grey_levels(row, width, bit_depth, colour_type, palette, transparency))
+        previous = row
+    return rows
+
+
+def _unfilter(row, previous, filter_type, distance):
+    if filter_type == 0:
+        return
+    for i in range(len(row)):
+        left = row[i - distance] if distance <= i else 0
+        up = previous[i]
+        if filter_type == 1:
+            row[i] = (row[i] + left) & 0xff
+        elif filter_type == 2:
+            row[i] = (row[i] + up) & 0xff
+        elif filter_type == 3:
+            row[i] = (row[i] + (left + up) // 2) & 0xff
+        elif filter_type == 4:
+            up_left = previous[i - distance] if distance <= i else 0
+            estimate = left + up - up_left
+            d_left = abs(estimate - left)
+            d_up = abs(estimate - up)
+            d_up_left = abs(estimate - up_left)
+            if d_left <= d_up and d_left <= d_up_left:
+                predictor = left
+            elif d_up <= d_up_left:
+                predictor = up
+            else:
+                predictor = up_left
+            row[i] = (row[i] + predictor) & 0xff
+        else:
+            raise ValueError('Unknown PNG filter type {}'.format(filter_type))
+
+
+def _png_row_to_grey_levels(row, width, bit_depth, colour_type, palette, transparency):
+    if bit_depth < 8:
+        # Unpack 1, 2 or 4 bit samples, scaled to 0-255 unless they index the palette
+        per_byte = 8 // bit_depth
+        mask = (1 << bit_depth) - 1
+        samples = [(row[x // per_byte] >> (8 - bit_depth * (x % per_byte + 1))) & mask for x in range(width)]
+        if colour_type == 3:
+            return bytearray(_palette_grey_level(palette, transparency, sample) for sample in samples)
+        return bytearray(sample * 255 // mask for sample in samples)
+    if bit_depth == 16:
+        # Keep the high byte of every sample
+        row = row[::2]
+    channels = _PNG_CHANNELS_BY_COLOUR_TYPE[colour_type]
+    if colour_type == 0:
+        return bytearray(row[:width])
+    if colour_type == 3:
+        return bytearray(_palette_grey_level(palette, transparency, sample) for sample in row[:width])
+    levels = bytearray(width)
+    for x in range(width):
+        pixel = row[x * channels:(x + 1) * channels]
+        level = pixel[0] if colour_type == 4 else _grey(pixel[0], pixel[1], pixel[2])
+        if colour_type in (4, 6) and pixel[-1] < 128:
+            level = 255
+        levels[x] = level
+    return levels
+
+
+def _palette_grey_level(palette, transparency, index):
+    if transparency is not None and index < len(transparency) and transparency[index] < 128:
+        return 255
+    return palette[index]
+
+
+def _read_netpbm(data):
+    magic = data[1:2]
+    fields = []
+    offset = 2
+    num_header_fields = 2 if magic in b'14' else 3
+    # Header fields are separated by whitespace, with comments running from '#' to the end of the line
+    while len(fields) < num_header_fields:
+        while data[offset:offset + 1].isspace():
+            offset += 1
+        if data[offset:offset + 1] == b'#':
+            offset = data.index(b'\n', offset)
+            continue
+        end = offset
+        while end < len(data) and not data[end:end + 1].isspace():
+            end += 1
+        fields.append(int(data[offset:end]))
+        offset = end
+    width, height = fields[0], fields[1]
+    max_value = fields[2] if num_header_fields == 3 else 1
+    if magic in b'123':
+        samples = [int(token) for token in data[offset:].split()] if magic != b'1' else \
+                  [int(bit) for bit in data[offset:].decode('ascii') if bit in '01']
+    else:
+        # A single whitespace byte separates the header from the raster
+        raster = data[offset + 1:]
+        if magic == b'4':
+            row_size = (width + 7) // 8
+            samples = [(raster[y * row_size + x // 8] >> (7 - x % 8)) & 1 for y in range(height) for x in range(width)]
+        elif max_value < 256:
+            samples = list(raster)
+        else:
+            samples = list(raster[::2])
+            max_value >>= 8
+    if magic in b'14':
+        # In PBM 1 is black
+        levels = [0 if sample else 255 for sample in samples]
+    elif magic in b'25':
+        levels = [sample * 255 // max_value for sample in samples]
+    else:
+        levels = [_grey(*samples[i:i + 3]) * 255 // max_value for i in range(0, len(samples), 3)]
+    return [bytearray(levels[y * width:(y + 1) * width]) for y in range(height)]
@@ -0,0 +1,6 @@
+class Clock:
+    def __init__(self):
+        self.ms = 0.0
+
+    def advance(self, ms_elapsed):
+        self.ms += ms_elapsed
@@ -0,0 +1,133 @@
+import array
+import math
+
+
+class CollisionMap:
+    # Static collidables drawn into a raster of unit cells, kept in square tiles that only exist where something was
+    # drawn. A cell lists the discs that a mover of up to max_mover_radius centred in it could touch, and holds its
+    # distance to the nearest obstacle cell, so checking a move is one cell lookup however many collidables there are.
+    OBSTACLE = 'obstacle'
+
+    class _Tile:
+        __slots__ = ('discs', 'obstacle_distances')
+
+        def __init__(self, num_cells):
+            self.discs = [None] * num_cells
+            # Created with the first obstacle cell nearby, most tiles only ever hold discs
+            self.obstacle_distances = None
+
+    def __init__(self, width, height, max_mover_radius, tile_size=64):
+        self._WIDTH = int(math.ceil(width))
+        self._HEIGHT = int(math.ceil(height))
+        self._MAX_MOVER_RADIUS = max_mover_radius
+        self._TILE_SIZE = tile_size
+        self._tiles = {}
+        # collidable -> (x, y, radius, keys of the cells it was drawn into)
+        self._discs = {}
+        self._num_obstacle_cells = 0
+        # Obstacle distances are measured from a cell's centre to the nearest point of an obstacle cell, so they are
+        # off by at most half a cell diagonal for points elsewhere in the cell. Only distances a mover could collide
+        # at are stored; the stencil lists the offsets within that reach together with their distance.
+        reach = int(math.ceil(max_mover_radius)) + 1
+        self._obstacle_stencil = []
+        for d_y in range(-reach, reach + 1):
+            for d_x in range(-reach, reach + 1):
+                distance = math.hypot(max(abs(d_x) - 0.5, 0.0), max(abs(d_y) - 0.5, 0.0))
+                if distance < max_mover_radius:
+                    self._obstacle_stencil.append((d_x, d_y, distance))
+
+    def get_num_tiles(self):
+        return len(self._tiles)
+
+    def get_num_obstacle_cells(self):
+        return self._num_obstacle_cells
+
+    def add_disc(self, collidable, x, y, radius):
+        self.remove_disc(collidable)
+        reach = radius + self._MAX_MOVER_RADIUS
+        reach_squared = reach * reach
+        cell_keys = []
+        for cell_y in range(max(int(math.floor(y - reach)), 0), min(int(math.floor(y + reach)), self._HEIGHT - 1) + 1):
+            # Vertical distance from the disc's centre to the nearest point of this row of cells
+            gap_y = max(cell_y - y, y - cell_y - 1.0, 0.0)
+            for cell_x in range(max(int(math.floor(x - reach)), 0),
+                                min(int(math.floor(x + reach)), self._WIDTH - 1) + 1):
+                gap_x = max(cell_x - x, x - cell_x - 1.0, 0.0)
+                if reach_squared < gap_x * gap_x + gap_y * gap_y:
+                    continue
+                tile, index = self._get_or_create_cell(cell_x, cell_y)
+                discs = tile.discs[index]
+                tile.discs[index] = (collidable,) if discs is None else discs + (collidable,)
+                cell_keys.append((cell_x, cell_y))
+        self._discs[collidable] = (x, y, radius, cell_keys)
+
+    def remove_disc(self, collidable):
+        disc = self._discs.pop(collidable, None)
+        if disc is None:
+            return
+        for cell_x, cell_y in disc[3]:
+            tile, index = self._get_or_create_cell(cell_x, cell_y)
+            discs = tuple(other for other in tile.discs[index] if other is not collidable)
+            tile.discs[index] = discs if discs else None
+
+    def add_obstacle_cells(self, cells):
+        # cells are (x, y) pairs of whole cells; anything outside the map is ignored
+        for cell_x, cell_y in cells:
+            if not (0 <= cell_x < self._WIDTH and 0 <= cell_y < self._HEIGHT):
+                continue
+            self._num_obstacle_cells += 1
+            for d_x, d_y, distance in self._obstacle_stencil:
+                x = cell_x + d_x
+                y = cell_y + d_y
+                if not (0 <= x < self._WIDTH and 0 <= y < self._HEIGHT):
+                    continue
+                tile, index = self._get_or_create_cell(x, y)
+                if tile.obstacle_distances is None:
+                    tile.obstacle_distances = array.array('f', [math.inf]) * (self._TILE_SIZE * self._TILE_SIZE)
+                if distance < tile.obstacle_distances[index]:
+                    tile.obstacle_distances[index] = distance
+
+    def get_discs(self, x, y):
+        tile = self._tiles.get((int(x) // self._TILE_SIZE, int(y) // self._TILE_SIZE))
+        if tile is None:
+            return ()
+        return tile.discs[self._get_index(int(x), int(y))] or ()
+
+    def get_obstacle_distance(self, x, y):
+        # math.inf when no obstacle is within max_mover_radius
+        tile = self._tiles.get((int(x) // self._TILE_SIZE, int(y) // self._TILE_SIZE))
+        if tile is None or tile.obstacle_distances is None:
+            return math.inf
+        return tile.obstacle_distances[self._get_index(int(x), int(y))]
+
+    def get_blocking(self, x, y, radius):
+        # What a mover of this radius at (x, y) collides with: a disc's collidable, OBSTACLE, or None. Discs are tested
+        # exactly: a mover collides when the distance between the centres is less than the sum of the radii.
+        if self._MAX_MOVER_RADIUS < radius:
+            raise ValueError('Mover radius {} is larger than the map was built for'.format(radius))
+        cell_x = int(x)
+        cell_y = int(y)
+        tile = self._tiles.get((cell_x // self._TILE_SIZE, cell_y // self._TILE_SIZE))
+        if tile is None:
+            return None
+        index = self._get_index(cell_x, cell_y)
+        if tile.obstacle_distances is not None and tile.obstacle_distances[index] < radius:
+            return CollisionMap.OBSTACLE
+        discs = tile.discs[index]
+        if discs is not None:
+            for collidable in discs:
+                disc_x, disc_y, disc_radius, _ = self._discs[collidable]
+                if ((x - disc_x)**2.0 + (y - disc_y)**2.0)**0.5 < (radius + disc_radius):
+                    return collidable
+        return None
+
+    def _get_index(self, cell_x, cell_y):
+        return (cell_y % self._TILE_SIZE) * self._TILE_SIZE + cell_x % self._TILE_SIZE
+
+    def _get_or_create_cell(self, cell_x, cell_y):
+        key = (cell_x // self._TILE_SIZE, cell_y // self._TILE_SIZE)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = CollisionMap._Tile(self._TILE_SIZE * self._TILE_SIZE)
+            self._tiles[key] = tile
+        return tile, self._get_index(cell_x, cell_y)
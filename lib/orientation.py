@@ -2,6 +2,8 @@ from lib.location import Location
 
 
 class Orientation:
+    __slots__ = ('location', 'heading_rad')
+
     def __init__(self, x_loc, y_loc, heading_rad):
         self.location = Location(x_loc, y_loc)
         self.heading_rad = heading_rad
@@ -1,4 +1,6 @@
 class RadialLocation:
+    __slots__ = ('angle_rad', 'distance')
+
     def __init__(self, angle_rad, distance):
         self.angle_rad = angle_rad
         self.distance = distance
@@ -4,6 +4,26 @@ from lib.rlocation import RadialLocation
 class SensableRegion:
     def __init__(self):
         self.objects_and_radial_locations = {}
+        self.pheromone_cells = {}
+        # RadialLocations are kept across clear() and handed out again, so a reused region allocates none
+        self._radial_location_pool = []
+        self._num_radial_locations_used = 0
 
     def add_object(self, world_object, angle_rad, distance):
-        self.objects_and_radial_locations[world_object] = RadialLocation(angle_rad, distance)
+        if self._num_radial_locations_used < len(self._radial_location_pool):
+            radial_location = self._radial_location_pool[self._num_radial_locations_used]
+            radial_location.angle_rad = angle_rad
+            radial_location.distance = distance
+        else:
+            radial_location = RadialLocation(angle_rad, distance)
+            self._radial_location_pool.append(radial_location)
+        self._num_radial_locations_used += 1
+        self.objects_and_radial_locations[world_object] = radial_location
+
+    def add_pheromone_cells(self, pheromone_type, cells):
+        self.pheromone_cells[pheromone_type] = cells
+
+    def clear(self):
+        self.objects_and_radial_locations.clear()
+        self.pheromone_cells.clear()
+        self._num_radial_locations_used = 0
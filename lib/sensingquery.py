@@ -0,0 +1,8 @@
+class SensingQuery:
+    def __init__(self, all_around_categories=(), forward_categories=()):
+        # Objects in forward_categories are only sensed when they lie in the half-plane ahead of the sensor
+        self.all_around_categories = tuple(all_around_categories)
+        self.forward_categories = tuple(forward_categories)
+
+    def is_empty(self):
+        return not self.all_around_categories and not self.forward_categories
@@ -0,0 +1,66 @@
+class SpatialHash:
+    def __init__(self, cell_size):
+        self._CELL_SIZE = float(cell_size)
+        # (cell_x, cell_y) -> {category: {object: location}}; cells and categories are dropped once empty
+        self._cells = {}
+        # object -> (cell key, category)
+        self._keys_of_objects = {}
+
+    def __len__(self):
+        return len(self._keys_of_objects)
+
+    def __contains__(self, world_object):
+        return world_object in self._keys_of_objects
+
+    def get_num_cells(self):
+        return len(self._cells)
+
+    def insert(self, world_object, category, location):
+        if world_object in self._keys_of_objects:
+            return
+        cell_key = self._get_cell_key(location.x, location.y)
+        self._cells.setdefault(cell_key, {}).setdefault(category, {})[world_object] = location
+        self._keys_of_objects[world_object] = (cell_key, category)
+
+    def remove(self, world_object):
+        keys = self._keys_of_objects.pop(world_object, None)
+        if keys is None:
+            return
+        cell_key, category = keys
+        cell = self._cells[cell_key]
+        objects = cell[category]
+        del objects[world_object]
+        if not objects:
+            del cell[category]
+            if not cell:
+                del self._cells[cell_key]
+
+    def move(self, world_object, location):
+        cell_key, category = self._keys_of_objects[world_object]
+        if cell_key == self._get_cell_key(location.x, location.y):
+            self._cells[cell_key][category][world_object] = location
+            return
+        self.remove(world_object)
+        self.insert(world_object, category, location)
+
+    def query(self, location, radius, categories=None):
+        # Yields (object, location) for every object in a cell overlapping the square bounding the circle;
+        # callers do their own distance check
+        cell_x1, cell_y1 = self._get_cell_key(location.x - radius, location.y - radius)
+        cell_x2, cell_y2 = self._get_cell_key(location.x + radius, location.y + radius)
+        for cell_y in range(cell_y1, cell_y2 + 1):
+            for cell_x in range(cell_x1, cell_x2 + 1):
+                cell = self._cells.get((cell_x, cell_y))
+                if cell is None:
+                    continue
+                if categories is None:
+                    for objects in cell.values():
+                        yield from objects.items()
+                else:
+                    for category in categories:
+                        objects = cell.get(category)
+                        if objects is not None:
+                            yield from objects.items()
+
+    def _get_cell_key(self, x, y):
+        return int(x // self._CELL_SIZE), int(y // self._CELL_SIZE)
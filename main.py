@@ -1,9 +1,14 @@
 import pygame
 import pygame.locals
 from universe.world import World
+from universe.simulation import Simulation
 from graphics.view import View
 
-FPS = 10
+import argparse
+import time
+
+FPS = 30
+MS_PER_TICK = 100.0
 WIDTH = 480
 HEIGHT = 480
 NUM_ANTS_TO_SPAWN = 24
@@ -12,29 +17,183 @@ NUM_FOOD_SOURCES = 3
 FOOD_MIN_DISTANCE_TO_NEST = 125.0
 FOOD_MIN_DISTANCE_TO_WORLD_EDGE = 5.0
 MAX_MOVE_DURATION_IN_SEC = 1.0
+# Share of a frame the simulation may use before the frame is drawn
+SIMULATION_BUDGET_PER_FRAME = 0.8
+# Frames in a row that may be skipped while the simulation is behind, so the display still refreshes
+MAX_FRAMES_SKIPPED = 4
+# Simulated time per wall time for each key; None runs as many ticks as the frame budget allows
+SPEEDS_BY_KEY = {pygame.K_1: 1.0,
+                 pygame.K_2: 10.0,
+                 pygame.K_3: None}
+# What the max speed key means when replaying a recording
+REPLAY_MAX_SPEED = 100.0
+# Simulated milliseconds the arrow and page keys jump by in a replay
+REPLAY_SEEK_STEPS_MS_BY_KEY = {pygame.K_LEFT: -60000.0,
+                               pygame.K_RIGHT: 60000.0,
+                               pygame.K_PAGEDOWN: -600000.0,
+                               pygame.K_PAGEUP: 600000.0}
 
 
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    clock = pygame.time.Clock()
+def update_caption(speed, simulated_time_in_sec):
+    speed_text = 'max' if speed is None else '{:g}x'.format(speed)
+    pygame.display.set_caption('AntColony - {} - {:.0f} s simulated'.format(speed_text, simulated_time_in_sec))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the ant colony simulation with a display.')
+    parser.add_argument('--background', action='store_true',
+                        help='run the world in a separate process and draw from shared-memory snapshots (needs numpy)')
+    parser.add_argument('--replay', default=None, metavar='PATH',
+                        help='play back a recording made with headless.py --record instead of simulating (needs numpy)')
+    return parser.parse_args()
+
+
+def handle_events(speed):
+    # Returns the requested speed, or False when the window was closed
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            return False
+        elif event.type == pygame.KEYDOWN and event.key in SPEEDS_BY_KEY:
+            speed = SPEEDS_BY_KEY[event.key]
+    return speed
+
+
+def run_in_foreground(screen, clock):
     world = World(WIDTH, HEIGHT, NUM_ANTS_TO_SPAWN, ANT_SPAWN_PERIOD,
                   NUM_FOOD_SOURCES, FOOD_MIN_DISTANCE_TO_NEST, FOOD_MIN_DISTANCE_TO_WORLD_EDGE,
                   MAX_MOVE_DURATION_IN_SEC)
+    simulation = Simulation(world, MS_PER_TICK)
     world_view = View(screen, world)
+    speed = 1.0
+    budget_in_sec = SIMULATION_BUDGET_PER_FRAME / FPS
+    # Simulated milliseconds owed to the simulation, in fixed ticks of MS_PER_TICK
+    ms_to_simulate = 0.0
+    frames_skipped = 0
 
-    exit_requested = False
-    while not exit_requested:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                exit_requested = True
+    while True:
+        requested_speed = handle_events(speed)
+        if requested_speed is False:
+            return
+        if requested_speed != speed:
+            speed = requested_speed
+            ms_to_simulate = 0.0
         ms_elapsed = clock.tick(FPS)
-        context_for_world = {}
-        world.update(ms_elapsed, context_for_world)
+        deadline = time.perf_counter() + budget_in_sec
+
+        def out_of_budget(sim):
+            return deadline <= time.perf_counter()
+
+        if speed is None:
+            simulation.run(None, out_of_budget)
+            falling_behind = False
+        else:
+            ms_to_simulate += ms_elapsed * speed
+            ticks_due = int(ms_to_simulate // MS_PER_TICK)
+            ticks_run = simulation.run(ticks_due, out_of_budget)
+            ms_to_simulate -= ticks_run * MS_PER_TICK
+            falling_behind = ticks_run < ticks_due
+            if falling_behind:
+                # Whatever cannot be caught up within a few frames is dropped, the simulation just runs slower
+                ms_to_simulate = min(ms_to_simulate, MAX_FRAMES_SKIPPED * speed * 1000.0 / FPS)
+        if falling_behind and frames_skipped < MAX_FRAMES_SKIPPED:
+            frames_skipped += 1
+            continue
+        frames_skipped = 0
         world_view.update()
         world_view.draw()
+        update_caption(speed, simulation.get_simulated_time_in_sec())
         pygame.display.update()
 
 
+def run_in_background(screen, clock):
+    # Imported here so that numpy is only needed for this mode
+    from universe.backgroundsimulation import BackgroundSimulation
+    world_parameters = {'width': WIDTH,
+                        'height': HEIGHT,
+                        'num_ants_to_spawn': NUM_ANTS_TO_SPAWN,
+                        'ant_spawn_period': ANT_SPAWN_PERIOD,
+                        'num_food_sources': NUM_FOOD_SOURCES,
+                        'food_min_dist_to_nest': FOOD_MIN_DISTANCE_TO_NEST,
+                        'food_min_dist_to_world_edge': FOOD_MIN_DISTANCE_TO_WORLD_EDGE,
+                        'max_move_duration_in_sec': MAX_MOVE_DURATION_IN_SEC}
+    background_simulation = BackgroundSimulation(world_parameters, MS_PER_TICK)
+    background_simulation.start()
+    try:
+        snapshot = background_simulation.get_snapshot()
+        world_view = View(screen, snapshot)
+        speed = 1.0
+        while background_simulation.is_running():
+            requested_speed = handle_events(speed)
+            if requested_speed is False:
+                return
+            if requested_speed != speed:
+                speed = requested_speed
+                background_simulation.set_speed(speed)
+            clock.tick(FPS)
+            if not snapshot.refresh():
+                continue
+            world_view.update()
+            if snapshot.is_torn():
+                # The worker caught up with the slot while it was being read, so read the newer one instead
+                snapshot.refresh()
+                world_view.update()
+            world_view.draw()
+            update_caption(speed, 0.001 * MS_PER_TICK * snapshot.get_tick())
+            pygame.display.update()
+    finally:
+        background_simulation.stop()
+
+
+def run_replay(clock, path):
+    # Imported here so that numpy is only needed for this mode
+    from universe.trajectory import TrajectoryReplay
+    replay = TrajectoryReplay(path)
+    try:
+        if replay.get_num_ticks() == 0:
+            return
+        screen = pygame.display.set_mode(replay.get_size())
+        world_view = View(screen, replay)
+        speed = 1.0
+        time_ms = replay.get_time_ms()
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+                elif event.type == pygame.KEYDOWN and event.key in SPEEDS_BY_KEY:
+                    speed = SPEEDS_BY_KEY[event.key]
+                elif event.type == pygame.KEYDOWN and event.key in REPLAY_SEEK_STEPS_MS_BY_KEY:
+                    time_ms += REPLAY_SEEK_STEPS_MS_BY_KEY[event.key]
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_HOME:
+                    time_ms = 0.0
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_END:
+                    replay.seek(replay.get_num_ticks() - 1)
+                    time_ms = replay.get_time_ms()
+            ms_elapsed = clock.tick(FPS)
+            time_ms += ms_elapsed * (REPLAY_MAX_SPEED if speed is None else speed)
+            replay.seek_time(time_ms)
+            # Stay on the last tick instead of running ahead of the recording
+            time_ms = min(time_ms, replay.get_time_ms())
+            world_view.update()
+            world_view.draw()
+            update_caption(speed, 0.001 * replay.get_time_ms())
+            pygame.display.update()
+    finally:
+        replay.close()
+
+
+def main():
+    args = parse_args()
+    pygame.init()
+    clock = pygame.time.Clock()
+    if args.replay is not None:
+        run_replay(clock, args.replay)
+        return
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    if args.background:
+        run_in_background(screen, clock)
+    else:
+        run_in_foreground(screen, clock)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,45 @@
+from universe.worldserver import WorldServer
+import headless
+
+import argparse
+import asyncio
+import signal
+
+SOCKET_PATH = '/tmp/antcolony.sock'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Host worlds for external optimizers behind a Unix domain socket.')
+    parser.add_argument('--socket', default=SOCKET_PATH, metavar='PATH',
+                        help='socket to listen on (default: %(default)s)')
+    parser.add_argument('--ms-per-tick', type=float, default=headless.MS_PER_TICK,
+                        help='simulated milliseconds per tick unless a create says otherwise (default: %(default)s)')
+    parser.add_argument('--checkpoint-dir', default=None, metavar='DIR',
+                        help='directory that checkpoints named by clients are saved to and restored from')
+    parser.add_argument('--trust-clients', action='store_true',
+                        help='allow restoring from checkpoint bytes sent by clients; unpickling them runs code, so '
+                             'only use this when everyone who can reach the socket is trusted')
+    return parser.parse_args()
+
+
+async def serve(server):
+    # Stop on SIGINT and SIGTERM alike, so the socket file gets removed either way
+    serving = asyncio.current_task()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(signal_number, serving.cancel)
+    try:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+
+
+def main():
+    args = parse_args()
+    server = WorldServer(args.socket, headless.get_default_world_parameters(), args.ms_per_tick,
+                         args.checkpoint_dir, args.trust_clients)
+    print('serving worlds on {}'.format(args.socket), flush=True)
+    asyncio.run(serve(server))
+
+
+if __name__ == '__main__':
+    main()
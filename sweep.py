@@ -0,0 +1,75 @@
+from universe.sweep import sweep, check_parameter_names
+import headless
+
+import argparse
+import ast
+import json
+
+
+def parse_parameter(text):
+    name, _, values = text.partition('=')
+    if not name or not values:
+        raise argparse.ArgumentTypeError('expected NAME=VALUE[,VALUE...], got {!r}'.format(text))
+    return name, [parse_value(value) for value in values.split(',')]
+
+
+def parse_value(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run a parameter sweep of headless colonies on a process pool.')
+    parser.add_argument('--param', type=parse_parameter, action='append', default=[], metavar='NAME=V1,V2',
+                        help='values to sweep; upper case names are universe/constants.py overrides, lower case '
+                             'names are World arguments (e.g. num_ants_to_spawn). May be repeated.')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--ticks', type=int, default=headless.NUM_TICKS)
+    parser.add_argument('--ms-per-tick', type=float, default=headless.MS_PER_TICK)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--pheromone-field', action='store_true')
+    parser.add_argument('--vectorized', action='store_true')
+    parser.add_argument('--ensemble', action='store_true',
+                        help='run all seeds of a combination together in one vectorized EnsembleWorld')
+    parser.add_argument('--until-stable', default=None, choices=headless.STABLE_METRICS, metavar='METRIC',
+                        help='end each run once METRIC has settled, with --ticks as the limit; one of '
+                             '{}'.format(', '.join(headless.STABLE_METRICS)))
+    parser.add_argument('--stability-tolerance', type=float, default=headless.STABILITY_TOLERANCE,
+                        help='relative change that still counts as stable (default: %(default)s)')
+    parser.add_argument('--stability-minutes', type=float, default=headless.STABILITY_MINUTES,
+                        help='simulated minutes the metric has to stay stable (default: %(default)s)')
+    parser.add_argument('--output', default=None, help='also append one JSON line per run to this file')
+    args = parser.parse_args()
+    try:
+        check_parameter_names(dict(args.param), args.vectorized, args.ensemble)
+    except ValueError as error:
+        parser.error(str(error))
+    return args
+
+
+def main():
+    args = parse_args()
+    base_world_parameters = headless.get_default_world_parameters()
+    if (args.vectorized or args.ensemble) and args.until_stable is not None:
+        raise SystemExit('--until-stable is only supported without --vectorized and --ensemble')
+    if args.pheromone_field and not (args.vectorized or args.ensemble):
+        base_world_parameters['use_pheromone_field'] = True
+    output_file = open(args.output, 'a') if args.output is not None else None
+    try:
+        for summary in sweep(base_world_parameters, dict(args.param), args.seeds, args.ticks, args.ms_per_tick,
+                             args.vectorized, args.workers, args.until_stable, args.stability_tolerance,
+                             60.0 * args.stability_minutes, args.ensemble):
+            line = json.dumps(summary, sort_keys=True)
+            print(line, flush=True)
+            if output_file is not None:
+                output_file.write(line + '\n')
+                output_file.flush()
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+
+if __name__ == '__main__':
+    main()
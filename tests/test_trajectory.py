@@ -0,0 +1,55 @@
+from universe.world import World
+from universe.simulation import Simulation
+from universe.trajectory import TrajectoryRecorder, TrajectoryReplay
+import headless
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+
+class TestPheromoneFieldKeyframes(unittest.TestCase):
+    CHUNK_TICKS = 20
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def record_and_replay(self, chunk_size):
+        # The first tick of every chunk is replayed from the keyframe and that tick's deposits
+        parameters = dict(headless.get_default_world_parameters(), num_ants_to_spawn=8)
+        world = World(seed=2, use_pheromone_field=True, chunk_size=chunk_size, **parameters)
+        path = os.path.join(self._directory.name, 'run.trj')
+        recorder = TrajectoryRecorder(path, self.CHUNK_TICKS)
+        world.set_recorder(recorder)
+        simulation = Simulation(world, 100.0)
+        grids_by_tick = {}
+        simulation.run(1)
+        for chunk_number in range(1, 6):
+            simulation.run(self.CHUNK_TICKS)
+            grids_by_tick[chunk_number * self.CHUNK_TICKS] = \
+                [world.get_pheromone_field().get_grid(pheromone_type).copy() for pheromone_type in (0, 1)]
+        recorder.close()
+        replay = TrajectoryReplay(path)
+        try:
+            for tick, grids in grids_by_tick.items():
+                replay.seek(tick)
+                for pheromone_type, grid in enumerate(grids):
+                    np.testing.assert_allclose(replay.get_pheromone_grid(pheromone_type), grid, rtol=1e-4, atol=1e-6)
+        finally:
+            replay.close()
+        self.assertLess(0.0, sum(float(grid.sum()) for grid in grids_by_tick[5 * self.CHUNK_TICKS]))
+
+    def test_dense_field(self):
+        self.record_and_replay(None)
+
+    def test_chunked_field(self):
+        self.record_and_replay(16)
+
+
+if __name__ == '__main__':
+    unittest.main()
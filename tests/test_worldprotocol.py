@@ -0,0 +1,193 @@
+from universe.worldserver import WorldServer
+from universe.checkpoint import dumps_world
+import universe.worldprotocol as protocol
+import headless
+
+import array
+import asyncio
+import os
+import stat
+import struct
+import tempfile
+import unittest
+
+
+class TestRoundTrip(unittest.TestCase):
+    def test_scalars(self):
+        for value in (None, True, False, 0, -1, 2**62, 0.5, -1e300, '', 'fourmi', b'', b'\x00\xff'):
+            decoded = protocol.decode(protocol.encode(value))
+            self.assertEqual(decoded, value)
+            self.assertEqual(type(decoded), type(value))
+
+    def test_containers(self):
+        value = [{'op': 'step', 'world': 'world-1', 'ticks': 20}, [], {}, [[1, [2.0, None]], {'a': {'b': b'c'}}]]
+        self.assertEqual(protocol.decode(protocol.encode(value)), value)
+
+    def test_tuples_come_back_as_lists(self):
+        self.assertEqual(protocol.decode(protocol.encode((1, 2))), [1, 2])
+
+    def test_arrays(self):
+        for typecode, items in (('d', [0.0, 1.5, -2.25]), ('f', [0.5, 4.0]), ('q', [-3, 2**40]), ('B', [0, 255])):
+            value = array.array(typecode, items)
+            decoded = protocol.decode(protocol.encode(value))
+            self.assertEqual(decoded.typecode, typecode)
+            self.assertEqual(decoded, value)
+
+    def test_frame(self):
+        frame = protocol.encode_frame([protocol.list_command()])
+        size = protocol.decode_frame_size(frame[:protocol.FRAME_HEADER_SIZE])
+        self.assertEqual(size, len(frame) - protocol.FRAME_HEADER_SIZE)
+        self.assertEqual(protocol.decode(frame[protocol.FRAME_HEADER_SIZE:]), [{'op': protocol.Op.LIST}])
+
+    def test_unencodable(self):
+        with self.assertRaises(TypeError):
+            protocol.encode({1, 2})
+
+
+class TestMalformedMessages(unittest.TestCase):
+    def assert_malformed(self, data):
+        with self.assertRaises(ValueError):
+            protocol.decode(data)
+
+    def test_truncated_values(self):
+        message = protocol.encode([1, 2.0, 'three', b'four', array.array('d', [5.0]), {'six': 6}])
+        for end in range(len(message)):
+            self.assert_malformed(message[:end])
+
+    def test_left_over_bytes(self):
+        self.assert_malformed(protocol.encode(1) + b'N')
+
+    def test_unknown_tag(self):
+        self.assert_malformed(b'x')
+
+    def test_bad_text(self):
+        self.assert_malformed(b's\x02\x00\x00\x00\xff\xfe')
+
+    def test_bad_array(self):
+        self.assert_malformed(b'a' + struct.pack('<cI', b'!', 0))
+        self.assert_malformed(b'a' + struct.pack('<cI', b'd', 3) + b'abc')
+
+    def test_unhashable_key(self):
+        self.assert_malformed(b'm\x01\x00\x00\x00' + protocol.encode([]) + b'N')
+
+    def test_nesting_limit(self):
+        nested = []
+        for _ in range(protocol.MAX_NESTING_DEPTH - 1):
+            nested = [nested]
+        protocol.decode(protocol.encode(nested))
+        self.assert_malformed(protocol.encode([nested]))
+        self.assert_malformed(b'l\x01\x00\x00\x00' * 100000)
+
+    def test_oversized_frame(self):
+        with self.assertRaises(ValueError):
+            protocol.decode_frame_size(struct.pack('<I', protocol.MAX_FRAME_SIZE + 1))
+
+
+class TestWorldServer(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._socket_path = os.path.join(self._directory.name, 'worlds.sock')
+        self._checkpoint_directory = os.path.join(self._directory.name, 'checkpoints')
+        os.mkdir(self._checkpoint_directory)
+        parameters = dict(headless.get_default_world_parameters(), width=120, height=120, num_ants_to_spawn=4,
+                          food_min_dist_to_nest=30.0)
+        self._server = WorldServer(self._socket_path, parameters, checkpoint_directory=self._checkpoint_directory)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def run_with_server(self, client):
+        async def run():
+            await self._server.start()
+            try:
+                return await client()
+            finally:
+                await self._server.close()
+        return asyncio.run(run())
+
+    async def send(self, payload):
+        # Returns the decoded response, or None when the server closed the connection instead
+        reader, writer = await asyncio.open_unix_connection(self._socket_path)
+        try:
+            writer.write(payload)
+            await writer.drain()
+            try:
+                header = await reader.readexactly(protocol.FRAME_HEADER_SIZE)
+            except asyncio.IncompleteReadError:
+                return None
+            return protocol.decode(await reader.readexactly(protocol.decode_frame_size(header)))
+        finally:
+            writer.close()
+
+    def send_commands(self, *commands):
+        return self.run_with_server(lambda: self.send(protocol.encode_frame(list(commands))))
+
+    def test_socket_is_private(self):
+        async def get_mode():
+            return stat.S_IMODE(os.stat(self._socket_path).st_mode)
+        self.assertEqual(self.run_with_server(get_mode), 0o600)
+
+    def test_malformed_frames_close_the_connection(self):
+        async def send_malformed():
+            truncated = b'l\x01\x00\x00\x00i\x01'
+            nested = b'l\x01\x00\x00\x00' * 100000
+            responses = []
+            for payload in (truncated, nested, b'i\x01\x00\x00\x00\x00\x00\x00\x00'):
+                responses.append(await self.send(struct.pack('<I', len(payload)) + payload))
+            # The server keeps serving other clients
+            responses.append(await self.send(protocol.encode_frame([protocol.list_command()])))
+            return responses
+        loop_errors = []
+
+        async def send_and_record_errors():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+            return await send_malformed()
+        responses = self.run_with_server(send_and_record_errors)
+        self.assertEqual(responses, [None, None, None, [{'ok': {}}]])
+        self.assertEqual(loop_errors, [])
+
+    def test_step_needs_a_non_negative_integer(self):
+        results = self.send_commands(protocol.create_command(world_id='w'),
+                                     protocol.step_command('w', -5),
+                                     protocol.step_command('w', 1.5),
+                                     protocol.step_command('w', True),
+                                     protocol.step_command('w', 3))
+        self.assertEqual(results[0], {'ok': 'w'})
+        for result in results[1:4]:
+            self.assertIn('ValueError', result['error'])
+        self.assertEqual(results[4]['ok']['ticks'], 3)
+
+    def test_restore_from_bytes_needs_trusted_clients(self):
+        result, = self.send_commands(protocol.restore_command(data=dumps_world(42)))
+        self.assertIn('PermissionError', result['error'])
+
+    def test_restore_rejects_what_is_not_a_world(self):
+        self._server = WorldServer(self._socket_path, {}, trust_clients=True)
+        result, listing = self.send_commands(protocol.restore_command(data=dumps_world(42)), protocol.list_command())
+        self.assertIn('not a world', result['error'])
+        self.assertEqual(listing, {'ok': {}})
+
+    def test_checkpoint_files_stay_in_the_checkpoint_directory(self):
+        results = self.send_commands(protocol.create_command(world_id='w'),
+                                     protocol.step_command('w', 5),
+                                     protocol.checkpoint_command('w', 'w.ckpt'),
+                                     protocol.restore_command(path='w.ckpt', world_id='restored'),
+                                     protocol.checkpoint_command('w', '../w.ckpt'),
+                                     protocol.checkpoint_command('w', '/tmp/w.ckpt'),
+                                     protocol.restore_command(path='..'),
+                                     protocol.list_command())
+        self.assertEqual(results[2], {'ok': None})
+        self.assertEqual(results[3], {'ok': 'restored'})
+        for result in results[4:7]:
+            self.assertIn('error', result)
+        self.assertEqual(os.listdir(self._checkpoint_directory), ['w.ckpt'])
+        self.assertEqual(results[7]['ok']['restored']['food_delivered'], results[7]['ok']['w']['food_delivered'])
+
+    def test_checkpoint_files_need_a_checkpoint_directory(self):
+        self._server = WorldServer(self._socket_path, headless.get_default_world_parameters())
+        results = self.send_commands(protocol.create_command(world_id='w'), protocol.checkpoint_command('w', 'w.ckpt'))
+        self.assertIn('PermissionError', results[1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
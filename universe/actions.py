@@ -1,26 +1,34 @@
+# Actions are plain records. An ant keeps one instance of each kind and refills it, since the world acts on an
+# action as soon as it is returned.
 class Action:
-    pass
+    __slots__ = ()
 
 
 class Move(Action):
+    __slots__ = ('heading_delta', 'move_speed')
+
     def __init__(self, heading_delta, move_speed):
         self.heading_delta = heading_delta
         self.move_speed = move_speed
 
 
 class TurnAround(Action):
-    pass
+    __slots__ = ()
 
 
 class DepositPheromone(Action):
+    __slots__ = ('pheromone',)
+
     def __init__(self, pheromone):
         self.pheromone = pheromone
 
 
 class EnterNest(Action):
+    __slots__ = ('nest',)
+
     def __init__(self, nest):
         self.nest = nest
 
 
 class LeaveNest(Action):
-    pass
+    __slots__ = ()
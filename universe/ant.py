@@ -5,6 +5,7 @@ from universe.pheromone import Pheromone
 from universe.food import Food
 
 from lib.sensableregion import SensableRegion
+from lib.sensingquery import SensingQuery
 
 import random as rand
 import math
@@ -30,7 +31,8 @@ class Ant(IUpdatable, ICollidable):
                  max_search_time_in_sec,
                  sensing_range,
                  sensing_range_attenuation_gain,
-                 collision_avoidance_heading_increment):
+                 collision_avoidance_heading_increment,
+                 random_generator=rand):
         self._LENGTH = length
         self._WIDTH = width
         self._COLLISION_RADIUS = max(0.5 * self._LENGTH, 0.5 * self._WIDTH)
@@ -45,6 +47,7 @@ class Ant(IUpdatable, ICollidable):
         self._SENSING_RANGE = sensing_range
         self._ATTENUATION_GAIN = sensing_range_attenuation_gain
         self._COLLISION_AVOIDANCE_HEADING_INCREMENT = collision_avoidance_heading_increment
+        self._rand = random_generator
         self._ms_since_pheromone_deposited = 0
         self._pheromone_deposit_intensity = 1.0
         self._seconds_until_turn_around = max_search_time_in_sec
@@ -56,6 +59,17 @@ class Ant(IUpdatable, ICollidable):
                                           self.State.LOOKING_FOR_FOOD: Food}
         self._state_to_target_pheromone_type_map = {self.State.HEADING_HOME: Pheromone.Type.NEST,
                                                     self.State.LOOKING_FOR_FOOD: Pheromone.Type.FOOD}
+        # Targets are needed all around for the in-range checks, pheromones only count when they are ahead of us
+        self._state_to_sensing_query_map = {
+            state: SensingQuery(all_around_categories=(self._state_to_target_type_map[state],),
+                                forward_categories=(self._state_to_target_pheromone_type_map[state],))
+            for state in (self.State.HEADING_HOME, self.State.LOOKING_FOR_FOOD)}
+        # One instance of each action is refilled and returned every time, the world acts on it right away
+        self._move = Move(0.0, self._MOVE_SPEED_DIST_PER_SEC)
+        self._turn_around = TurnAround()
+        self._deposit_pheromone = DepositPheromone(None)
+        self._enter_nest = EnterNest(None)
+        self._leave_nest = LeaveNest()
 
     def update(self, ms_elapsed, context):
         if context['in_nest']:
@@ -64,40 +78,59 @@ class Ant(IUpdatable, ICollidable):
             self._carrying_food = False
             self._pheromone_deposit_intensity = 1.0
             self._state = self.State.LOOKING_FOR_FOOD
-            return LeaveNest()
+            return self._leave_nest
+        timer_action = self.update_timers(ms_elapsed)
+        if timer_action is not None:
+            return timer_action
+        return self.decide(context)
+
+    def update_timers(self, ms_elapsed):
+        # The part of update() that needs nothing sensed: advances the deposit and turn around timers and returns the
+        # action of one that went off, or None when the ant has to decide() on what it senses this tick
         self._decay_pheromone_deposit_intensity(ms_elapsed)
         self._ms_since_pheromone_deposited += ms_elapsed
         if self._PHEROMONE_DEPOSIT_PERIOD_MS < self._ms_since_pheromone_deposited:
             self._ms_since_pheromone_deposited = 0
-            return DepositPheromone(self._produce_pheromone())
+            self._deposit_pheromone.pheromone = self._produce_pheromone()
+            return self._deposit_pheromone
         if not self._carrying_food:
             self._seconds_until_turn_around -= 0.001 * ms_elapsed
             if self._seconds_until_turn_around < 0.0:
                 self._state = self.State.HEADING_HOME
                 self._times_turned_around += 1.0
                 self._seconds_until_turn_around = self._MAX_SEARCH_TIME_IN_SEC * 2.0**self._times_turned_around
-                return TurnAround()
+                return self._turn_around
+        return None
+
+    def decide(self, context):
         if self._state == self.State.LOOKING_FOR_FOOD:
             if self._check_if_food_in_range(context[SensableRegion]):
                 self._carrying_food = True
                 self._pheromone_deposit_intensity = 1.0
                 self._state = self.State.HEADING_HOME
-                return TurnAround()
+                return self._turn_around
         if self._state == self.State.HEADING_HOME:
             # Enter Nest when in range
             possible_nest = self._check_if_nest_in_range(context[SensableRegion])
             if possible_nest is not None:
-                nest_to_enter = possible_nest
-                return EnterNest(nest_to_enter)
+                self._enter_nest.nest = possible_nest
+                return self._enter_nest
         requested_heading_delta = self._calculate_heading_delta(context[SensableRegion],
                                                                 self._state_to_target_type_map[self._state],
                                                                 self._state_to_target_pheromone_type_map[self._state])
         self._previous_requested_heading_delta = requested_heading_delta
-        return Move(requested_heading_delta, self._MOVE_SPEED_DIST_PER_SEC)
+        self._move.heading_delta = requested_heading_delta
+        return self._move
 
     def get_collision_radius(self):
         return self._COLLISION_RADIUS
 
+    def is_carrying_food(self):
+        return self._carrying_food
+
+    def get_sensing_query(self):
+        return self._state_to_sensing_query_map[self._state]
+
     def _produce_pheromone(self):
         if self._carrying_food:
             pheromone_type = Pheromone.Type.FOOD
@@ -110,37 +143,51 @@ class Ant(IUpdatable, ICollidable):
     def _calculate_heading_delta_looking_for_food(self, sensable_region):
         requested_heading_delta = self._previous_requested_heading_delta * \
                                   self._HEADING_DELTA_MOMENTUM_FACTOR + \
-                                  rand.uniform(self._CHAOS_FACTOR * -self._MAX_CHAOTIC_DELTA_HEADING,
+                                  self._rand.uniform(self._CHAOS_FACTOR * -self._MAX_CHAOTIC_DELTA_HEADING,
                                                self._CHAOS_FACTOR * self._MAX_CHAOTIC_DELTA_HEADING)
         return requested_heading_delta
 
     def _calculate_heading_delta(self, sensable_region, target_type, target_pheromone_type):
-        HALF_SENSING_RANGE = self._SENSING_RANGE * 0.5
         numerator = 0.0
         denominator = 0.001
+        # The weight of a sensed object, pi/2 * sin(angle) * cos(angle)**0.25 times a distance factor that falls off
+        # beyond half the sensing range, is computed inline in both loops below, reusing the cosine of the forward check
+        half_range = self._SENSING_RANGE * 0.5
+        attenuation_gain = self._ATTENUATION_GAIN
+        half_pi = 0.5 * math.pi
         for world_object, rlocation in sensable_region.objects_and_radial_locations.items():
             # Only consider objects ahead of us
-            if 0.0 < math.cos(rlocation.angle_rad):
+            cos_angle = math.cos(rlocation.angle_rad)
+            if 0.0 < cos_angle:
                 if (type(world_object) == Pheromone and world_object.get_type() == target_pheromone_type) or \
                    type(world_object) == target_type:
-                    if rlocation.distance <= HALF_SENSING_RANGE:
-                        dist_factor = 1.0 - 0.5 * (rlocation.distance / HALF_SENSING_RANGE)**self._ATTENUATION_GAIN
+                    intensity = world_object.get_intensity()
+                    distance = rlocation.distance
+                    if distance <= half_range:
+                        dist_factor = 1.0 - 0.5 * (distance / half_range)**attenuation_gain
                     else:
-                        dist_factor = 0.5 * (1.0 - (rlocation.distance - HALF_SENSING_RANGE) / HALF_SENSING_RANGE)**self._ATTENUATION_GAIN
-                    numerator += world_object.get_intensity() * \
-                                 0.5 * math.pi * math.sin(rlocation.angle_rad) * \
-                                 math.cos(rlocation.angle_rad)**0.25 * \
-                                 dist_factor
-                    denominator += world_object.get_intensity()
-                ##if issubclass(type(world_object), ICollidable) and \
-                ##   rlocation.distance < (self.get_collision_radius() + world_object.get_collision_radius() + 1.0):
-                    #if math.sin(rlocation.angle_rad) < 0.0:
-                ##    return self._COLLISION_AVOIDANCE_HEADING_INCREMENT
-                    #else:
-                    #    return -self._COLLISION_AVOIDANCE_HEADING_INCREMENT
+                        dist_factor = 0.5 * (1.0 - (distance - half_range) / half_range)**attenuation_gain
+                    numerator += intensity * (half_pi * math.sin(rlocation.angle_rad) * cos_angle**0.25 * dist_factor)
+                    denominator += intensity
+                elif type(world_object) == Ant and \
+                        rlocation.distance < (self.get_collision_radius() + world_object.get_collision_radius() + 1.0):
+                    # Other ants are only sensed when the world has ant collisions on; veer away from one ahead
+                    if math.sin(rlocation.angle_rad) < 0.0:
+                        return self._COLLISION_AVOIDANCE_HEADING_INCREMENT
+                    return -self._COLLISION_AVOIDANCE_HEADING_INCREMENT
+        # Pheromones sensed from a PheromoneField come as plain (angle, distance, intensity) cells
+        for angle_rad, distance, intensity in sensable_region.pheromone_cells.get(target_pheromone_type, ()):
+            cos_angle = math.cos(angle_rad)
+            if 0.0 < cos_angle:
+                if distance <= half_range:
+                    dist_factor = 1.0 - 0.5 * (distance / half_range)**attenuation_gain
+                else:
+                    dist_factor = 0.5 * (1.0 - (distance - half_range) / half_range)**attenuation_gain
+                numerator += intensity * (half_pi * math.sin(angle_rad) * cos_angle**0.25 * dist_factor)
+                denominator += intensity
         requested_heading_delta = numerator / denominator
         requested_heading_delta += self._previous_requested_heading_delta * self._HEADING_DELTA_MOMENTUM_FACTOR
-        requested_heading_delta += rand.uniform(self._CHAOS_FACTOR * -self._MAX_CHAOTIC_DELTA_HEADING,
+        requested_heading_delta += self._rand.uniform(self._CHAOS_FACTOR * -self._MAX_CHAOTIC_DELTA_HEADING,
                                                 self._CHAOS_FACTOR * self._MAX_CHAOTIC_DELTA_HEADING)
         return requested_heading_delta
 
@@ -0,0 +1,95 @@
+from universe.world import World
+from universe.simulation import Simulation
+from universe.worldsnapshot import WorldSnapshotLayout, WorldSnapshotWriter, WorldSnapshot
+
+import multiprocessing
+import multiprocessing.shared_memory
+import time
+
+
+class BackgroundSimulation:
+    # Runs a World in its own process. After a tick the worker publishes a snapshot of the world into shared memory,
+    # at most every _MIN_PUBLISH_PERIOD_IN_SEC and not while the reader still needs the other slot, and
+    # get_snapshot() reads it in place.
+    _MIN_PUBLISH_PERIOD_IN_SEC = 0.005
+    _MAX_NESTS = 4
+    _IDLE_SLEEP_IN_SEC = 0.001
+    _STOP_TIMEOUT_IN_SEC = 5.0
+
+    def __init__(self, world_parameters, ms_per_tick, max_ants=10000, max_pheromones=200000, seed=None):
+        # world_parameters are World's arguments by name
+        self._world_parameters = dict(world_parameters)
+        self._MS_PER_TICK = ms_per_tick
+        self._seed = seed
+        self._layout = WorldSnapshotLayout(world_parameters['width'], world_parameters['height'], max_ants,
+                                           self._MAX_NESTS, world_parameters['num_food_sources'], max_pheromones,
+                                           world_parameters.get('use_pheromone_field', False))
+        self._shared_memory = None
+        self._snapshot = None
+        self._process = None
+        # Simulated time per wall time; 0.0 means as fast as possible
+        self._speed = multiprocessing.Value('d', 1.0, lock=False)
+        self._stop_requested = multiprocessing.Event()
+
+    def start(self):
+        self._shared_memory = multiprocessing.shared_memory.SharedMemory(create=True, size=self._layout.size)
+        self._snapshot = WorldSnapshot(self._layout, self._shared_memory.buf)
+        self._process = multiprocessing.Process(target=_run_worker,
+                                                args=(self._shared_memory.name, self._layout, self._world_parameters,
+                                                      self._seed, self._MS_PER_TICK, self._speed,
+                                                      self._stop_requested),
+                                                daemon=True)
+        self._process.start()
+
+    def stop(self):
+        self._stop_requested.set()
+        if self._process is not None:
+            self._process.join(self._STOP_TIMEOUT_IN_SEC)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+        if self._shared_memory is not None:
+            self._snapshot.release()
+            self._shared_memory.close()
+            self._shared_memory.unlink()
+            self._shared_memory = None
+
+    def set_speed(self, speed):
+        self._speed.value = 0.0 if speed is None else speed
+
+    def get_snapshot(self):
+        return self._snapshot
+
+    def is_running(self):
+        return self._process is not None and self._process.is_alive()
+
+
+def _run_worker(shared_memory_name, layout, world_parameters, seed, ms_per_tick, speed, stop_requested):
+    shared_memory = multiprocessing.shared_memory.SharedMemory(name=shared_memory_name)
+    writer = WorldSnapshotWriter(layout, shared_memory.buf)
+    world = World(seed=seed, **world_parameters)
+    simulation = Simulation(world, ms_per_tick)
+    writer.publish(world, simulation.get_ticks())
+    last_publish_time = time.perf_counter()
+    last_time = last_publish_time
+    current_speed = speed.value
+    ms_to_simulate = 0.0
+    while not stop_requested.is_set():
+        now = time.perf_counter()
+        if speed.value != current_speed:
+            current_speed = speed.value
+            ms_to_simulate = 0.0
+        if 0.0 < current_speed:
+            # Paced: owe the simulation its share of wall time, and never let the backlog exceed one second of it
+            ms_to_simulate = min(ms_to_simulate + 1000.0 * (now - last_time) * current_speed, 1000.0 * current_speed)
+        last_time = now
+        if 0.0 < current_speed and ms_to_simulate < ms_per_tick:
+            time.sleep(BackgroundSimulation._IDLE_SLEEP_IN_SEC)
+            continue
+        simulation.step()
+        ms_to_simulate -= ms_per_tick
+        if BackgroundSimulation._MIN_PUBLISH_PERIOD_IN_SEC <= time.perf_counter() - last_publish_time and \
+           writer.publish(world, simulation.get_ticks()):
+            last_publish_time = time.perf_counter()
+    del writer
+    shared_memory.close()
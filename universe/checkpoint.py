@@ -0,0 +1,42 @@
+import os
+import pickle
+import struct
+import zlib
+
+# A checkpoint is a short header followed by the zlib compressed pickle of the whole world object graph: ants with
+# their Orientation and internal state, nests with their queued ants, food, pheromones, the clock and the world's
+# random generator. Restoring it resumes the run exactly where it was saved.
+_MAGIC = b'ANTWORLD'
+_VERSION = 7
+_HEADER = struct.Struct('<8sH')
+_COMPRESSION_LEVEL = 1
+
+
+def dumps_world(world):
+    payload = pickle.dumps(world, protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(_MAGIC, _VERSION) + zlib.compress(payload, _COMPRESSION_LEVEL)
+
+
+def loads_world(data):
+    if len(data) < _HEADER.size:
+        raise ValueError('Not a world checkpoint: too short')
+    magic, version = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError('Not a world checkpoint')
+    if version != _VERSION:
+        raise ValueError('Unsupported world checkpoint version: {}'.format(version))
+    return pickle.loads(zlib.decompress(data[_HEADER.size:]))
+
+
+def save_world(world, path):
+    data = dumps_world(world)
+    # Write next to the target and rename, so a preempted save never leaves a truncated checkpoint behind
+    temporary_path = '{}.tmp'.format(path)
+    with open(temporary_path, 'wb') as checkpoint_file:
+        checkpoint_file.write(data)
+    os.replace(temporary_path, path)
+
+
+def load_world(path):
+    with open(path, 'rb') as checkpoint_file:
+        return loads_world(checkpoint_file.read())
@@ -0,0 +1,216 @@
+from universe.pheromone import Pheromone
+
+from lib.location import Location
+
+import collections
+import math
+
+
+class ColonyMetrics:
+    # Convergence measures kept up to date by World as things happen, so reading them never rescans the world:
+    # a smoothed delivery rate, the path lengths of completed round trips and the share of FOOD
+    # pheromone intensity that lies within the corridors between the nest and the food sources.
+    class Metric:
+        DELIVERY_RATE = 'delivery_rate_per_min'
+        TRAIL_CONCENTRATION = 'trail_concentration'
+        MEAN_ROUND_TRIP_LENGTH = 'mean_round_trip_length'
+
+    def __init__(self, smoothing_sec=300.0, corridor_width=None, max_round_trips_kept=1000):
+        # corridor_width defaults to twice the ants' sensing range of the world this is attached to. smoothing_sec is
+        # the time constant of the exponentially weighted delivery rate: deliveries arrive a few at a time, so a count
+        # over the last minute jumps by 6-14% with every single one of them and never settles within a few percent.
+        self._SMOOTHING_MS = 1000.0 * smoothing_sec
+        self._corridor_width = corridor_width
+        self._time_ms = 0.0
+        self._start_time_ms = 0.0
+        # Deliveries weighted by exp(-age / smoothing time), decayed once per tick
+        self._delivery_weight = 0.0
+        self._deliveries = 0
+        # Distance walked by each ant outside the nest since it last left it
+        self._trip_lengths_by_ant = {}
+        self._round_trip_lengths = collections.deque(maxlen=max_round_trips_kept)
+        self._round_trips = 0
+        self._round_trip_length_sum = 0.0
+        self._round_trip_length_sum_of_squares = 0.0
+        # FOOD intensities all decay by the same factor, so both sums are scaled once per tick instead of per deposit
+        self._food_decay_factor_per_sec = 1.0
+        self._food_intensity = 0.0
+        self._food_intensity_in_corridors = 0.0
+        self._corridors = []
+        self._metric_methods = {ColonyMetrics.Metric.DELIVERY_RATE: self.get_delivery_rate_per_min,
+                                ColonyMetrics.Metric.TRAIL_CONCENTRATION: self.get_trail_concentration,
+                                ColonyMetrics.Metric.MEAN_ROUND_TRIP_LENGTH: self.get_mean_round_trip_length}
+
+    def attach(self, world):
+        # Called by World.set_metrics. Corridors are fixed from here on; FOOD pheromone already in the world is
+        # counted once, everything later arrives through the record_* calls.
+        config = world.get_config()
+        if self._corridor_width is None:
+            self._corridor_width = 2.0 * config.ANT_SENSING_RANGE
+        self._food_decay_factor_per_sec = config.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC
+        self._time_ms = world.get_time_ms()
+        self._start_time_ms = self._time_ms
+        self._corridors = []
+        for nest in world.get_nests():
+            nest_location = world.get_drawing_context(nest)[Location]
+            for food_source in world.get_food_sources():
+                food_location = world.get_drawing_context(food_source)[Location]
+                self._corridors.append((nest_location.x, nest_location.y, food_location.x, food_location.y))
+        self._food_intensity = 0.0
+        self._food_intensity_in_corridors = 0.0
+        pheromone_field = world.get_pheromone_field()
+        if pheromone_field is not None:
+            grid = pheromone_field.get_grid(Pheromone.Type.FOOD)
+            for y, x in zip(*grid.nonzero()):
+                self._add_food_intensity(x + 0.5, y + 0.5, float(grid[y, x]))
+        else:
+            xs, ys, intensities = world.get_pheromone_samples(Pheromone.Type.FOOD)
+            for x, y, intensity in zip(xs, ys, intensities):
+                self._add_food_intensity(x, y, intensity)
+
+    def record_deposit(self, pheromone, location):
+        if pheromone.get_type() == Pheromone.Type.FOOD:
+            self._add_food_intensity(location.x, location.y, pheromone.get_intensity())
+
+    def record_expiry(self, pheromone, location):
+        if pheromone.get_type() == Pheromone.Type.FOOD:
+            self._add_food_intensity(location.x, location.y, -pheromone.get_intensity())
+
+    def record_nest_exit(self, ant):
+        self._trip_lengths_by_ant[ant] = 0.0
+
+    def record_move(self, ant, distance):
+        self._trip_lengths_by_ant[ant] = self._trip_lengths_by_ant.get(ant, 0.0) + distance
+
+    def record_nest_entry(self, ant, carrying_food):
+        # Only trips that brought food back count as round trips; ants that gave up searching just start over
+        trip_length = self._trip_lengths_by_ant.pop(ant, None)
+        if not carrying_food:
+            return
+        self._delivery_weight += 1.0
+        self._deliveries += 1
+        if trip_length is not None:
+            self._round_trip_lengths.append(trip_length)
+            self._round_trips += 1
+            self._round_trip_length_sum += trip_length
+            self._round_trip_length_sum_of_squares += trip_length * trip_length
+
+    def record_tick(self, world):
+        time_ms = world.get_time_ms()
+        decay = self._food_decay_factor_per_sec**((time_ms - self._time_ms) / 1000.0)
+        self._food_intensity *= decay
+        self._food_intensity_in_corridors *= decay
+        self._delivery_weight *= math.exp((self._time_ms - time_ms) / self._SMOOTHING_MS)
+        self._time_ms = time_ms
+
+    def get(self, metric):
+        return self._metric_methods[metric]()
+
+    def get_time_sec(self):
+        return 0.001 * self._time_ms
+
+    def get_deliveries(self):
+        return self._deliveries
+
+    def get_delivery_rate_per_min(self):
+        # None until one smoothing time has been observed. The weights of the observed time add up to less than the
+        # smoothing time, so dividing by their sum keeps the rate from creeping up from 0 at the start.
+        elapsed_ms = self._time_ms - self._start_time_ms
+        if elapsed_ms < self._SMOOTHING_MS:
+            return None
+        observed_weight_ms = self._SMOOTHING_MS * (1.0 - math.exp(-elapsed_ms / self._SMOOTHING_MS))
+        return self._delivery_weight * 60000.0 / observed_weight_ms
+
+    def get_trail_concentration(self):
+        if self._food_intensity <= 0.0:
+            return None
+        return min(max(self._food_intensity_in_corridors / self._food_intensity, 0.0), 1.0)
+
+    def get_round_trips(self):
+        return self._round_trips
+
+    def get_mean_round_trip_length(self):
+        if self._round_trips == 0:
+            return None
+        return self._round_trip_length_sum / self._round_trips
+
+    def get_round_trip_length_stddev(self):
+        if self._round_trips == 0:
+            return None
+        mean = self._round_trip_length_sum / self._round_trips
+        return math.sqrt(max(self._round_trip_length_sum_of_squares / self._round_trips - mean * mean, 0.0))
+
+    def get_round_trip_lengths(self):
+        # The most recent round trips, oldest first
+        return list(self._round_trip_lengths)
+
+    def get_round_trip_length_percentiles(self, percentiles=(10, 50, 90)):
+        lengths = sorted(self._round_trip_lengths)
+        if not lengths:
+            return {}
+        return {percentile: lengths[min(int(len(lengths) * percentile / 100.0), len(lengths) - 1)]
+                for percentile in percentiles}
+
+    def get_summary(self):
+        return {'time_sec': self.get_time_sec(),
+                'deliveries': self._deliveries,
+                'delivery_rate_per_min': self.get_delivery_rate_per_min(),
+                'trail_concentration': self.get_trail_concentration(),
+                'round_trips': self._round_trips,
+                'mean_round_trip_length': self.get_mean_round_trip_length(),
+                'round_trip_length_stddev': self.get_round_trip_length_stddev(),
+                'round_trip_length_percentiles': self.get_round_trip_length_percentiles()}
+
+    def _add_food_intensity(self, x, y, intensity):
+        self._food_intensity += intensity
+        if self._is_in_corridor(x, y):
+            self._food_intensity_in_corridors += intensity
+
+    def _is_in_corridor(self, x, y):
+        half_width_squared = 0.25 * self._corridor_width * self._corridor_width
+        for start_x, start_y, end_x, end_y in self._corridors:
+            # Distance to the nearest point on the segment from the nest to the food source
+            d_x = end_x - start_x
+            d_y = end_y - start_y
+            length_squared = d_x * d_x + d_y * d_y
+            t = 0.0
+            if 0.0 < length_squared:
+                t = min(max(((x - start_x) * d_x + (y - start_y) * d_y) / length_squared, 0.0), 1.0)
+            offset_x = start_x + t * d_x - x
+            offset_y = start_y + t * d_y - y
+            if offset_x * offset_x + offset_y * offset_y <= half_width_squared:
+                return True
+        return False
+
+
+class StableMetric:
+    # A stop condition for Simulation.run: true once a metric has stayed within tolerance (relative) of the value it
+    # had when it last settled, for duration_sec of simulated time
+    def __init__(self, metrics, metric=ColonyMetrics.Metric.DELIVERY_RATE, tolerance=0.05, duration_sec=120.0):
+        self._metrics = metrics
+        self._METRIC = metric
+        self._TOLERANCE = tolerance
+        self._DURATION_SEC = duration_sec
+        self._reference_value = None
+        self._stable_since_sec = None
+        self._met = False
+
+    def __call__(self, simulation):
+        value = self._metrics.get(self._METRIC)
+        now_sec = self._metrics.get_time_sec()
+        if value is None or value <= 0.0:
+            # Nothing to be stable about yet, e.g. before the first delivery
+            self._reference_value = None
+            return False
+        if self._reference_value is None or \
+           self._TOLERANCE * self._reference_value < abs(value - self._reference_value):
+            self._reference_value = value
+            self._stable_since_sec = now_sec
+        self._met = self._DURATION_SEC <= now_sec - self._stable_since_sec
+        return self._met
+
+    def is_met(self):
+        return self._met
+
+    def get_reference_value(self):
+        return self._reference_value
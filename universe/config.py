@@ -0,0 +1,17 @@
+import universe.constants as const
+
+
+class Config:
+    # The values of universe/constants.py as instance attributes, so a world can run with its own overrides
+    # without touching the module globals
+    def __init__(self, **overrides):
+        for name in dir(const):
+            if name.isupper():
+                setattr(self, name, getattr(const, name))
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise ValueError('Unknown constant: {}'.format(name))
+            setattr(self, name, value)
+
+    def get_values(self):
+        return dict(vars(self))
@@ -0,0 +1,37 @@
+from universe.vectorizedworld import VectorizedWorld
+
+import numpy as np
+
+
+class EnsembleWorld(VectorizedWorld):
+    # One VectorizedWorld per seed, all with the same parameters, advanced together by a single update call. Every
+    # world draws from its own generator in the order it would on its own, so world b ends up exactly where
+    # VectorizedWorld(seed=seeds[b]) would. The per-world getters of VectorizedWorld take the world index.
+    def __init__(self,
+                 width,
+                 height,
+                 num_ants_to_spawn,
+                 ant_spawn_period,
+                 num_food_sources,
+                 food_min_dist_to_nest,
+                 food_min_dist_to_world_edge,
+                 max_move_duration_in_sec,
+                 seeds,
+                 config=None):
+        if len(seeds) == 0:
+            raise ValueError('An ensemble needs at least one seed')
+        self._seeds = list(seeds)
+        self._initialize(width, height, num_ants_to_spawn, ant_spawn_period, num_food_sources, food_min_dist_to_nest,
+                         food_min_dist_to_world_edge, max_move_duration_in_sec, self._seeds, config)
+
+    def get_num_worlds(self):
+        return self._NUM_WORLDS
+
+    def get_seeds(self):
+        return self._seeds
+
+    def get_food_delivered_per_world(self):
+        return self._food_delivered.tolist()
+
+    def get_num_ants_in_world_per_world(self):
+        return np.bincount(self._ant_world[self._ant_in_world], minlength=self._NUM_WORLDS).tolist()
@@ -0,0 +1,242 @@
+from universe.config import Config
+
+from abc import abstractmethod, ABCMeta
+import numpy as np
+import math
+
+
+class GraphColony(metaclass=ABCMeta):
+    # Ant colony optimization on a weighted graph, given as a square matrix of edge lengths with math.inf where
+    # there is no edge. It keeps the pheromone model of the simulation: every iteration stands for ms_per_iteration
+    # of simulated time over which the trails decay by ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC, a deposit is at most
+    # ANT_MAX_PHEROMONE_INTENSITY, and trails never fade below ANT_MIN_PHEROMONE_INTENSITY (where a Pheromone would
+    # have expired), so no edge is ever ruled out. An ant takes an edge with a probability proportional to
+    # intensity**alpha / length**beta, where beta defaults to ANT_SENSING_ATTENUATION_GAIN, and with probability
+    # exploration a random allowed one instead. All ants of an iteration walk in lockstep as rows of NumPy arrays;
+    # the num_depositing_ants shortest paths of the iteration are then added to the pheromone matrix in one go.
+    def __init__(self, distances, num_ants, config=None, seed=None, ms_per_iteration=10000.0, alpha=1.0, beta=None,
+                 exploration=0.0, num_depositing_ants=1):
+        self._config = config if config is not None else Config()
+        self._distances = np.array(distances, dtype=float)
+        if self._distances.ndim != 2 or self._distances.shape[0] != self._distances.shape[1]:
+            raise ValueError('distances has to be a square matrix, not {}'.format(self._distances.shape))
+        if (self._distances < 0.0).any():
+            raise ValueError('Edge lengths can\'t be negative')
+        self._NUM_NODES = self._distances.shape[0]
+        self._NUM_ANTS = num_ants
+        self._rand = np.random.default_rng(seed)
+        self._DECAY_PER_ITERATION = self._config.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC**(ms_per_iteration / 1000.0)
+        self._MIN_INTENSITY = self._config.ANT_MIN_PHEROMONE_INTENSITY
+        self._MAX_INTENSITY = self._config.ANT_MAX_PHEROMONE_INTENSITY
+        # Not ANT_CHAOS_FACTOR: a random jump anywhere on a graph costs far more than a slight turn in the world
+        self._EXPLORATION = exploration
+        self._NUM_DEPOSITING_ANTS = num_depositing_ants
+        self._ALPHA = alpha
+        self._BETA = beta if beta is not None else self._config.ANT_SENSING_ATTENUATION_GAIN
+        self._SYMMETRIC = np.array_equal(self._distances, self._distances.T)
+        self._has_edge = np.isfinite(self._distances)
+        np.fill_diagonal(self._has_edge, False)
+        # How much an edge's length alone speaks for it; zero where there is no edge, so those are never taken
+        self._visibility = np.zeros_like(self._distances)
+        lengths = np.maximum(self._distances[self._has_edge], 1e-12)
+        self._visibility[self._has_edge] = lengths**-self._BETA
+        self._pheromones = np.where(self._has_edge, self._MAX_INTENSITY, 0.0)
+        self._iterations = 0
+        self._best_path = None
+        self._best_length = math.inf
+
+    def get_num_nodes(self):
+        return self._NUM_NODES
+
+    def get_pheromones(self):
+        return self._pheromones
+
+    def get_iterations(self):
+        return self._iterations
+
+    def get_best_path(self):
+        # The best tour or path found so far as a list of nodes, None before one has been found
+        return self._best_path
+
+    def get_best_length(self):
+        return self._best_length
+
+    def get_path_length(self, path):
+        return float(self._distances[path[:-1], path[1:]].sum())
+
+    def step(self):
+        # One iteration: every ant builds a path, then all trails decay and the ants deposit in one batch. Returns the
+        # length of the best path of this iteration, math.inf when no ant found one.
+        paths, lengths, completed = self._construct_paths(self._get_edge_weights())
+        best_length = math.inf
+        if completed.any():
+            best_ant = np.flatnonzero(completed)[np.argmin(lengths[completed])]
+            best_length = float(lengths[best_ant])
+            if best_length < self._best_length:
+                self._best_length = best_length
+                self._best_path = self._get_path_nodes(paths[best_ant])
+        self._pheromones *= self._DECAY_PER_ITERATION
+        if completed.any():
+            depositing = np.flatnonzero(completed)[np.argsort(lengths[completed], kind='stable')]
+            depositing = depositing[:self._NUM_DEPOSITING_ANTS]
+            self._deposit(paths[depositing], lengths[depositing])
+        np.maximum(self._pheromones, self._MIN_INTENSITY, out=self._pheromones, where=self._has_edge)
+        self._iterations += 1
+        return best_length
+
+    def run(self, num_iterations=None, stop_condition=None):
+        # Like Simulation.run: until num_iterations have run or stop_condition(colony) returns True
+        iterations_run = 0
+        while num_iterations is None or iterations_run < num_iterations:
+            if stop_condition is not None and stop_condition(self):
+                break
+            self.step()
+            iterations_run += 1
+        return iterations_run
+
+    def _get_edge_weights(self):
+        if self._ALPHA == 1.0:
+            return self._pheromones * self._visibility
+        return self._pheromones**self._ALPHA * self._visibility
+
+    def _deposit(self, paths, lengths):
+        # A path as long as the best one so far deposits ANT_MAX_PHEROMONE_INTENSITY on each of its edges, longer
+        # ones proportionally less
+        intensities = self._MAX_INTENSITY * self._best_length / lengths
+        from_nodes = paths[:, :-1]
+        to_nodes = paths[:, 1:]
+        # Paths shorter than the longest one are padded with -1
+        on_path = 0 <= to_nodes
+        amounts = np.broadcast_to(intensities[:, np.newaxis], from_nodes.shape)[on_path]
+        np.add.at(self._pheromones, (from_nodes[on_path], to_nodes[on_path]), amounts)
+        if self._SYMMETRIC:
+            np.add.at(self._pheromones, (to_nodes[on_path], from_nodes[on_path]), amounts)
+
+    def _choose(self, weights, allowed):
+        # Index into each row of weights, drawn with a probability proportional to the weights, or uniformly among
+        # the allowed entries for exploring ants; -1 for rows with nothing to choose from
+        weights = np.where(allowed, weights, 0.0)
+        if 0.0 < self._EXPLORATION:
+            exploring = self._rand.random(len(weights)) < self._EXPLORATION
+            weights = np.where(exploring[:, np.newaxis], allowed, weights)
+        cumulative = np.cumsum(weights, axis=1)
+        totals = cumulative[:, -1]
+        thresholds = self._rand.random(len(weights)) * totals
+        choices = np.minimum(np.count_nonzero(cumulative <= thresholds[:, np.newaxis], axis=1), weights.shape[1] - 1)
+        choices[totals <= 0.0] = -1
+        return choices
+
+    @abstractmethod
+    def _construct_paths(self, edge_weights):
+        # Returns an (ants, nodes) array of paths padded with -1, their lengths and which of them are complete
+        pass
+
+    def _get_path_nodes(self, path):
+        return path[0 <= path].tolist()
+
+
+class TspColony(GraphColony):
+    # Closed tours through every node; the graph has to be complete. Ants start at random nodes and only look at the
+    # num_candidates nearest nodes they have not visited yet, falling back to the best unvisited node when all of
+    # those are taken, which keeps an iteration at O(ants * nodes * num_candidates) rather than O(ants * nodes**2).
+    def __init__(self, distances, num_ants=32, config=None, seed=None, ms_per_iteration=10000.0, alpha=1.0,
+                 beta=None, exploration=0.0, num_depositing_ants=1, num_candidates=20):
+        GraphColony.__init__(self, distances, num_ants, config, seed, ms_per_iteration, alpha, beta, exploration,
+                             num_depositing_ants)
+        if not (self._has_edge | np.eye(self._NUM_NODES, dtype=bool)).all():
+            raise ValueError('A tour needs an edge between every two nodes')
+        num_candidates = min(num_candidates, self._NUM_NODES - 1) if num_candidates is not None \
+            else self._NUM_NODES - 1
+        ordered = np.argsort(np.where(self._has_edge, self._distances, math.inf), axis=1, kind='stable')
+        self._candidates = ordered[:, :num_candidates]
+
+    def get_path_length(self, path):
+        return GraphColony.get_path_length(self, list(path) + [path[0]])
+
+    def _construct_paths(self, edge_weights):
+        num_ants = self._NUM_ANTS
+        ants = np.arange(num_ants)
+        ant_rows = ants[:, np.newaxis]
+        tours = np.empty((num_ants, self._NUM_NODES + 1), dtype=np.intp)
+        current = self._rand.integers(self._NUM_NODES, size=num_ants)
+        tours[:, 0] = current
+        visited = np.zeros((num_ants, self._NUM_NODES), dtype=bool)
+        visited[ants, current] = True
+        for step in range(1, self._NUM_NODES):
+            candidates = self._candidates[current]
+            choices = self._choose(edge_weights[current[:, np.newaxis], candidates], ~visited[ant_rows, candidates])
+            next_nodes = candidates[ants, np.maximum(choices, 0)]
+            stuck = choices < 0
+            if stuck.any():
+                fallback_weights = np.where(visited[stuck], -1.0, edge_weights[current[stuck]])
+                next_nodes[stuck] = np.argmax(fallback_weights, axis=1)
+            visited[ants, next_nodes] = True
+            tours[:, step] = next_nodes
+            current = next_nodes
+        # Back to the start, so the closing edge gets its share of pheromone too
+        tours[:, -1] = tours[:, 0]
+        lengths = self._distances[tours[:, :-1], tours[:, 1:]].sum(axis=1)
+        return tours, lengths, np.ones(num_ants, dtype=bool)
+
+    def _get_path_nodes(self, path):
+        return path[:-1].tolist()
+
+
+class ShortestPathColony(GraphColony):
+    # Paths from source to target that never visit a node twice. Ants that run into a dead end drop out of the
+    # iteration without depositing.
+    def __init__(self, distances, source, target, num_ants=32, config=None, seed=None, ms_per_iteration=10000.0,
+                 alpha=1.0, beta=None, exploration=0.0, num_depositing_ants=1):
+        GraphColony.__init__(self, distances, num_ants, config, seed, ms_per_iteration, alpha, beta, exploration,
+                             num_depositing_ants)
+        if not (0 <= source < self._NUM_NODES and 0 <= target < self._NUM_NODES) or source == target:
+            raise ValueError('source and target have to be two different nodes')
+        self._SOURCE = source
+        self._TARGET = target
+
+    def _construct_paths(self, edge_weights):
+        num_ants = self._NUM_ANTS
+        paths = np.full((num_ants, self._NUM_NODES), -1, dtype=np.intp)
+        paths[:, 0] = self._SOURCE
+        lengths = np.zeros(num_ants)
+        visited = np.zeros((num_ants, self._NUM_NODES), dtype=bool)
+        visited[:, self._SOURCE] = True
+        completed = np.zeros(num_ants, dtype=bool)
+        walking = np.arange(num_ants)
+        current = np.full(num_ants, self._SOURCE, dtype=np.intp)
+        for step in range(1, self._NUM_NODES):
+            choices = self._choose(edge_weights[current], self._has_edge[current] & ~visited[walking])
+            stuck = choices < 0
+            walking = walking[~stuck]
+            current = current[~stuck]
+            next_nodes = choices[~stuck]
+            lengths[walking] += self._distances[current, next_nodes]
+            visited[walking, next_nodes] = True
+            paths[walking, step] = next_nodes
+            arrived = next_nodes == self._TARGET
+            completed[walking[arrived]] = True
+            walking = walking[~arrived]
+            current = next_nodes[~arrived]
+            if len(walking) == 0:
+                break
+        return paths, lengths, completed
+
+
+def nearest_neighbour_tour(distances, start=0):
+    # The greedy tour, as a yardstick for TspColony
+    distances = np.array(distances, dtype=float)
+    visited = np.zeros(len(distances), dtype=bool)
+    tour = [start]
+    visited[start] = True
+    for _ in range(len(distances) - 1):
+        next_node = int(np.argmin(np.where(visited, math.inf, distances[tour[-1]])))
+        tour.append(next_node)
+        visited[next_node] = True
+    return tour
+
+
+def euclidean_distances(xs, ys):
+    # Edge lengths of the complete graph between points in the plane, e.g. for random TSP instances
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    return np.hypot(xs[:, np.newaxis] - xs[np.newaxis, :], ys[:, np.newaxis] - ys[np.newaxis, :])
@@ -2,6 +2,8 @@ from abc import abstractmethod, ABCMeta
 
 
 class ICollidable(metaclass=ABCMeta):
+    __slots__ = ()
+
     @abstractmethod
     def get_collision_radius(self):
         pass
@@ -0,0 +1,100 @@
+import json
+import time
+
+
+class Instrumentation:
+    class Phase:
+        PHEROMONE_DECAY = 'pheromone_decay'
+        NESTS = 'nests'
+        ANT_SENSING = 'ant_sensing'
+        ANT_DECISION = 'ant_decision'
+        ANT_ACTIONS = 'ant_actions'
+
+    class Counter:
+        ANTS_SENSING = 'ants_sensing'
+        TIMER_ACTIONS = 'timer_actions'
+        OBJECTS_SENSED = 'objects_sensed'
+        PHEROMONES_REMOVED = 'pheromones_removed'
+        PHEROMONES_EVICTED = 'pheromones_evicted'
+        # New deposits not added because they would have been the first to be evicted
+        PHEROMONES_DROPPED = 'pheromones_dropped'
+        PHEROMONES_MERGED = 'pheromones_merged'
+        MOVES_OUT_OF_BOUNDS = 'moves_out_of_bounds'
+        MOVES_BLOCKED_BY_FOOD = 'moves_blocked_by_food'
+        MOVES_BLOCKED_BY_OBSTACLE = 'moves_blocked_by_obstacle'
+        MOVES_BLOCKED_BY_ANT = 'moves_blocked_by_ant'
+        ANTS_ENTERED_NEST = 'ants_entered_nest'
+        ANTS_LEFT_NEST = 'ants_left_nest'
+
+    def __init__(self, dump_path=None, dump_period_ticks=100):
+        # With a dump_path, one JSON line summing up the last dump_period_ticks ticks is appended per period
+        self._DUMP_PATH = dump_path
+        self._DUMP_PERIOD_TICKS = dump_period_ticks
+        self._ticks = 0
+        self._tick_phase_times = {}
+        self._tick_counters = {}
+        self._last_tick = None
+        self._total_phase_times = {}
+        self._total_counters = {}
+        self._period_ticks = 0
+        self._period_phase_times = {}
+        self._period_counters = {}
+        self._period_start_time = time.perf_counter()
+
+    def start_tick(self):
+        self._tick_phase_times = {}
+        self._tick_counters = {}
+
+    def add_time(self, phase, seconds):
+        self._tick_phase_times[phase] = self._tick_phase_times.get(phase, 0.0) + seconds
+
+    def count(self, counter, amount=1):
+        self._tick_counters[counter] = self._tick_counters.get(counter, 0) + amount
+
+    def end_tick(self):
+        self._ticks += 1
+        self._period_ticks += 1
+        self._last_tick = {'tick': self._ticks,
+                           'phase_times_ms': {phase: 1000.0 * seconds
+                                              for phase, seconds in self._tick_phase_times.items()},
+                           'counters': dict(self._tick_counters)}
+        for totals, period_totals, values in ((self._total_phase_times, self._period_phase_times,
+                                               self._tick_phase_times),
+                                              (self._total_counters, self._period_counters, self._tick_counters)):
+            for name, value in values.items():
+                totals[name] = totals.get(name, 0) + value
+                period_totals[name] = period_totals.get(name, 0) + value
+        if self._DUMP_PATH is not None and self._DUMP_PERIOD_TICKS <= self._period_ticks:
+            self.dump()
+
+    def get_ticks(self):
+        return self._ticks
+
+    def get_last_tick(self):
+        return self._last_tick
+
+    def get_totals(self):
+        return {'ticks': self._ticks,
+                'phase_times_ms': {phase: 1000.0 * seconds for phase, seconds in self._total_phase_times.items()},
+                'counters': dict(self._total_counters)}
+
+    def flush(self):
+        # Writes out the ticks of a period that was cut short, e.g. by a run ending on an arbitrary tick
+        if self._DUMP_PATH is not None and 0 < self._period_ticks:
+            self.dump()
+
+    def dump(self):
+        now = time.perf_counter()
+        ticks = max(self._period_ticks, 1)
+        record = {'tick': self._ticks,
+                  'period_ticks': self._period_ticks,
+                  'period_wall_time_ms': 1000.0 * (now - self._period_start_time),
+                  'mean_phase_times_ms': {phase: 1000.0 * seconds / ticks
+                                          for phase, seconds in self._period_phase_times.items()},
+                  'counters': dict(self._period_counters)}
+        with open(self._DUMP_PATH, 'a') as dump_file:
+            dump_file.write(json.dumps(record, sort_keys=True) + '\n')
+        self._period_ticks = 0
+        self._period_phase_times = {}
+        self._period_counters = {}
+        self._period_start_time = now
@@ -2,6 +2,8 @@ from abc import abstractmethod, ABCMeta
 
 
 class ISensable(metaclass=ABCMeta):
+    __slots__ = ()
+
     @abstractmethod
     def get_intensity(self):
         pass
@@ -2,6 +2,8 @@ from abc import abstractmethod, ABCMeta
 
 
 class IUpdatable(metaclass=ABCMeta):
+    __slots__ = ()
+
     @abstractmethod
     def update(self, ms_elapsed, local_context):
         pass
@@ -2,17 +2,27 @@ from universe.iupdatable import IUpdatable
 from universe.isensable import ISensable
 from universe.ant import Ant
 from universe.actions import LeaveNest
-import universe.constants as const
+from universe.config import Config
+
+from lib.sensingquery import SensingQuery
+
+import collections
+import random as rand
 
 
 class Nest(IUpdatable, ISensable):
-    def __init__(self, num_ants_to_spawn, spawn_period_in_sec, pheromone_intensity):
+    def __init__(self, num_ants_to_spawn, spawn_period_in_sec, pheromone_intensity, config=None,
+                 random_generator=rand):
+        self._config = config if config is not None else Config()
+        self._rand = random_generator
         self._NUM_ANTS_TO_SPAWN = num_ants_to_spawn
         self._SPAWN_PERIOD_IN_SEC = spawn_period_in_sec
         self._PHEROMONE_INTENSITY = pheromone_intensity
         self._ms_since_last_spawn = 0
         self._num_ants_spawned = 0
-        self._ants = []
+        # Ants wait here in the order they came in; only the one at the front is looked at each tick
+        self._ants = collections.deque()
+        self._sensing_query = SensingQuery()
         self._spawn_ant()
 
     def update(self, ms_elapsed, context):
@@ -22,31 +32,42 @@ class Nest(IUpdatable, ISensable):
             self._spawn_ant()
 
         context['in_nest'] = True
-        for ant in self._ants:
+        for i, ant in enumerate(self._ants):
             requested_action = ant.update(ms_elapsed, context)
             if type(requested_action) == LeaveNest:
-                self._ants.remove(ant)
+                # Ants leave as soon as they are asked, so this is nearly always the front one and O(1)
+                del self._ants[i]
                 return ant
 
     def enter_ant(self, ant):
         self._ants.append(ant)
 
+    def get_num_ants(self):
+        return len(self._ants)
+
     def get_intensity(self):
         return self._PHEROMONE_INTENSITY
 
+    def get_sensing_query(self):
+        return self._sensing_query
+
+    def create_ant(self):
+        return Ant(self._config.ANT_LENGTH,
+                   self._config.ANT_WIDTH,
+                   self._config.ANT_PHEROMONE_DEPOSIT_RATE_PER_SEC,
+                   self._config.ANT_PHEROMONE_DEPOSIT_INTENSITY_DECAY_FACTOR_PER_SEC,
+                   self._config.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC,
+                   self._config.ANT_NEST_PHEROMONE_DECAY_FACTOR_PER_SEC,
+                   self._config.ANT_CHAOS_FACTOR,
+                   self._config.ANT_MOVE_SPEED,
+                   self._config.ANT_HEADING_DELTA_MOMENTUM_FACTOR,
+                   self._config.ANT_MAX_SEARCHING_TIME_IN_SEC,
+                   self._config.ANT_SENSING_RANGE,
+                   self._config.ANT_SENSING_ATTENUATION_GAIN,
+                   self._config.ANT_COLLISION_AVOIDANCE_HEADING_INCREMENT,
+                   self._rand)
+
     def _spawn_ant(self):
-        self._ants.append(Ant(const.ANT_LENGTH,
-                              const.ANT_WIDTH,
-                              const.ANT_PHEROMONE_DEPOSIT_RATE_PER_SEC,
-                              const.ANT_PHEROMONE_DEPOSIT_INTENSITY_DECAY_FACTOR_PER_SEC,
-                              const.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC,
-                              const.ANT_NEST_PHEROMONE_DECAY_FACTOR_PER_SEC,
-                              const.ANT_CHAOS_FACTOR,
-                              const.ANT_MOVE_SPEED,
-                              const.ANT_HEADING_DELTA_MOMENTUM_FACTOR,
-                              const.ANT_MAX_SEARCHING_TIME_IN_SEC,
-                              const.ANT_SENSING_RANGE,
-                              const.ANT_SENSING_ATTENUATION_GAIN,
-                              const.ANT_COLLISION_AVOIDANCE_HEADING_INCREMENT))
+        self._ants.append(self.create_ant())
         self._ms_since_last_spawn = 0
         self._num_ants_spawned += 1
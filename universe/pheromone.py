@@ -1,26 +1,75 @@
 from universe.iupdatable import IUpdatable
 from universe.isensable import ISensable
 
+import math
+import weakref
+
 
 class Pheromone(IUpdatable, ISensable):
+    __slots__ = ('_type', '_produced_by', '_DECAY_FACTOR', '_intensity', '_clock', '_deposit_time_ms')
+
     class Type:
         NEST = 0
         FOOD = 1
 
     def __init__(self, pheromone_type, produced_by, decay_factor_per_sec, intensity):
         self._type = pheromone_type
-        self._produced_by = produced_by
+        # Only weakly referenced, so that deposits don't keep ants that have gone alive
+        self._produced_by = weakref.ref(produced_by) if produced_by is not None else None
         self._DECAY_FACTOR = decay_factor_per_sec
         self._intensity = intensity
+        self._clock = None
+        self._deposit_time_ms = 0.0
 
     def update(self, ms_elapsed, context):
-        self._intensity *= self._DECAY_FACTOR**(ms_elapsed / 1000.0)
+        # Once deposited the intensity follows from the deposit time and the clock, so there is nothing to do
+        if self._clock is None:
+            self._intensity *= self._DECAY_FACTOR**(ms_elapsed / 1000.0)
+
+    def deposit(self, clock):
+        self._clock = clock
+        self._deposit_time_ms = clock.ms
+
+    def reinforce(self, intensity):
+        # Adds to a deposited pheromone's current intensity, which then decays from now on
+        self._intensity = self.get_intensity() + intensity
+        self._deposit_time_ms = self._clock.ms
 
     def get_type(self):
         return self._type
 
     def get_producer(self):
-        return self._produced_by
+        # None when there was no producer or it no longer exists
+        return self._produced_by() if self._produced_by is not None else None
 
-    def get_intensity(self):
+    def get_decay_factor(self):
+        return self._DECAY_FACTOR
+
+    def get_deposit_intensity(self):
+        # The intensity at get_deposit_time_ms, from which get_intensity decays
         return self._intensity
+
+    def get_deposit_time_ms(self):
+        return self._deposit_time_ms
+
+    def get_intensity(self):
+        if self._clock is None:
+            return self._intensity
+        return self._intensity * self._DECAY_FACTOR**((self._clock.ms - self._deposit_time_ms) / 1000.0)
+
+    def get_expiry_time_ms(self, min_intensity):
+        # Clock time after which the intensity is below min_intensity
+        if self._intensity < min_intensity:
+            return self._deposit_time_ms
+        if 1.0 <= self._DECAY_FACTOR:
+            return math.inf
+        return self._deposit_time_ms + 1000.0 * math.log(min_intensity / self._intensity) / math.log(self._DECAY_FACTOR)
+
+    def __getstate__(self):
+        # Weak references can't be pickled, so the producer itself goes into checkpoints
+        return (self._type, self.get_producer(), self._DECAY_FACTOR, self._intensity, self._clock,
+                self._deposit_time_ms)
+
+    def __setstate__(self, state):
+        self._type, produced_by, self._DECAY_FACTOR, self._intensity, self._clock, self._deposit_time_ms = state
+        self._produced_by = weakref.ref(produced_by) if produced_by is not None else None
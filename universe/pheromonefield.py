@@ -0,0 +1,195 @@
+import numpy as np
+import math
+
+
+class PheromoneField:
+    # Cells whose intensity drops below the minimum are zeroed at most this often, so that the
+    # per-tick cost stays a single multiply per grid and values never decay into denormals.
+    _CLEANUP_PERIOD_MS = 1000.0
+
+    def __init__(self, width, height, decay_factors_per_sec, min_intensity):
+        self._width = width
+        self._height = height
+        self._DECAY_FACTORS_PER_SEC = dict(decay_factors_per_sec)
+        self._MIN_INTENSITY = min_intensity
+        self._grids = {pheromone_type: np.zeros((height, width), dtype=np.float32)
+                       for pheromone_type in self._DECAY_FACTORS_PER_SEC}
+        self._ms_since_cleanup = 0.0
+
+    def update(self, ms_elapsed):
+        for pheromone_type, grid in self._grids.items():
+            grid *= np.float32(self._DECAY_FACTORS_PER_SEC[pheromone_type]**(ms_elapsed / 1000.0))
+        self._ms_since_cleanup += ms_elapsed
+        if self._CLEANUP_PERIOD_MS <= self._ms_since_cleanup:
+            self._ms_since_cleanup = 0.0
+            for grid in self._grids.values():
+                grid[grid < self._MIN_INTENSITY] = 0.0
+
+    def deposit(self, pheromone_type, location, intensity):
+        self._grids[pheromone_type][int(location.y), int(location.x)] += intensity
+
+    def get_grid(self, pheromone_type):
+        return self._grids[pheromone_type]
+
+    def get_types(self):
+        return self._grids.keys()
+
+    def get_min_intensity(self):
+        return self._MIN_INTENSITY
+
+    def get_intensity_at(self, pheromone_type, location):
+        intensity = float(self._grids[pheromone_type][int(location.y), int(location.x)])
+        return intensity if self._MIN_INTENSITY <= intensity else 0.0
+
+    def get_num_active_cells(self, pheromone_type):
+        return int(np.count_nonzero(self._MIN_INTENSITY <= self._grids[pheromone_type]))
+
+    def get_memory_in_bytes(self):
+        return sum(grid.nbytes for grid in self._grids.values())
+
+    def sense(self, pheromone_type, orientation, radius, forward_only=False):
+        # Returns (angle_rad, distance, intensity) for every cell within radius of the orientation, with angles
+        # relative to the orientation's heading. Cells are treated as sitting at their centres. With forward_only
+        # cells in the half-plane behind the heading are dropped before any trig is done.
+        location = orientation.location
+        bbox_x1 = max(0, int(location.x - radius))
+        bbox_x2 = min(self._width, math.ceil(location.x + radius))
+        bbox_y1 = max(0, int(location.y - radius))
+        bbox_y2 = min(self._height, math.ceil(location.y + radius))
+        window = self._grids[pheromone_type][bbox_y1:bbox_y2, bbox_x1:bbox_x2]
+        rows, cols = np.nonzero(self._MIN_INTENSITY <= window)
+        if 0 == len(rows):
+            return []
+        intensities = window[rows, cols]
+        d_x = cols + (bbox_x1 + 0.5 - location.x)
+        d_y = rows + (bbox_y1 + 0.5 - location.y)
+        return _sense_cells(d_x, d_y, intensities, orientation, radius, forward_only)
+
+
+class ChunkedPheromoneField:
+    # Same interface as PheromoneField, but each grid is split into chunk_size x chunk_size tiles that are created
+    # by the first deposit into them and dropped once everything in them has decayed. Memory and per-tick work
+    # follow the area the ants have actually marked, not the size of the world.
+    _CLEANUP_PERIOD_MS = PheromoneField._CLEANUP_PERIOD_MS
+
+    def __init__(self, width, height, decay_factors_per_sec, min_intensity, chunk_size):
+        self._width = width
+        self._height = height
+        self._CHUNK_SIZE = chunk_size
+        self._DECAY_FACTORS_PER_SEC = dict(decay_factors_per_sec)
+        self._MIN_INTENSITY = min_intensity
+        # (chunk_x, chunk_y) -> chunk_size x chunk_size grid indexed [y, x], per pheromone type
+        self._chunks = {pheromone_type: {} for pheromone_type in self._DECAY_FACTORS_PER_SEC}
+        self._ms_since_cleanup = 0.0
+
+    def update(self, ms_elapsed):
+        for pheromone_type, chunks in self._chunks.items():
+            factor = np.float32(self._DECAY_FACTORS_PER_SEC[pheromone_type]**(ms_elapsed / 1000.0))
+            for chunk in chunks.values():
+                chunk *= factor
+        self._ms_since_cleanup += ms_elapsed
+        if self._CLEANUP_PERIOD_MS <= self._ms_since_cleanup:
+            self._ms_since_cleanup = 0.0
+            for chunks in self._chunks.values():
+                for chunk_key in list(chunks.keys()):
+                    chunk = chunks[chunk_key]
+                    chunk[chunk < self._MIN_INTENSITY] = 0.0
+                    if not chunk.any():
+                        del chunks[chunk_key]
+
+    def deposit(self, pheromone_type, location, intensity):
+        cell_x = int(location.x)
+        cell_y = int(location.y)
+        chunk_key = (cell_x // self._CHUNK_SIZE, cell_y // self._CHUNK_SIZE)
+        chunks = self._chunks[pheromone_type]
+        chunk = chunks.get(chunk_key)
+        if chunk is None:
+            chunk = np.zeros((self._CHUNK_SIZE, self._CHUNK_SIZE), dtype=np.float32)
+            chunks[chunk_key] = chunk
+        chunk[cell_y - chunk_key[1] * self._CHUNK_SIZE, cell_x - chunk_key[0] * self._CHUNK_SIZE] += intensity
+
+    def get_grid(self, pheromone_type):
+        # A dense copy of the whole world, for drawing; large worlds should use get_chunks() instead
+        grid = np.zeros((self._height, self._width), dtype=np.float32)
+        for (chunk_x, chunk_y), chunk in self._chunks[pheromone_type].items():
+            x1 = chunk_x * self._CHUNK_SIZE
+            y1 = chunk_y * self._CHUNK_SIZE
+            window = grid[y1:y1 + self._CHUNK_SIZE, x1:x1 + self._CHUNK_SIZE]
+            window[...] = chunk[:window.shape[0], :window.shape[1]]
+        return grid
+
+    def get_chunks(self, pheromone_type):
+        return self._chunks[pheromone_type]
+
+    def get_chunk_size(self):
+        return self._CHUNK_SIZE
+
+    def get_num_chunks(self):
+        return sum(len(chunks) for chunks in self._chunks.values())
+
+    def get_types(self):
+        return self._chunks.keys()
+
+    def get_min_intensity(self):
+        return self._MIN_INTENSITY
+
+    def get_intensity_at(self, pheromone_type, location):
+        cell_x = int(location.x)
+        cell_y = int(location.y)
+        chunk_key = (cell_x // self._CHUNK_SIZE, cell_y // self._CHUNK_SIZE)
+        chunk = self._chunks[pheromone_type].get(chunk_key)
+        if chunk is None:
+            return 0.0
+        intensity = float(chunk[cell_y - chunk_key[1] * self._CHUNK_SIZE, cell_x - chunk_key[0] * self._CHUNK_SIZE])
+        return intensity if self._MIN_INTENSITY <= intensity else 0.0
+
+    def get_num_active_cells(self, pheromone_type):
+        return sum(int(np.count_nonzero(self._MIN_INTENSITY <= chunk))
+                   for chunk in self._chunks[pheromone_type].values())
+
+    def get_memory_in_bytes(self):
+        return sum(chunk.nbytes for chunks in self._chunks.values() for chunk in chunks.values())
+
+    def sense(self, pheromone_type, orientation, radius, forward_only=False):
+        # See PheromoneField.sense; only the chunks overlapping the sensing range are looked at
+        location = orientation.location
+        bbox_x1 = max(0, int(location.x - radius))
+        bbox_x2 = min(self._width, math.ceil(location.x + radius))
+        bbox_y1 = max(0, int(location.y - radius))
+        bbox_y2 = min(self._height, math.ceil(location.y + radius))
+        chunks = self._chunks[pheromone_type]
+        d_xs = []
+        d_ys = []
+        intensities = []
+        for chunk_y in range(bbox_y1 // self._CHUNK_SIZE, (bbox_y2 - 1) // self._CHUNK_SIZE + 1):
+            for chunk_x in range(bbox_x1 // self._CHUNK_SIZE, (bbox_x2 - 1) // self._CHUNK_SIZE + 1):
+                chunk = chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    continue
+                x1 = max(bbox_x1, chunk_x * self._CHUNK_SIZE)
+                x2 = min(bbox_x2, (chunk_x + 1) * self._CHUNK_SIZE)
+                y1 = max(bbox_y1, chunk_y * self._CHUNK_SIZE)
+                y2 = min(bbox_y2, (chunk_y + 1) * self._CHUNK_SIZE)
+                window = chunk[y1 - chunk_y * self._CHUNK_SIZE:y2 - chunk_y * self._CHUNK_SIZE,
+                               x1 - chunk_x * self._CHUNK_SIZE:x2 - chunk_x * self._CHUNK_SIZE]
+                rows, cols = np.nonzero(self._MIN_INTENSITY <= window)
+                if 0 == len(rows):
+                    continue
+                intensities.append(window[rows, cols])
+                d_xs.append(cols + (x1 + 0.5 - location.x))
+                d_ys.append(rows + (y1 + 0.5 - location.y))
+        if not intensities:
+            return []
+        return _sense_cells(np.concatenate(d_xs), np.concatenate(d_ys), np.concatenate(intensities), orientation,
+                            radius, forward_only)
+
+
+def _sense_cells(d_x, d_y, intensities, orientation, radius, forward_only):
+    # d_x, d_y are the offsets of cell centres from the sensor, intensities those of the cells
+    distances = np.hypot(d_x, d_y)
+    in_range = distances < radius
+    if forward_only:
+        in_range &= 0.0 < d_x * math.sin(orientation.heading_rad) - d_y * math.cos(orientation.heading_rad)
+    # Same convention as lib.computations.heading_of_line: 0 points up the screen, angles grow clockwise
+    angles = np.arctan2(d_x[in_range], -d_y[in_range]) - orientation.heading_rad
+    return list(zip(angles.tolist(), distances[in_range].tolist(), intensities[in_range].tolist()))
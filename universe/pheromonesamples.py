@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class PheromoneSamples:
+    # The pheromones of one type as NumPy arrays of their locations, intensities at deposit, deposit times and decay
+    # factors, kept up to date by World as pheromones come and go. Current intensities then follow in one vectorized
+    # decay instead of a get_intensity call per pheromone. Removing a pheromone moves the last one into its slot.
+    _INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self._slots_by_pheromone = {}
+        self._pheromones = []
+        self._xs = np.empty(self._INITIAL_CAPACITY)
+        self._ys = np.empty(self._INITIAL_CAPACITY)
+        self._deposit_intensities = np.empty(self._INITIAL_CAPACITY)
+        self._deposit_times_ms = np.empty(self._INITIAL_CAPACITY)
+        self._decay_factors = np.empty(self._INITIAL_CAPACITY)
+
+    def add(self, pheromone, location):
+        slot = len(self._pheromones)
+        if slot == len(self._xs):
+            self._grow()
+        self._slots_by_pheromone[pheromone] = slot
+        self._pheromones.append(pheromone)
+        self._xs[slot] = location.x
+        self._ys[slot] = location.y
+        self._decay_factors[slot] = pheromone.get_decay_factor()
+        self.update(pheromone)
+
+    def update(self, pheromone):
+        # After a deposited pheromone has been reinforced
+        slot = self._slots_by_pheromone[pheromone]
+        self._deposit_intensities[slot] = pheromone.get_deposit_intensity()
+        self._deposit_times_ms[slot] = pheromone.get_deposit_time_ms()
+
+    def remove(self, pheromone):
+        slot = self._slots_by_pheromone.pop(pheromone)
+        last_pheromone = self._pheromones.pop()
+        if last_pheromone is not pheromone:
+            last_slot = len(self._pheromones)
+            for array in (self._xs, self._ys, self._deposit_intensities, self._deposit_times_ms, self._decay_factors):
+                array[slot] = array[last_slot]
+            self._pheromones[slot] = last_pheromone
+            self._slots_by_pheromone[last_pheromone] = slot
+
+    def get_samples(self, time_ms):
+        # xs, ys and the intensities at time_ms, as arrays
+        count = len(self._pheromones)
+        intensities = self._deposit_intensities[:count] * \
+            self._decay_factors[:count]**((time_ms - self._deposit_times_ms[:count]) / 1000.0)
+        return self._xs[:count], self._ys[:count], intensities
+
+    def _grow(self):
+        capacity = 2 * len(self._xs)
+        for name in ('_xs', '_ys', '_deposit_intensities', '_deposit_times_ms', '_decay_factors'):
+            array = np.empty(capacity)
+            array[:len(self._pheromones)] = getattr(self, name)
+            setattr(self, name, array)
@@ -0,0 +1,45 @@
+import time
+
+
+class Simulation:
+    def __init__(self, world, ms_per_tick):
+        self._world = world
+        self._MS_PER_TICK = ms_per_tick
+        self._ticks = 0
+        self._wall_time_in_sec = 0.0
+        self._run_start_time = None
+
+    def get_world(self):
+        return self._world
+
+    def get_ticks(self):
+        return self._ticks
+
+    def get_simulated_time_in_sec(self):
+        return 0.001 * self._MS_PER_TICK * self._ticks
+
+    def get_wall_time_in_sec(self):
+        if self._run_start_time is None:
+            return self._wall_time_in_sec
+        return self._wall_time_in_sec + time.perf_counter() - self._run_start_time
+
+    def step(self):
+        context_for_world = {}
+        self._world.update(self._MS_PER_TICK, context_for_world)
+        self._ticks += 1
+
+    def run(self, num_ticks=None, stop_condition=None):
+        # Runs until num_ticks ticks have been simulated or stop_condition(simulation) returns True,
+        # whichever comes first. With neither given this runs forever.
+        ticks_run = 0
+        self._run_start_time = time.perf_counter()
+        try:
+            while num_ticks is None or ticks_run < num_ticks:
+                if stop_condition is not None and stop_condition(self):
+                    break
+                self.step()
+                ticks_run += 1
+        finally:
+            self._wall_time_in_sec += time.perf_counter() - self._run_start_time
+            self._run_start_time = None
+        return ticks_run
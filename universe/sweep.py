@@ -0,0 +1,130 @@
+from universe.world import World
+from universe.config import Config
+from universe.simulation import Simulation
+from universe.colonymetrics import ColonyMetrics, StableMetric
+
+import concurrent.futures
+import inspect
+import itertools
+
+# World arguments that every run sets itself, so they can't be swept
+_RUN_WORLD_ARGUMENTS = ('config', 'seed', 'seeds')
+
+
+def expand_parameter_grid(parameter_grid):
+    names = sorted(parameter_grid)
+    for values in itertools.product(*(parameter_grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def split_parameters(parameters):
+    # Upper case names override universe/constants.py, lower case names are World constructor arguments
+    world_parameters = {}
+    constant_overrides = {}
+    for name, value in parameters.items():
+        if name.isupper():
+            constant_overrides[name] = value
+        else:
+            world_parameters[name] = value
+    return world_parameters, constant_overrides
+
+
+def check_parameter_names(names, vectorized=False, ensemble=False):
+    # Raises ValueError for a name no run would accept, so a misspelt parameter stops the sweep before anything is
+    # submitted instead of failing in every worker
+    Config(**{name: None for name in names if name.isupper()})
+    world_class = World
+    if ensemble:
+        from universe.ensembleworld import EnsembleWorld
+        world_class = EnsembleWorld
+    elif vectorized:
+        from universe.vectorizedworld import VectorizedWorld
+        world_class = VectorizedWorld
+    arguments = inspect.signature(world_class).parameters
+    for name in names:
+        if not name.isupper() and (name not in arguments or name in _RUN_WORLD_ARGUMENTS):
+            raise ValueError('Not a {} argument that can be swept: {}'.format(world_class.__name__, name))
+
+
+def create_world(world_parameters, constant_overrides, seed, vectorized=False):
+    config = Config(**constant_overrides)
+    if vectorized:
+        # Imported here so that numpy is only needed for the vectorized engine
+        from universe.vectorizedworld import VectorizedWorld
+        return VectorizedWorld(seed=seed, config=config, **world_parameters)
+    return World(seed=seed, config=config, **world_parameters)
+
+
+def run_ensemble(world_parameters, constant_overrides, seeds, num_ticks, ms_per_tick):
+    # All seeds of one combination in a single EnsembleWorld; one summary per seed as from run_colony, where the wall
+    # time is that of the whole ensemble
+    from universe.ensembleworld import EnsembleWorld
+    world = EnsembleWorld(seeds=seeds, config=Config(**constant_overrides), **world_parameters)
+    simulation = Simulation(world, ms_per_tick)
+    simulation.run(num_ticks)
+    return [{'world_parameters': world_parameters,
+             'constant_overrides': constant_overrides,
+             'seed': seed,
+             'food_delivered': food_delivered,
+             'ticks': simulation.get_ticks(),
+             'simulated_time_in_sec': simulation.get_simulated_time_in_sec(),
+             'wall_time_in_sec': simulation.get_wall_time_in_sec(),
+             'ensemble_size': len(seeds)}
+            for seed, food_delivered in zip(seeds, world.get_food_delivered_per_world())]
+
+
+def run_colony(world_parameters, constant_overrides, seed, num_ticks, ms_per_tick, vectorized=False,
+               stable_metric=None, stability_tolerance=0.05, stability_duration_sec=120.0):
+    # With a stable_metric (a ColonyMetrics.Metric) the run ends as soon as that metric has settled, and num_ticks
+    # is only the limit for colonies that never do
+    world = create_world(world_parameters, constant_overrides, seed, vectorized)
+    metrics = None
+    stop_condition = None
+    if stable_metric is not None:
+        metrics = ColonyMetrics()
+        world.set_metrics(metrics)
+        stop_condition = StableMetric(metrics, stable_metric, stability_tolerance, stability_duration_sec)
+    simulation = Simulation(world, ms_per_tick)
+    simulation.run(num_ticks, stop_condition)
+    summary = {'world_parameters': world_parameters,
+               'constant_overrides': constant_overrides,
+               'seed': seed,
+               'food_delivered': world.get_food_delivered(),
+               'ticks': simulation.get_ticks(),
+               'simulated_time_in_sec': simulation.get_simulated_time_in_sec(),
+               'wall_time_in_sec': simulation.get_wall_time_in_sec()}
+    if metrics is not None:
+        summary['converged'] = stop_condition.is_met()
+        summary['metrics'] = metrics.get_summary()
+    return summary
+
+
+def sweep(base_world_parameters, parameter_grid, seeds, num_ticks, ms_per_tick, vectorized=False, max_workers=None,
+          stable_metric=None, stability_tolerance=0.05, stability_duration_sec=120.0, ensemble=False):
+    # Runs every combination in parameter_grid once per seed on a process pool (one worker per core by default)
+    # and yields one summary per run in the order the runs finish. With ensemble, each combination is a single job
+    # that runs all seeds at once in an EnsembleWorld.
+    if (vectorized or ensemble) and stable_metric is not None:
+        raise ValueError('stopping on a stable metric is only supported by World')
+    check_parameter_names(parameter_grid, vectorized, ensemble)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+    try:
+        futures = []
+        for parameters in expand_parameter_grid(parameter_grid):
+            world_parameters, constant_overrides = split_parameters(parameters)
+            world_parameters = dict(base_world_parameters, **world_parameters)
+            if ensemble:
+                futures.append(executor.submit(run_ensemble, world_parameters, constant_overrides, list(seeds),
+                                               num_ticks, ms_per_tick))
+                continue
+            for seed in seeds:
+                futures.append(executor.submit(run_colony, world_parameters, constant_overrides, seed,
+                                               num_ticks, ms_per_tick, vectorized, stable_metric,
+                                               stability_tolerance, stability_duration_sec))
+        for future in concurrent.futures.as_completed(futures):
+            if ensemble:
+                yield from future.result()
+            else:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,448 @@
+from universe.pheromone import Pheromone
+from universe.worldreader import WorldReader
+from lib.location import Location
+from lib.orientation import Orientation
+
+import array
+import bisect
+import json
+import mmap
+import struct
+import zlib
+
+import numpy as np
+
+# A trajectory file is a header, a sequence of self-contained chunks and, once the recording is closed, an index of
+# the chunks followed by a fixed-size trailer pointing at it:
+#
+#   header:  magic, version, length of the JSON metadata, JSON metadata (world size, chunk length, nests, food, ...)
+#   chunk:   b'CHNK', payload length, payload
+#   payload: length of the JSON column directory, directory, zlib compressed columns
+#   index:   b'INDX', length, JSON list of [first tick, number of ticks, file offset, first time, last time]
+#   trailer: b'ANTINDEX', file offset of the index
+#
+# Every chunk covers the same number of ticks and starts with a keyframe of the live pheromones (or the pheromone
+# grids of a field world, or only the live tiles of a chunked one), so any tick can be reconstructed from its own
+# chunk alone. A recording that was never
+# closed has no index; replay then finds the chunks by walking their headers.
+_MAGIC = b'ANTTRACE'
+_VERSION = 1
+_HEADER = struct.Struct('<8sHI')
+_CHUNK_HEADER = struct.Struct('<4sQ')
+_CHUNK_MAGIC = b'CHNK'
+_INDEX_MAGIC = b'INDX'
+_TRAILER = struct.Struct('<8sQ')
+_TRAILER_MAGIC = b'ANTINDEX'
+_DIRECTORY_LENGTH = struct.Struct('<I')
+_COMPRESSION_LEVEL = 1
+
+
+class TrajectoryRecorder:
+    class NestEvent:
+        ENTERED = 0
+        LEFT = 1
+
+    # Columns of a chunk and their array typecodes. Per-tick columns have one entry per tick, ant columns one per ant
+    # and tick, event columns one per event and keyframe columns one per pheromone alive when the chunk started.
+    _COLUMN_TYPECODES = {'tick_time_ms': 'd', 'tick_num_ants': 'i', 'tick_food_delivered': 'i',
+                         'ant_id': 'i', 'ant_x': 'f', 'ant_y': 'f', 'ant_heading': 'f',
+                         'deposit_tick': 'i', 'deposit_id': 'q', 'deposit_type': 'b', 'deposit_x': 'd',
+                         'deposit_y': 'd', 'deposit_intensity': 'f', 'deposit_time_ms': 'd',
+                         'expiry_tick': 'i', 'expiry_id': 'q',
+                         'nest_event_tick': 'i', 'nest_event_ant_id': 'i', 'nest_event_kind': 'b',
+                         'live_id': 'q', 'live_type': 'b', 'live_x': 'd', 'live_y': 'd', 'live_intensity': 'f',
+                         'live_time_ms': 'd'}
+    _ARRAY_TYPECODES_TO_DTYPES = {'b': 'i1', 'i': 'i4', 'q': 'i8', 'f': 'f4', 'd': 'f8'}
+
+    def __init__(self, path, chunk_ticks=600):
+        self._path = path
+        self._CHUNK_TICKS = chunk_ticks
+        self._file = None
+        self._world = None
+        self._ticks = 0
+        self._chunk_index = []
+        self._columns = None
+        # Keyframe of a field world, written as extra columns: column name -> array
+        self._keyframe_columns = None
+        self._keyframe_time_ms = 0.0
+        self._chunk_first_tick = 0
+        # Pheromones alive right now: id -> (type, x, y, intensity, time in ms at that intensity)
+        self._live_pheromones = {}
+        self._ids_of_pheromones = {}
+        self._num_pheromone_ids = 0
+        self._ids_of_ants = {}
+
+    def attach(self, world):
+        # Called by World.set_recorder; writes the file header and takes over the pheromones already there
+        self._world = world
+        nests = [world.get_drawing_context(nest)[Location] for nest in world.get_nests()]
+        food_sources = [world.get_drawing_context(food)[Location] for food in world.get_food_sources()]
+        config = world.get_config()
+        width, height = world.get_size()
+        metadata = {'width': width,
+                    'height': height,
+                    'chunk_ticks': self._CHUNK_TICKS,
+                    'pheromone_field': world.get_pheromone_field() is not None,
+                    'decay_factors_per_sec': {Pheromone.Type.FOOD: config.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC,
+                                              Pheromone.Type.NEST: config.ANT_NEST_PHEROMONE_DECAY_FACTOR_PER_SEC},
+                    'min_intensity': config.ANT_MIN_PHEROMONE_INTENSITY,
+                    'nests': [[location.x, location.y] for location in nests],
+                    'food_sources': [[location.x, location.y] for location in food_sources]}
+        metadata_bytes = json.dumps(metadata).encode()
+        self._file = open(self._path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, len(metadata_bytes)))
+        self._file.write(metadata_bytes)
+        time_ms = world.get_time_ms()
+        for pheromone_type in (Pheromone.Type.NEST, Pheromone.Type.FOOD):
+            for pheromone, location in world.get_pheromones_and_locations(pheromone_type):
+                self._live_pheromones[self._get_pheromone_id(pheromone)] = \
+                    (pheromone_type, location.x, location.y, pheromone.get_intensity(), time_ms)
+        self._start_chunk()
+
+    def record_deposit(self, pheromone, location, time_ms):
+        if self._world.get_pheromone_field() is None:
+            pheromone_id = self._get_pheromone_id(pheromone)
+            self._live_pheromones[pheromone_id] = (pheromone.get_type(), location.x, location.y,
+                                                   pheromone.get_intensity(), time_ms)
+        else:
+            # Field deposits are merged into cells and never expire one by one, so they need no identity
+            pheromone_id = self._num_pheromone_ids
+            self._num_pheromone_ids += 1
+        self._append_row('deposit', (('tick', self._ticks), ('id', pheromone_id), ('type', pheromone.get_type()),
+                                     ('x', location.x), ('y', location.y), ('intensity', pheromone.get_intensity()),
+                                     ('time_ms', time_ms)))
+
+    def record_expiry(self, pheromone):
+        pheromone_id = self._ids_of_pheromones.pop(pheromone)
+        del self._live_pheromones[pheromone_id]
+        self._append_row('expiry', (('tick', self._ticks), ('id', pheromone_id)))
+
+    def record_nest_entry(self, ant):
+        self._record_nest_event(ant, TrajectoryRecorder.NestEvent.ENTERED)
+
+    def record_nest_exit(self, ant):
+        self._record_nest_event(ant, TrajectoryRecorder.NestEvent.LEFT)
+
+    def record_tick(self, world):
+        ant_ids = self._columns['ant_id']
+        ant_xs = self._columns['ant_x']
+        ant_ys = self._columns['ant_y']
+        ant_headings = self._columns['ant_heading']
+        num_ants = 0
+        for ant in world.get_ants():
+            orientation = world.get_drawing_context(ant)[Orientation]
+            ant_ids.append(self._get_ant_id(ant))
+            ant_xs.append(orientation.location.x)
+            ant_ys.append(orientation.location.y)
+            ant_headings.append(orientation.heading_rad)
+            num_ants += 1
+        self._append_row('tick', (('time_ms', world.get_time_ms()), ('num_ants', num_ants),
+                                  ('food_delivered', world.get_food_delivered())))
+        self._ticks += 1
+        if self._CHUNK_TICKS <= self._ticks - self._chunk_first_tick:
+            self._write_chunk()
+            self._start_chunk()
+
+    def get_ticks(self):
+        return self._ticks
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._chunk_first_tick < self._ticks:
+            self._write_chunk()
+        index_bytes = json.dumps(self._chunk_index).encode()
+        index_offset = self._file.tell()
+        self._file.write(_CHUNK_HEADER.pack(_INDEX_MAGIC, len(index_bytes)))
+        self._file.write(index_bytes)
+        self._file.write(_TRAILER.pack(_TRAILER_MAGIC, index_offset))
+        self._file.close()
+        self._file = None
+
+    def __getstate__(self):
+        raise TypeError('A TrajectoryRecorder writes to an open file and can\'t be pickled')
+
+    def _record_nest_event(self, ant, kind):
+        self._append_row('nest_event', (('tick', self._ticks), ('ant_id', self._get_ant_id(ant)), ('kind', kind)))
+
+    def _start_chunk(self):
+        # The keyframe is the state at the end of the previous tick, before any event of the chunk
+        self._chunk_first_tick = self._ticks
+        self._columns = {name: array.array(typecode) for name, typecode in self._COLUMN_TYPECODES.items()}
+        pheromone_field = self._world.get_pheromone_field()
+        if pheromone_field is not None:
+            self._keyframe_columns = {}
+            self._keyframe_time_ms = self._world.get_time_ms()
+            for pheromone_type in pheromone_field.get_types():
+                if hasattr(pheromone_field, 'get_chunks'):
+                    # Only the chunks that exist, so the keyframe follows occupancy like the field itself
+                    chunks = pheromone_field.get_chunks(pheromone_type)
+                    chunk_size = pheromone_field.get_chunk_size()
+                    chunk_keys = list(chunks.keys())
+                    self._keyframe_columns['keyframe_chunk_x_{}'.format(pheromone_type)] = \
+                        np.array([chunk_x for chunk_x, _ in chunk_keys], dtype=np.int32)
+                    self._keyframe_columns['keyframe_chunk_y_{}'.format(pheromone_type)] = \
+                        np.array([chunk_y for _, chunk_y in chunk_keys], dtype=np.int32)
+                    tiles = np.empty((len(chunk_keys), chunk_size, chunk_size), dtype=np.float32)
+                    for i, chunk_key in enumerate(chunk_keys):
+                        tiles[i] = chunks[chunk_key]
+                    self._keyframe_columns['keyframe_chunks_{}'.format(pheromone_type)] = tiles
+                else:
+                    # get_grid returns the live grid, which keeps changing until the chunk is written
+                    self._keyframe_columns['keyframe_grid_{}'.format(pheromone_type)] = \
+                        pheromone_field.get_grid(pheromone_type).copy()
+            return
+        for pheromone_id, (pheromone_type, x, y, intensity, time_ms) in self._live_pheromones.items():
+            self._append_row('live', (('id', pheromone_id), ('type', pheromone_type), ('x', x), ('y', y),
+                                      ('intensity', intensity), ('time_ms', time_ms)))
+
+    def _append_row(self, prefix, values):
+        for name, value in values:
+            self._columns['{}_{}'.format(prefix, name)].append(value)
+
+    def _write_chunk(self):
+        # Columns are compressed one by one, so replay only decompresses what it reads
+        directory = {'first_tick': self._chunk_first_tick,
+                     'num_ticks': self._ticks - self._chunk_first_tick,
+                     'columns': {}}
+        blobs = []
+        offset = 0
+        columns = {name: np.frombuffer(column, dtype=self._ARRAY_TYPECODES_TO_DTYPES[column.typecode])
+                   for name, column in self._columns.items()}
+        if self._keyframe_columns is not None:
+            directory['keyframe_time_ms'] = self._keyframe_time_ms
+            columns.update(self._keyframe_columns)
+        for name, values in columns.items():
+            blob = zlib.compress(values.tobytes(), _COMPRESSION_LEVEL)
+            directory['columns'][name] = [values.dtype.str, list(values.shape), offset, len(blob)]
+            blobs.append(blob)
+            offset += len(blob)
+        directory_bytes = json.dumps(directory).encode()
+        payload_length = _DIRECTORY_LENGTH.size + len(directory_bytes) + offset
+        chunk_offset = self._file.tell()
+        self._file.write(_CHUNK_HEADER.pack(_CHUNK_MAGIC, payload_length))
+        self._file.write(_DIRECTORY_LENGTH.pack(len(directory_bytes)))
+        self._file.write(directory_bytes)
+        for blob in blobs:
+            self._file.write(blob)
+        self._file.flush()
+        tick_times = columns['tick_time_ms']
+        first_time_ms = float(tick_times[0]) if len(tick_times) else 0.0
+        last_time_ms = float(tick_times[-1]) if len(tick_times) else 0.0
+        self._chunk_index.append([directory['first_tick'], directory['num_ticks'], chunk_offset,
+                                  first_time_ms, last_time_ms])
+        self._columns = None
+        self._keyframe_columns = None
+
+    def _get_pheromone_id(self, pheromone):
+        pheromone_id = self._ids_of_pheromones.get(pheromone)
+        if pheromone_id is None:
+            pheromone_id = self._num_pheromone_ids
+            self._num_pheromone_ids += 1
+            self._ids_of_pheromones[pheromone] = pheromone_id
+        return pheromone_id
+
+    def _get_ant_id(self, ant):
+        ant_id = self._ids_of_ants.get(ant)
+        if ant_id is None:
+            ant_id = len(self._ids_of_ants)
+            self._ids_of_ants[ant] = ant_id
+        return ant_id
+
+
+class TrajectoryReplay(WorldReader):
+    # Memory-maps a recording and shows any recorded tick through the part of the World interface that View uses
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, metadata_length = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            raise ValueError('Not a trajectory recording')
+        if version != _VERSION:
+            raise ValueError('Unsupported trajectory recording version: {}'.format(version))
+        self._metadata = json.loads(self._map[_HEADER.size:_HEADER.size + metadata_length])
+        self._CHUNK_TICKS = self._metadata['chunk_ticks']
+        self._DECAY_FACTORS_PER_SEC = {int(pheromone_type): factor for pheromone_type, factor
+                                       in self._metadata['decay_factors_per_sec'].items()}
+        self._MIN_INTENSITY = self._metadata['min_intensity']
+        self._chunk_index = self._read_chunk_index(_HEADER.size + metadata_length)
+        self._chunk_last_times = [entry[4] for entry in self._chunk_index]
+        self._num_ticks = sum(entry[1] for entry in self._chunk_index)
+        WorldReader.__init__(self, self._metadata['pheromone_field'])
+        self._chunk_number = None
+        self._directory = None
+        self._decompressed_columns = {}
+        self._tick = 0
+        self._ant_rows = slice(0, 0)
+        if 0 < self._num_ticks:
+            self.seek(0)
+
+    def close(self):
+        self._decompressed_columns = {}
+        self._map.close()
+        self._file.close()
+
+    def get_num_ticks(self):
+        return self._num_ticks
+
+    def get_tick(self):
+        return self._tick
+
+    def get_size(self):
+        return self._metadata['width'], self._metadata['height']
+
+    def seek(self, tick):
+        # Chunks have a fixed length, so finding the chunk of a tick takes no search
+        tick = min(max(0, tick), self._num_ticks - 1)
+        self._load_chunk(tick // self._CHUNK_TICKS)
+        self._tick = tick
+        tick_in_chunk = tick - self._directory['first_tick']
+        ant_counts = self._get_column('tick_num_ants')
+        first_row = int(ant_counts[:tick_in_chunk].sum())
+        self._ant_rows = slice(first_row, first_row + int(ant_counts[tick_in_chunk]))
+
+    def seek_time(self, time_ms):
+        # Goes to the first tick at or after time_ms, or the last one
+        chunk_number = min(bisect.bisect_left(self._chunk_last_times, time_ms), len(self._chunk_index) - 1)
+        self._load_chunk(chunk_number)
+        tick_in_chunk = int(np.searchsorted(self._get_column('tick_time_ms'), time_ms))
+        self.seek(self._directory['first_tick'] + min(tick_in_chunk, self._directory['num_ticks'] - 1))
+
+    def get_time_ms(self):
+        return float(self._get_column('tick_time_ms')[self._tick - self._directory['first_tick']])
+
+    def get_food_delivered(self):
+        return int(self._get_column('tick_food_delivered')[self._tick - self._directory['first_tick']])
+
+    def get_nest_events(self):
+        # (tick, ant id, TrajectoryRecorder.NestEvent kind) of the nest entries and exits in the current chunk,
+        # up to the current tick
+        up_to_now = self._get_column('nest_event_tick') <= self._tick
+        return list(zip(self._get_column('nest_event_tick')[up_to_now].tolist(),
+                        self._get_column('nest_event_ant_id')[up_to_now].tolist(),
+                        self._get_column('nest_event_kind')[up_to_now].tolist()))
+
+    def get_ants(self):
+        return [WorldReader.AntHandle(row) for row in range(self._ant_rows.start, self._ant_rows.stop)]
+
+    def get_nests(self):
+        return [WorldReader.NestHandle(i) for i in range(len(self._metadata['nests']))]
+
+    def get_food_sources(self):
+        return [WorldReader.FoodHandle(i) for i in range(len(self._metadata['food_sources']))]
+
+    def get_pheromone_samples(self, pheromone_type):
+        # Keyframe pheromones plus the deposits of this chunk up to now, minus the ones that expired since,
+        # with intensities decayed to the current tick
+        time_ms = self.get_time_ms()
+        live_of_type = self._get_column('live_type') == pheromone_type
+        deposited = (self._get_column('deposit_tick') <= self._tick) & \
+                    (self._get_column('deposit_type') == pheromone_type)
+        ids = np.concatenate((self._get_column('live_id')[live_of_type], self._get_column('deposit_id')[deposited]))
+        xs = np.concatenate((self._get_column('live_x')[live_of_type], self._get_column('deposit_x')[deposited]))
+        ys = np.concatenate((self._get_column('live_y')[live_of_type], self._get_column('deposit_y')[deposited]))
+        intensities = np.concatenate((self._get_column('live_intensity')[live_of_type],
+                                      self._get_column('deposit_intensity')[deposited]))
+        times_ms = np.concatenate((self._get_column('live_time_ms')[live_of_type],
+                                   self._get_column('deposit_time_ms')[deposited]))
+        expired_ids = self._get_column('expiry_id')[self._get_column('expiry_tick') <= self._tick]
+        alive = ~np.isin(ids, expired_ids)
+        intensities = intensities[alive] * self._DECAY_FACTORS_PER_SEC[pheromone_type]**((time_ms - times_ms[alive])
+                                                                                         / 1000.0)
+        return xs[alive], ys[alive], intensities
+
+    def get_pheromone_grid(self, pheromone_type):
+        # The keyframe grid and this chunk's deposits up to now, decayed to the current tick. Cells that the world
+        # zeroes once they drop below the minimum intensity may keep a value below it here.
+        time_ms = self.get_time_ms()
+        decay_factor = self._DECAY_FACTORS_PER_SEC[pheromone_type]
+        grid = self._get_keyframe_grid(pheromone_type) * \
+            np.float32(decay_factor**((time_ms - self._directory['keyframe_time_ms']) / 1000.0))
+        deposited = (self._get_column('deposit_tick') <= self._tick) & \
+                    (self._get_column('deposit_type') == pheromone_type)
+        intensities = self._get_column('deposit_intensity')[deposited] * \
+            decay_factor**((time_ms - self._get_column('deposit_time_ms')[deposited]) / 1000.0)
+        np.add.at(grid, (self._get_column('deposit_y')[deposited].astype(np.intp),
+                         self._get_column('deposit_x')[deposited].astype(np.intp)), intensities.astype(np.float32))
+        return grid
+
+    def _get_keyframe_grid(self, pheromone_type):
+        name = 'keyframe_grid_{}'.format(pheromone_type)
+        if name in self._directory['columns']:
+            return self._get_column(name)
+        # A chunked field was recorded: lay its tiles out on an empty grid
+        width, height = self.get_size()
+        grid = np.zeros((height, width), dtype=np.float32)
+        tiles = self._get_column('keyframe_chunks_{}'.format(pheromone_type))
+        chunk_size = tiles.shape[1]
+        for chunk_x, chunk_y, tile in zip(self._get_column('keyframe_chunk_x_{}'.format(pheromone_type)).tolist(),
+                                          self._get_column('keyframe_chunk_y_{}'.format(pheromone_type)).tolist(),
+                                          tiles):
+            x1 = chunk_x * chunk_size
+            y1 = chunk_y * chunk_size
+            window = grid[y1:y1 + chunk_size, x1:x1 + chunk_size]
+            window[...] = tile[:window.shape[0], :window.shape[1]]
+        return grid
+
+    def _read_chunk_index(self, first_chunk_offset):
+        if _TRAILER.size <= len(self._map) - first_chunk_offset:
+            magic, index_offset = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+            if magic == _TRAILER_MAGIC:
+                _, index_length = _CHUNK_HEADER.unpack_from(self._map, index_offset)
+                start = index_offset + _CHUNK_HEADER.size
+                return json.loads(self._map[start:start + index_length])
+        # The recording was not closed: walk the chunks, dropping a last one that was cut short
+        chunk_index = []
+        offset = first_chunk_offset
+        while offset + _CHUNK_HEADER.size <= len(self._map):
+            magic, payload_length = _CHUNK_HEADER.unpack_from(self._map, offset)
+            if magic != _CHUNK_MAGIC or len(self._map) < offset + _CHUNK_HEADER.size + payload_length:
+                break
+            directory = self._read_directory(offset)
+            tick_times = self._decompress_column(directory, 'tick_time_ms')
+            chunk_index.append([directory['first_tick'], directory['num_ticks'], offset,
+                                float(tick_times[0]), float(tick_times[-1])])
+            offset += _CHUNK_HEADER.size + payload_length
+        return chunk_index
+
+    def _read_directory(self, chunk_offset):
+        start = chunk_offset + _CHUNK_HEADER.size
+        (directory_length,) = _DIRECTORY_LENGTH.unpack_from(self._map, start)
+        start += _DIRECTORY_LENGTH.size
+        directory = json.loads(self._map[start:start + directory_length])
+        directory['blobs_offset'] = start + directory_length
+        return directory
+
+    def _decompress_column(self, directory, name):
+        dtype, shape, offset, length = directory['columns'][name]
+        start = directory['blobs_offset'] + offset
+        return np.frombuffer(zlib.decompress(self._map[start:start + length]), dtype=dtype).reshape(shape)
+
+    def _load_chunk(self, chunk_number):
+        if chunk_number == self._chunk_number:
+            return
+        self._chunk_number = chunk_number
+        self._directory = self._read_directory(self._chunk_index[chunk_number][2])
+        self._decompressed_columns = {}
+
+    def _get_column(self, name):
+        # Columns are decompressed on first use and kept until another chunk is loaded
+        column = self._decompressed_columns.get(name)
+        if column is None:
+            column = self._decompress_column(self._directory, name)
+            self._decompressed_columns[name] = column
+        return column
+
+    def _create_drawing_context_for_ant(self, ant):
+        return {Orientation: Orientation(float(self._get_column('ant_x')[ant.index]),
+                                         float(self._get_column('ant_y')[ant.index]),
+                                         float(self._get_column('ant_heading')[ant.index]))}
+
+    def _create_drawing_context_for_nest(self, nest):
+        x, y = self._metadata['nests'][nest.index]
+        return {Location: Location(x, y)}
+
+    def _create_drawing_context_for_food(self, food_source):
+        x, y = self._metadata['food_sources'][food_source.index]
+        return {Location: Location(x, y)}
+
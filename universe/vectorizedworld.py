@@ -0,0 +1,413 @@
+from universe.iupdatable import IUpdatable
+from universe.ant import Ant
+from universe.pheromone import Pheromone
+from universe.config import Config
+
+import numpy as np
+import collections
+import math
+
+
+class VectorizedWorld(IUpdatable):
+    # Structure-of-arrays counterpart of World: every ant is a row in a set of NumPy arrays and the logic of
+    # Ant.update is applied to the whole colony at once. Pheromones live in one float32 grid per Pheromone.Type
+    # (indexed by the type value), padded by the sensing range so that sensing never has to clip at the edges.
+    # All state is kept for a batch of worlds, which EnsembleWorld uses to run many seeds in one array program: the
+    # grids have a leading world dimension, the ants of world b are rows b * num_ants_to_spawn onwards and every
+    # world draws from its own generator. A VectorizedWorld is a batch of one.
+    _MAX_CHAOTIC_DELTA_HEADING = 0.5 * math.pi
+    _SENSING_BLOCK_SIZE = 512
+    _NUM_HEADING_SECTORS = 16
+    _CLEANUP_PERIOD_MS = 1000.0
+
+    def __init__(self,
+                 width,
+                 height,
+                 num_ants_to_spawn,
+                 ant_spawn_period,
+                 num_food_sources,
+                 food_min_dist_to_nest,
+                 food_min_dist_to_world_edge,
+                 max_move_duration_in_sec,
+                 seed=None,
+                 config=None):
+        self._initialize(width, height, num_ants_to_spawn, ant_spawn_period, num_food_sources, food_min_dist_to_nest,
+                         food_min_dist_to_world_edge, max_move_duration_in_sec, [seed], config)
+
+    def _initialize(self, width, height, num_ants_to_spawn, ant_spawn_period, num_food_sources, food_min_dist_to_nest,
+                    food_min_dist_to_world_edge, max_move_duration_in_sec, seeds, config):
+        self._config = config if config is not None else Config()
+        self._width = width
+        self._height = height
+        self._MAX_MOVE_DURATION_IN_SEC = max_move_duration_in_sec
+        self._NUM_WORLDS = len(seeds)
+        self._rands = [np.random.default_rng(seed) for seed in seeds]
+
+        self._NUM_ANTS_TO_SPAWN = num_ants_to_spawn
+        self._SPAWN_PERIOD_IN_SEC = ant_spawn_period
+        self._ANT_COLLISION_RADIUS = max(0.5 * self._config.ANT_LENGTH, 0.5 * self._config.ANT_WIDTH)
+        self._PHEROMONE_DEPOSIT_PERIOD_MS = 1000.0 / self._config.ANT_PHEROMONE_DEPOSIT_RATE_PER_SEC
+        self._PHEROMONE_DEPOSIT_INTENSITY_DECAY_FACTOR = \
+            self._config.ANT_PHEROMONE_DEPOSIT_INTENSITY_DECAY_FACTOR_PER_SEC
+        self._CHAOS_FACTOR = self._config.ANT_CHAOS_FACTOR
+        self._MOVE_SPEED_DIST_PER_SEC = self._config.ANT_MOVE_SPEED
+        self._HEADING_DELTA_MOMENTUM_FACTOR = self._config.ANT_HEADING_DELTA_MOMENTUM_FACTOR
+        self._MAX_SEARCH_TIME_IN_SEC = self._config.ANT_MAX_SEARCHING_TIME_IN_SEC
+        self._SENSING_RANGE = self._config.ANT_SENSING_RANGE
+        self._ATTENUATION_GAIN = self._config.ANT_SENSING_ATTENUATION_GAIN
+        self._MIN_PHEROMONE_INTENSITY = self._config.ANT_MIN_PHEROMONE_INTENSITY
+        self._FOOD_COLLISION_RADIUS = max(0.5 * self._config.FOOD_HEIGHT, 0.5 * self._config.FOOD_WIDTH) - 1.0
+
+        self._MARGIN = int(math.ceil(self._SENSING_RANGE)) + 1
+        self._padded_width = width + 2 * self._MARGIN
+        self._padded_height = height + 2 * self._MARGIN
+        self._pheromone_grids = np.zeros((self._NUM_WORLDS, 2, self._padded_height, self._padded_width),
+                                         dtype=np.float32)
+        # Only a small share of the cells ever holds a pheromone, so decay and cleanup only go through the cells that
+        # have been deposited in and not cleaned up since (one list per type), which leaves every value as it would be
+        # with the whole grids
+        self._pheromone_cell_live = np.zeros(self._pheromone_grids.shape, dtype=bool)
+        self._live_pheromone_cells = [np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)]
+        self._pheromone_decay_factors = np.empty(2)
+        self._pheromone_decay_factors[Pheromone.Type.NEST] = self._config.ANT_NEST_PHEROMONE_DECAY_FACTOR_PER_SEC
+        self._pheromone_decay_factors[Pheromone.Type.FOOD] = self._config.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC
+        self._ms_since_cleanup = 0.0
+        self._create_sensing_stencil()
+
+        self._nest_location = np.array([0.5 * float(width), 0.5 * float(height)])
+        self._ms_since_last_spawn = 0
+        self._num_ants_spawned = 0
+        self._nest_queues = [collections.deque() for _ in range(self._NUM_WORLDS)]
+        self._food_delivered = np.zeros(self._NUM_WORLDS, dtype=np.int64)
+
+        num_ants = self._NUM_WORLDS * num_ants_to_spawn
+        self._ant_world = np.repeat(np.arange(self._NUM_WORLDS), num_ants_to_spawn)
+        self._ant_x = np.zeros(num_ants)
+        self._ant_y = np.zeros(num_ants)
+        self._ant_heading = np.zeros(num_ants)
+        self._ant_state = np.full(num_ants, Ant.State.LOOKING_FOR_FOOD, dtype=np.int8)
+        self._ant_carrying_food = np.zeros(num_ants, dtype=bool)
+        self._ant_pheromone_deposit_intensity = np.ones(num_ants)
+        self._ant_ms_since_pheromone_deposited = np.zeros(num_ants)
+        self._ant_seconds_until_turn_around = np.full(num_ants, self._MAX_SEARCH_TIME_IN_SEC)
+        self._ant_times_turned_around = np.zeros(num_ants)
+        self._ant_previous_requested_heading_delta = np.zeros(num_ants)
+        self._ant_in_world = np.zeros(num_ants, dtype=bool)
+        if 0 < num_ants_to_spawn:
+            self._spawn_ant()
+
+        food_locations = [[self._sample_food_location(rand, food_min_dist_to_nest, food_min_dist_to_world_edge)
+                           for _ in range(num_food_sources)] for rand in self._rands]
+        self._food_locations = np.array(food_locations, dtype=float).reshape(self._NUM_WORLDS, -1, 2)
+
+    def get_ant_orientations(self, world=0):
+        ants = self._get_ants_of_world(world)
+        in_world = self._ant_in_world[ants]
+        return self._ant_x[ants][in_world], self._ant_y[ants][in_world], self._ant_heading[ants][in_world]
+
+    def get_num_ants_in_world(self, world=0):
+        return int(np.count_nonzero(self._ant_in_world[self._get_ants_of_world(world)]))
+
+    def get_num_ants_in_nest(self, world=0):
+        return len(self._nest_queues[world])
+
+    def get_nest_location(self):
+        return self._nest_location
+
+    def get_food_locations(self, world=0):
+        return self._food_locations[world]
+
+    def get_food_delivered(self, world=0):
+        return int(self._food_delivered[world])
+
+    def get_pheromone_grid(self, pheromone_type, world=0):
+        # Read only: writing to it would bypass the list of live cells, use add_pheromones instead
+        return self._pheromone_grids[world, pheromone_type,
+                                     self._MARGIN:self._MARGIN + self._height,
+                                     self._MARGIN:self._MARGIN + self._width]
+
+    def add_ants(self, x, y, headings):
+        # Puts ants that have not been spawned yet straight into the world at the given orientations; in a batch
+        # every world gets the same ants
+        first_ant = self._num_ants_spawned
+        if self._NUM_ANTS_TO_SPAWN < first_ant + len(x):
+            raise ValueError('Only {} more ants can be added'.format(self._NUM_ANTS_TO_SPAWN - first_ant))
+        world_starts = np.arange(self._NUM_WORLDS) * self._NUM_ANTS_TO_SPAWN
+        ants = (world_starts[:, np.newaxis] + np.arange(first_ant, first_ant + len(x))[np.newaxis, :]).reshape(-1)
+        self._num_ants_spawned += len(x)
+        self._ant_x[ants] = np.tile(x, self._NUM_WORLDS)
+        self._ant_y[ants] = np.tile(y, self._NUM_WORLDS)
+        self._ant_heading[ants] = np.tile(headings, self._NUM_WORLDS)
+        self._ant_in_world[ants] = True
+
+    def add_pheromones(self, pheromone_type, x, y, intensities, world=0):
+        # Deposits into the cells at (x, y), as ants standing there would
+        num_pheromones = len(x)
+        self._deposit_into_cells(np.full(num_pheromones, world), np.full(num_pheromones, pheromone_type),
+                                 np.asarray(x).astype(np.intp), np.asarray(y).astype(np.intp), np.asarray(intensities))
+
+    def _get_ants_of_world(self, world):
+        return slice(world * self._NUM_ANTS_TO_SPAWN, (world + 1) * self._NUM_ANTS_TO_SPAWN)
+
+    def update(self, ms_elapsed, context):
+        self._update_pheromones(ms_elapsed)
+        self._update_nest(ms_elapsed)
+        ants_in_world = np.flatnonzero(self._ant_in_world)
+        if 0 < len(ants_in_world):
+            self._update_ants(ants_in_world, ms_elapsed)
+
+    def _update_pheromones(self, ms_elapsed):
+        decay = (self._pheromone_decay_factors**(ms_elapsed / 1000.0)).astype(np.float32)
+        cells = self._pheromone_grids.reshape(-1)
+        for pheromone_type, live_cells in enumerate(self._live_pheromone_cells):
+            cells[live_cells] *= decay[pheromone_type]
+        self._ms_since_cleanup += ms_elapsed
+        if self._CLEANUP_PERIOD_MS <= self._ms_since_cleanup:
+            self._ms_since_cleanup = 0.0
+            for pheromone_type, live_cells in enumerate(self._live_pheromone_cells):
+                expired = cells[live_cells] < self._MIN_PHEROMONE_INTENSITY
+                cells[live_cells[expired]] = 0.0
+                self._pheromone_cell_live.reshape(-1)[live_cells[expired]] = False
+                self._live_pheromone_cells[pheromone_type] = live_cells[~expired]
+
+    def _update_nest(self, ms_elapsed):
+        # Mirrors Nest.update: spawn on schedule, then release the ant that has waited longest
+        self._ms_since_last_spawn += ms_elapsed
+        if self._num_ants_spawned < self._NUM_ANTS_TO_SPAWN and \
+           self._SPAWN_PERIOD_IN_SEC < self._ms_since_last_spawn / 1000.0:
+            self._spawn_ant()
+        released = [(world, queue.popleft()) for world, queue in enumerate(self._nest_queues) if queue]
+        if released:
+            ants = np.array([ant for _, ant in released])
+            self._ant_times_turned_around[ants] = 0.0
+            self._ant_seconds_until_turn_around[ants] = self._MAX_SEARCH_TIME_IN_SEC
+            self._ant_carrying_food[ants] = False
+            self._ant_pheromone_deposit_intensity[ants] = 1.0
+            self._ant_state[ants] = Ant.State.LOOKING_FOR_FOOD
+            self._ant_x[ants] = self._nest_location[0]
+            self._ant_y[ants] = self._nest_location[1]
+            self._ant_heading[ants] = [self._rands[world].uniform(0.0, 2.0 * math.pi) for world, _ in released]
+            self._ant_in_world[ants] = True
+
+    def _spawn_ant(self):
+        # The spawn schedule is the same in every world
+        for world, queue in enumerate(self._nest_queues):
+            queue.append(world * self._NUM_ANTS_TO_SPAWN + self._num_ants_spawned)
+        self._ms_since_last_spawn = 0
+        self._num_ants_spawned += 1
+
+    def _update_ants(self, ants, ms_elapsed):
+        self._ant_pheromone_deposit_intensity[ants] *= \
+            self._PHEROMONE_DEPOSIT_INTENSITY_DECAY_FACTOR**(0.001 * ms_elapsed)
+        self._ant_ms_since_pheromone_deposited[ants] += ms_elapsed
+        depositing = self._PHEROMONE_DEPOSIT_PERIOD_MS < self._ant_ms_since_pheromone_deposited[ants]
+        self._deposit_pheromones(ants[depositing])
+        ants = ants[~depositing]
+
+        searching = ~self._ant_carrying_food[ants]
+        self._ant_seconds_until_turn_around[ants[searching]] -= 0.001 * ms_elapsed
+        turning_around = searching & (self._ant_seconds_until_turn_around[ants] < 0.0)
+        self._turn_around_after_search_timeout(ants[turning_around])
+        ants = ants[~turning_around]
+
+        found_food = np.zeros(len(ants), dtype=bool)
+        looking_for_food = self._ant_state[ants] == Ant.State.LOOKING_FOR_FOOD
+        found_food[looking_for_food] = self._check_if_food_in_range(ants[looking_for_food])
+        self._pick_up_food(ants[found_food])
+        ants = ants[~found_food]
+
+        entering_nest = np.zeros(len(ants), dtype=bool)
+        heading_home = self._ant_state[ants] == Ant.State.HEADING_HOME
+        entering_nest[heading_home] = self._check_if_nest_in_range(ants[heading_home])
+        self._enter_nest(ants[entering_nest])
+        ants = ants[~entering_nest]
+
+        requested_heading_deltas = self._calculate_heading_deltas(ants)
+        self._ant_previous_requested_heading_delta[ants] = requested_heading_deltas
+        self._move_ants(ants, requested_heading_deltas, ms_elapsed)
+
+    def _deposit_pheromones(self, ants):
+        self._ant_ms_since_pheromone_deposited[ants] = 0.0
+        pheromone_types = np.where(self._ant_carrying_food[ants], Pheromone.Type.FOOD, Pheromone.Type.NEST)
+        self._deposit_into_cells(self._ant_world[ants], pheromone_types, self._ant_x[ants].astype(np.intp),
+                                 self._ant_y[ants].astype(np.intp), self._ant_pheromone_deposit_intensity[ants])
+
+    def _deposit_into_cells(self, worlds, pheromone_types, cell_x, cell_y, intensities):
+        plane_size = self._padded_width * self._padded_height
+        cells = (2 * worlds + pheromone_types) * plane_size + (cell_y + self._MARGIN) * self._padded_width + \
+            cell_x + self._MARGIN
+        np.add.at(self._pheromone_grids.reshape(-1), cells, intensities.astype(np.float32))
+        new_cells = cells[~self._pheromone_cell_live.reshape(-1)[cells]]
+        if 0 < len(new_cells):
+            new_cells = np.unique(new_cells)
+            self._pheromone_cell_live.reshape(-1)[new_cells] = True
+            new_cell_types = (new_cells // plane_size) % 2
+            for pheromone_type, live_cells in enumerate(self._live_pheromone_cells):
+                self._live_pheromone_cells[pheromone_type] = \
+                    np.concatenate((live_cells, new_cells[new_cell_types == pheromone_type]))
+
+    def _turn_around_after_search_timeout(self, ants):
+        self._ant_state[ants] = Ant.State.HEADING_HOME
+        self._ant_times_turned_around[ants] += 1.0
+        self._ant_seconds_until_turn_around[ants] = self._MAX_SEARCH_TIME_IN_SEC * \
+            2.0**self._ant_times_turned_around[ants]
+        self._ant_heading[ants] += math.pi
+
+    def _pick_up_food(self, ants):
+        self._ant_carrying_food[ants] = True
+        self._ant_pheromone_deposit_intensity[ants] = 1.0
+        self._ant_state[ants] = Ant.State.HEADING_HOME
+        self._ant_heading[ants] += math.pi
+
+    def _enter_nest(self, ants):
+        self._food_delivered += np.bincount(self._ant_world[ants[self._ant_carrying_food[ants]]],
+                                            minlength=self._NUM_WORLDS)
+        self._ant_in_world[ants] = False
+        for ant in ants.tolist():
+            self._nest_queues[ant // self._NUM_ANTS_TO_SPAWN].append(ant)
+
+    def _check_if_food_in_range(self, ants):
+        food_locations = self._food_locations[self._ant_world[ants]]
+        d_x = food_locations[:, :, 0] - self._ant_x[ants, np.newaxis]
+        d_y = food_locations[:, :, 1] - self._ant_y[ants, np.newaxis]
+        reach = self._ANT_COLLISION_RADIUS + self._FOOD_COLLISION_RADIUS + 1.0
+        return np.any(d_x**2 + d_y**2 < reach**2, axis=1)
+
+    def _check_if_nest_in_range(self, ants):
+        d_x = self._nest_location[0] - self._ant_x[ants]
+        d_y = self._nest_location[1] - self._ant_y[ants]
+        return d_x**2 + d_y**2 < self._ANT_COLLISION_RADIUS**2
+
+    def _create_sensing_stencil(self):
+        # One stencil per heading sector, holding the offsets of every cell whose centre can be both within
+        # sensing range and ahead of an ant anywhere in the base cell with a heading anywhere in the sector.
+        reach = self._MARGIN
+        offsets = np.arange(-reach, reach + 1)
+        d_y, d_x = np.meshgrid(offsets, offsets, indexing='ij')
+        nearest_x = np.maximum(np.abs(d_x) - 1, 0)
+        nearest_y = np.maximum(np.abs(d_y) - 1, 0)
+        in_reach = nearest_x**2 + nearest_y**2 < self._SENSING_RANGE**2
+        d_x = d_x[in_reach]
+        d_y = d_y[in_reach]
+        nominal_distances = np.hypot(d_x, d_y)
+        nominal_headings = np.arctan2(d_x, -d_y)
+        # The ant can sit anywhere in its cell, which moves the cell centres by up to half a diagonal
+        half_diagonal = 0.5 * 2.0**0.5
+        position_slack = np.arcsin(np.minimum(1.0, half_diagonal / np.maximum(nominal_distances, half_diagonal)))
+        sector_width = 2.0 * math.pi / self._NUM_HEADING_SECTORS
+        self._stencils = []
+        for sector in range(self._NUM_HEADING_SECTORS):
+            sector_centre = (sector + 0.5) * sector_width
+            deviation = np.abs(np.angle(np.exp(1j * (nominal_headings - sector_centre))))
+            ahead = deviation < 0.5 * math.pi + 0.5 * sector_width + position_slack
+            flat_offsets = (d_y[ahead] * self._padded_width + d_x[ahead]).astype(np.intp)
+            self._stencils.append((d_x[ahead], d_y[ahead], flat_offsets))
+
+    def _calculate_heading_deltas(self, ants):
+        numerator = np.zeros(len(ants))
+        denominator = np.full(len(ants), 0.001)
+        heading_home = self._ant_state[ants] == Ant.State.HEADING_HOME
+        worlds = self._ant_world[ants]
+        # Index of the (world, pheromone type) grid each ant follows
+        target_planes = 2 * worlds + np.where(heading_home, Pheromone.Type.NEST, Pheromone.Type.FOOD)
+        sector_width = 2.0 * math.pi / self._NUM_HEADING_SECTORS
+        sectors = (np.mod(self._ant_heading[ants], 2.0 * math.pi) / sector_width).astype(np.intp)
+        sectors = np.minimum(sectors, self._NUM_HEADING_SECTORS - 1)
+        order = np.argsort(sectors, kind='stable')
+        sector_starts = np.searchsorted(sectors[order], np.arange(self._NUM_HEADING_SECTORS + 1))
+        for sector in range(self._NUM_HEADING_SECTORS):
+            in_sector = order[sector_starts[sector]:sector_starts[sector + 1]]
+            for block_start in range(0, len(in_sector), self._SENSING_BLOCK_SIZE):
+                rows = in_sector[block_start:block_start + self._SENSING_BLOCK_SIZE]
+                self._accumulate_pheromone_terms(numerator, denominator, rows, ants[rows],
+                                                 target_planes[rows], self._stencils[sector])
+        looking_for_food = np.flatnonzero(~heading_home)
+        food_locations = self._food_locations[worlds[looking_for_food]]
+        for food in range(self._food_locations.shape[1]):
+            self._accumulate_heading_terms(numerator, denominator, looking_for_food, ants[looking_for_food],
+                                           food_locations[:, food, 0] - self._ant_x[ants[looking_for_food]],
+                                           food_locations[:, food, 1] - self._ant_y[ants[looking_for_food]],
+                                           np.full(len(looking_for_food), self._config.FOOD_PHEROMONE_INTENSITY))
+        going_home = np.flatnonzero(heading_home)
+        self._accumulate_heading_terms(numerator, denominator, going_home, ants[going_home],
+                                       self._nest_location[0] - self._ant_x[ants[going_home]],
+                                       self._nest_location[1] - self._ant_y[ants[going_home]],
+                                       np.full(len(going_home), self._config.NEST_PHEROMONE_INTENSITY))
+        requested_heading_deltas = numerator / denominator
+        requested_heading_deltas += self._ant_previous_requested_heading_delta[ants] * \
+            self._HEADING_DELTA_MOMENTUM_FACTOR
+        # ants are in ascending order, so every world's ants are together and draw in the order they would alone
+        num_ants_per_world = np.bincount(worlds, minlength=self._NUM_WORLDS).tolist()
+        requested_heading_deltas += np.concatenate(
+            [rand.uniform(self._CHAOS_FACTOR * -self._MAX_CHAOTIC_DELTA_HEADING,
+                          self._CHAOS_FACTOR * self._MAX_CHAOTIC_DELTA_HEADING,
+                          num_ants) for rand, num_ants in zip(self._rands, num_ants_per_world)])
+        return requested_heading_deltas
+
+    def _accumulate_pheromone_terms(self, numerator, denominator, rows, ants, planes, stencil):
+        stencil_d_x, stencil_d_y, stencil_flat_offsets = stencil
+        cell_x = self._ant_x[ants].astype(np.intp)
+        cell_y = self._ant_y[ants].astype(np.intp)
+        plane_size = self._padded_width * self._padded_height
+        base = planes * plane_size + (cell_y + self._MARGIN) * self._padded_width + cell_x + self._MARGIN
+        intensities = self._pheromone_grids.reshape(-1)[base[:, np.newaxis] + stencil_flat_offsets[np.newaxis, :]]
+        sensed_ants, sensed_cells = np.nonzero(self._MIN_PHEROMONE_INTENSITY <= intensities)
+        # Pheromones are sensed at the centre of the cell they were deposited in
+        d_x = cell_x[sensed_ants] + stencil_d_x[sensed_cells] + 0.5 - self._ant_x[ants[sensed_ants]]
+        d_y = cell_y[sensed_ants] + stencil_d_y[sensed_cells] + 0.5 - self._ant_y[ants[sensed_ants]]
+        block_numerator = np.zeros(len(rows))
+        block_denominator = np.zeros(len(rows))
+        self._accumulate_heading_terms(block_numerator, block_denominator, sensed_ants, ants[sensed_ants],
+                                       d_x, d_y, intensities[sensed_ants, sensed_cells].astype(float))
+        numerator[rows] += block_numerator
+        denominator[rows] += block_denominator
+
+    def _accumulate_heading_terms(self, numerator, denominator, rows, ants, d_x, d_y, intensities):
+        # Vectorized form of Ant._calculate_heading_delta's sum; rows index into numerator/denominator and
+        # ants gives the ant sensing each (d_x, d_y) vector. sin/cos of the relative angle come from the
+        # vector directly rather than through atan.
+        distances = np.hypot(d_x, d_y)
+        safe_distances = np.maximum(distances, 1e-9)
+        sin_heading_of_line = d_x / safe_distances
+        cos_heading_of_line = -d_y / safe_distances
+        sin_ant_heading = np.sin(self._ant_heading[ants])
+        cos_ant_heading = np.cos(self._ant_heading[ants])
+        cos_angle = cos_heading_of_line * cos_ant_heading + sin_heading_of_line * sin_ant_heading
+        sin_angle = sin_heading_of_line * cos_ant_heading - cos_heading_of_line * sin_ant_heading
+        sensed = (distances < self._SENSING_RANGE) & (0.0 < cos_angle)
+        half_sensing_range = 0.5 * self._SENSING_RANGE
+        distances = distances[sensed]
+        near = distances <= half_sensing_range
+        dist_factors = np.empty(len(distances))
+        dist_factors[near] = 1.0 - 0.5 * (distances[near] / half_sensing_range)**self._ATTENUATION_GAIN
+        dist_factors[~near] = 0.5 * (1.0 - (distances[~near] - half_sensing_range) /
+                                     half_sensing_range)**self._ATTENUATION_GAIN
+        intensities = intensities[sensed]
+        weights = 0.5 * math.pi * sin_angle[sensed] * cos_angle[sensed]**0.25 * dist_factors
+        numerator += np.bincount(rows[sensed], weights=intensities * weights, minlength=len(numerator))
+        denominator += np.bincount(rows[sensed], weights=intensities, minlength=len(denominator))
+
+    def _move_ants(self, ants, requested_heading_deltas, ms_elapsed):
+        t = min(ms_elapsed / 1000.0, self._MAX_MOVE_DURATION_IN_SEC)
+        self._ant_heading[ants] += requested_heading_deltas
+        headings = self._ant_heading[ants]
+        attempted_x = self._ant_x[ants] + np.sin(headings) * self._MOVE_SPEED_DIST_PER_SEC * t
+        attempted_y = self._ant_y[ants] + np.cos(headings) * -self._MOVE_SPEED_DIST_PER_SEC * t
+        radius = self._ANT_COLLISION_RADIUS
+        valid = (radius <= attempted_x) & (attempted_x <= self._width - radius) & \
+                (radius <= attempted_y) & (attempted_y <= self._height - radius)
+        collision_distance = self._ANT_COLLISION_RADIUS + self._FOOD_COLLISION_RADIUS
+        food_locations = self._food_locations[self._ant_world[ants]]
+        for food in range(self._food_locations.shape[1]):
+            valid &= collision_distance**2 <= (attempted_x - food_locations[:, food, 0])**2 + \
+                (attempted_y - food_locations[:, food, 1])**2
+        self._ant_x[ants[valid]] = attempted_x[valid]
+        self._ant_y[ants[valid]] = attempted_y[valid]
+
+    def _sample_food_location(self, rand, min_dist_to_nest, min_dist_to_world_edge):
+        while True:
+            loc_x = float(rand.integers(int(min_dist_to_world_edge), int(float(self._width) - min_dist_to_world_edge)))
+            loc_y = float(rand.integers(int(min_dist_to_world_edge), int(float(self._height) - min_dist_to_world_edge)))
+            dist_to_nest = ((loc_x - self._nest_location[0])**2.0 + (loc_y - self._nest_location[1])**2.0)**0.5
+            if min_dist_to_nest < dist_to_nest:
+                return loc_x, loc_y
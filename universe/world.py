@@ -4,19 +4,32 @@ from universe.nest import Nest
 from universe.food import Food
 from universe.pheromone import Pheromone
 from universe.actions import Move, TurnAround, DepositPheromone, EnterNest
-import universe.constants as const
+from universe.config import Config
+from universe.instrumentation import Instrumentation
 
 import lib.computations as compute
 from lib.location import Location
 from lib.orientation import Orientation
 from lib.sensableregion import SensableRegion
+from lib.clock import Clock
+from lib.spatialhash import SpatialHash
+from lib.collisionmap import CollisionMap
 
-import copy
+import heapq
 import random as rand
 import math
+import sys
+import time
 
 
 class World(IUpdatable):
+    class PheromoneOverflow:
+        EVICT_WEAKEST = 'evict_weakest'
+        MERGE = 'merge'
+
+    # Rough cost of one dict entry: hash, key and value plus its share of the index at a typical fill
+    _DICT_ENTRY_BYTES = 48
+
     def __init__(self,
                  width,
                  height,
@@ -25,10 +38,22 @@ class World(IUpdatable):
                  num_food_sources,
                  food_min_dist_to_nest,
                  food_min_dist_to_world_edge,
-                 max_move_duration_in_sec):
+                 max_move_duration_in_sec,
+                 use_pheromone_field=False,
+                 config=None,
+                 seed=None,
+                 chunk_size=None,
+                 obstacle_cells=None,
+                 use_ant_collisions=False,
+                 max_pheromones=None,
+                 pheromone_overflow=PheromoneOverflow.EVICT_WEAKEST):
+        self._config = config if config is not None else Config()
+        # All randomness of this world and everything in it comes from here, so a seed makes runs reproducible
+        self._rand = rand.Random(seed)
         self._width = width
         self._height = height
-        self._objects_at_locations = [[[] for _ in range(width)] for _ in range(height)]
+        # Buckets are as large as the sensing range, so any sensing query touches at most 3x3 of them
+        self._objects_in_space = SpatialHash(self._config.ANT_SENSING_RANGE)
         self._MAX_MOVE_DURATION_IN_SEC = max_move_duration_in_sec
         self._action_processing_methods = {None: self._process_no_action,
                                            Move: self._process_move_action,
@@ -39,18 +64,65 @@ class World(IUpdatable):
                                                   Nest: self._create_drawing_context_for_nest,
                                                   Food: self._create_drawing_context_for_food,
                                                   Pheromone: self._create_drawing_context_for_pheromone}
-        self._get_object_location_methods = {Ant: self._get_location_of_ant,
-                                             Nest: self._get_location_of_nest,
-                                             Food: self._get_location_of_food_source,
-                                             Pheromone: self._get_location_of_pheromone}
         self._nests_and_orientations = {}
-        the_nest = Nest(num_ants_to_spawn, ant_spawn_period, const.NEST_PHEROMONE_INTENSITY)
+        the_nest = Nest(num_ants_to_spawn, ant_spawn_period, self._config.NEST_PHEROMONE_INTENSITY, self._config,
+                        self._rand)
         self._nests_and_orientations[the_nest] = Orientation(0.5 * float(width), 0.5 * float(height), 0.0)
         for nest, nest_orientation in self._nests_and_orientations.items():
             self._add_object_at_location(nest, nest_orientation.location)
         self._ants_and_orientations = {}
         self._pheromones_and_locations = {Pheromone.Type.FOOD: {}, Pheromone.Type.NEST: {}}
+        # Pheromone.Type -> PheromoneSamples, only kept once get_pheromone_samples has been called with numpy around
+        self._pheromone_samples = None
+        # Deposited pheromones decay lazily against the clock; the heap holds (expiry time, tie breaker, pheromone)
+        self._clock = Clock()
+        self._pheromone_expiry_queue = []
+        self._num_pheromones_deposited = 0
+        # With max_pheromones a deposit that would go over it makes room first: the pheromone that expires soonest is
+        # dropped, or with MERGE the deposit adds to a pheromone of its type in the same unit cell if there is one
+        if pheromone_overflow not in (World.PheromoneOverflow.EVICT_WEAKEST, World.PheromoneOverflow.MERGE):
+            raise ValueError('Unknown pheromone overflow policy: {}'.format(pheromone_overflow))
+        if max_pheromones is not None and use_pheromone_field:
+            raise ValueError('max_pheromones needs pheromone objects, the pheromone field\'s size is fixed')
+        self._MAX_PHEROMONES = max_pheromones
+        # (type, cell x, cell y) -> the last pheromone deposited in that cell, only kept for MERGE
+        self._pheromones_by_cell = None
+        if max_pheromones is not None and pheromone_overflow == World.PheromoneOverflow.MERGE:
+            self._pheromones_by_cell = {}
+        self._pheromone_field = None
+        if use_pheromone_field:
+            # Imported here so that numpy is only needed when the field is used
+            from universe.pheromonefield import PheromoneField, ChunkedPheromoneField
+            decay_factors = {Pheromone.Type.FOOD: self._config.ANT_FOOD_PHEROMONE_DECAY_FACTOR_PER_SEC,
+                             Pheromone.Type.NEST: self._config.ANT_NEST_PHEROMONE_DECAY_FACTOR_PER_SEC}
+            if chunk_size is None:
+                self._pheromone_field = PheromoneField(width, height, decay_factors,
+                                                       self._config.ANT_MIN_PHEROMONE_INTENSITY)
+            else:
+                # Grid memory then follows where pheromones are, which large sparse worlds need
+                self._pheromone_field = ChunkedPheromoneField(width, height, decay_factors,
+                                                              self._config.ANT_MIN_PHEROMONE_INTENSITY, chunk_size)
         self._food_sources_and_locations = {}
+        # Food and obstacles don't move, so moves are checked against them in a raster built as they are added.
+        # obstacle_cells are (x, y) pairs of unit cells, e.g. from lib.bitmap.find_dark_pixels.
+        self._collision_map = CollisionMap(width, height,
+                                           max(0.5 * self._config.ANT_LENGTH, 0.5 * self._config.ANT_WIDTH))
+        if obstacle_cells is not None:
+            self._collision_map.add_obstacle_cells(obstacle_cells)
+        self._food_delivered = 0
+        # With ant collisions, ants outside the nest are also kept in a grid of cells just over two ants wide, so
+        # that neither a move nor sensing for avoidance has to look further than the adjacent cells
+        self._ant_grid = None
+        if use_ant_collisions:
+            ant_collision_radius = max(0.5 * self._config.ANT_LENGTH, 0.5 * self._config.ANT_WIDTH)
+            self._ant_grid = SpatialHash(self._get_ant_avoidance_radius(ant_collision_radius))
+        self._instrumentation = None
+        self._recorder = None
+        self._metrics = None
+        # Scratch objects reused every tick instead of allocating new ones per ant
+        self._context_for_nest = {SensableRegion: SensableRegion()}
+        self._context_for_ant = {SensableRegion: SensableRegion(), 'in_nest': False}
+        self._attempted_location = Location(0.0, 0.0)
         for i in range(num_food_sources):
             self._spawn_food(food_min_dist_to_nest, food_min_dist_to_world_edge)
 
@@ -69,48 +141,235 @@ class World(IUpdatable):
     def get_food_sources(self):
         return self._food_sources_and_locations.keys()
 
+    def get_food_delivered(self):
+        return self._food_delivered
+
+    def get_size(self):
+        return self._width, self._height
+
+    def get_time_ms(self):
+        return self._clock.ms
+
+    def get_config(self):
+        return self._config
+
+    def get_pheromone_field(self):
+        return self._pheromone_field
+
+    def get_collision_map(self):
+        return self._collision_map
+
     def get_pheromones(self):
         return self._pheromones_and_locations[Pheromone.Type.FOOD].keys() | \
                self._pheromones_and_locations[Pheromone.Type.NEST].keys()
 
+    def get_num_pheromones(self):
+        # For the pheromone field, the number of cells holding pheromone
+        if self._pheromone_field is not None:
+            return sum(self._pheromone_field.get_num_active_cells(pheromone_type)
+                       for pheromone_type in self._pheromone_field.get_types())
+        return len(self._pheromones_and_locations[Pheromone.Type.FOOD]) + \
+            len(self._pheromones_and_locations[Pheromone.Type.NEST])
+
+    def get_pheromone_memory_estimate(self):
+        # Bytes held for pheromones. The field's grids are measured; pheromone objects are estimated from the sizes of
+        # what each one keeps alive: itself, its location, its dict entries here and in the spatial hash, and its
+        # expiry heap entry, of which merged pheromones leave an outdated one behind until its time comes.
+        if self._pheromone_field is not None:
+            return self._pheromone_field.get_memory_in_bytes()
+        bytes_per_pheromone = sys.getsizeof(Pheromone(Pheromone.Type.FOOD, None, 1.0, 1.0)) + \
+            sys.getsizeof(Location(0.0, 0.0)) + sys.getsizeof(((0, 0), Pheromone.Type.FOOD)) + \
+            sys.getsizeof((0, 0)) + 3 * self._DICT_ENTRY_BYTES
+        if self._pheromones_by_cell is not None:
+            bytes_per_pheromone += sys.getsizeof((Pheromone.Type.FOOD, 0, 0)) + self._DICT_ENTRY_BYTES
+        bytes_per_expiry_entry = sys.getsizeof((0.0, 0, None)) + sys.getsizeof(0.0) + \
+            sys.getsizeof(self._num_pheromones_deposited) + 8
+        return self.get_num_pheromones() * bytes_per_pheromone + \
+            len(self._pheromone_expiry_queue) * bytes_per_expiry_entry
+
+    def get_pheromone_samples(self, pheromone_type):
+        # Locations and current intensities of all pheromones of a type, as separate sequences for drawing them in
+        # bulk. With numpy they are arrays kept up to date from the first call on, otherwise lists built per call.
+        if self._pheromone_samples is None:
+            try:
+                from universe.pheromonesamples import PheromoneSamples
+            except ImportError:
+                pheromones_and_locations = self._pheromones_and_locations[pheromone_type]
+                xs = [location.x for location in pheromones_and_locations.values()]
+                ys = [location.y for location in pheromones_and_locations.values()]
+                intensities = [pheromone.get_intensity() for pheromone in pheromones_and_locations.keys()]
+                return xs, ys, intensities
+            self._pheromone_samples = {}
+            for samples_type, pheromones_and_locations in self._pheromones_and_locations.items():
+                samples = PheromoneSamples()
+                for pheromone, location in pheromones_and_locations.items():
+                    samples.add(pheromone, location)
+                self._pheromone_samples[samples_type] = samples
+        return self._pheromone_samples[pheromone_type].get_samples(self._clock.ms)
+
+    def add_ant(self, ant, orientation):
+        self._ants_and_orientations[ant] = orientation
+        self._add_object_at_location(ant, orientation.location)
+        if self._ant_grid is not None:
+            self._ant_grid.insert(ant, Ant, orientation.location)
+
+    def get_pheromones_and_locations(self, pheromone_type):
+        return self._pheromones_and_locations[pheromone_type].items()
+
+    def add_pheromone(self, pheromone, location):
+        if self._pheromone_field is not None:
+            self._pheromone_field.deposit(pheromone.get_type(), location, pheromone.get_intensity())
+            if self._recorder is not None:
+                self._recorder.record_deposit(pheromone, location, self._clock.ms)
+            if self._metrics is not None:
+                self._metrics.record_deposit(pheromone, location)
+            return
+        pheromone.deposit(self._clock)
+        if self._MAX_PHEROMONES is not None and self._MAX_PHEROMONES <= self.get_num_pheromones():
+            if self._pheromones_by_cell is not None and self._merge_pheromone(pheromone, location):
+                return
+            if not self._evict_weakest_pheromone(pheromone):
+                return
+        if self._recorder is not None:
+            self._recorder.record_deposit(pheromone, location, self._clock.ms)
+        if self._metrics is not None:
+            self._metrics.record_deposit(pheromone, location)
+        self._pheromones_and_locations[pheromone.get_type()][pheromone] = location
+        self._add_object_at_location(pheromone, location)
+        if self._pheromone_samples is not None:
+            self._pheromone_samples[pheromone.get_type()].add(pheromone, location)
+        if self._pheromones_by_cell is not None:
+            self._pheromones_by_cell[(pheromone.get_type(), int(location.x), int(location.y))] = pheromone
+        self._push_pheromone_expiry(pheromone)
+
     def update(self, ms_elapsed, context):
-        pheromones_to_remove = []
-        for pheromone in self.get_pheromones():
-            context_for_pheromone = {}
-            pheromone.update(ms_elapsed, context_for_pheromone)
-            if pheromone.get_intensity() < 0.01:
-                pheromones_to_remove.append(pheromone)
-        for pheromone_to_remove in pheromones_to_remove:
-            pheromone_location = self._pheromones_and_locations[pheromone_to_remove.get_type()][pheromone_to_remove]
-            self._remove_object_at_location(pheromone_to_remove, pheromone_location)
-            self._pheromones_and_locations[pheromone_to_remove.get_type()].pop(pheromone_to_remove)
+        # Timing and counting only happens when instrumentation is set, otherwise it costs one check per phase
+        instrumentation = self._instrumentation
+        if instrumentation is not None:
+            instrumentation.start_tick()
+            phase_start = time.perf_counter()
+        if self._pheromone_field is not None:
+            self._pheromone_field.update(ms_elapsed)
+        self._clock.advance(ms_elapsed)
+        num_pheromones_removed = 0
+        while self._pheromone_expiry_queue and self._pheromone_expiry_queue[0][0] < self._clock.ms:
+            expiry_time_ms, _, pheromone_to_remove = heapq.heappop(self._pheromone_expiry_queue)
+            if self._pheromones_by_cell is not None and self._is_outdated_expiry(expiry_time_ms, pheromone_to_remove):
+                continue
+            self._remove_pheromone(pheromone_to_remove)
+            num_pheromones_removed += 1
+        if instrumentation is not None:
+            instrumentation.count(Instrumentation.Counter.PHEROMONES_REMOVED, num_pheromones_removed)
+            phase_end = time.perf_counter()
+            instrumentation.add_time(Instrumentation.Phase.PHEROMONE_DECAY, phase_end - phase_start)
+            phase_start = phase_end
 
+        context_for_nest = self._context_for_nest
         for nest in self._nests_and_orientations.keys():
-            context_for_nest = {}
-            context_for_nest[SensableRegion] = self._create_sensable_region(self._nests_and_orientations[nest],
-                                                                            const.NEST_SENSING_RADIUS,
-                                                                            nest)
+            context_for_nest[SensableRegion].clear()
+            self._fill_sensable_region(context_for_nest[SensableRegion], self._nests_and_orientations[nest],
+                                       self._config.NEST_SENSING_RADIUS, nest, nest.get_sensing_query())
             possible_ant = nest.update(ms_elapsed, context_for_nest)
             if type(possible_ant) == Ant:
-                self._ants_and_orientations[possible_ant] = Orientation(self._nests_and_orientations[nest].location.x,
-                                                                        self._nests_and_orientations[nest].location.y,
-                                                                        rand.uniform(0.0, 2.0 * math.pi))
-                self._add_object_at_location(possible_ant, self._ants_and_orientations[possible_ant].location)
+                nest_location = self._nests_and_orientations[nest].location
+                self.add_ant(possible_ant, Orientation(nest_location.x,
+                                                       nest_location.y,
+                                                       self._rand.uniform(0.0, 2.0 * math.pi)))
+                if instrumentation is not None:
+                    instrumentation.count(Instrumentation.Counter.ANTS_LEFT_NEST)
+                if self._recorder is not None:
+                    self._recorder.record_nest_exit(possible_ant)
+                if self._metrics is not None:
+                    self._metrics.record_nest_exit(possible_ant)
+        if instrumentation is not None:
+            phase_end = time.perf_counter()
+            instrumentation.add_time(Instrumentation.Phase.NESTS, phase_end - phase_start)
 
         ants_to_remove = []
+        context_for_ant = self._context_for_ant
+        sensable_region = context_for_ant[SensableRegion]
         for ant in self._ants_and_orientations.keys():
-            context_for_ant = {}
-            context_for_ant[SensableRegion] = self._create_sensable_region(self._ants_and_orientations[ant],
-                                                                           const.ANT_SENSING_RANGE,
-                                                                           ant)
-            context_for_ant['in_nest'] = False
-            requested_action = ant.update(ms_elapsed, context_for_ant)
+            if instrumentation is not None:
+                phase_start = time.perf_counter()
+            # An ant whose deposit or turn around timer goes off acts on that alone, so it is not sensed for
+            requested_action = ant.update_timers(ms_elapsed)
+            if requested_action is not None:
+                if instrumentation is not None:
+                    instrumentation.count(Instrumentation.Counter.TIMER_ACTIONS)
+            else:
+                sensable_region.clear()
+                self._fill_sensable_region(sensable_region, self._ants_and_orientations[ant],
+                                           self._config.ANT_SENSING_RANGE, ant, ant.get_sensing_query())
+                if self._ant_grid is not None:
+                    self._sense_neighbouring_ants(sensable_region, self._ants_and_orientations[ant], ant)
+                if instrumentation is not None:
+                    sensing_end = time.perf_counter()
+                    instrumentation.add_time(Instrumentation.Phase.ANT_SENSING, sensing_end - phase_start)
+                    instrumentation.count(Instrumentation.Counter.ANTS_SENSING)
+                    instrumentation.count(Instrumentation.Counter.OBJECTS_SENSED,
+                                          self._count_sensed_objects(sensable_region))
+                    phase_start = time.perf_counter()
+                requested_action = ant.decide(context_for_ant)
+            if instrumentation is not None:
+                decision_end = time.perf_counter()
+                instrumentation.add_time(Instrumentation.Phase.ANT_DECISION, decision_end - phase_start)
+                phase_start = decision_end
             if type(requested_action) == EnterNest:
                 ants_to_remove.append(ant)
             self._process_ant_action(ant, requested_action, ms_elapsed)
+            if instrumentation is not None:
+                instrumentation.add_time(Instrumentation.Phase.ANT_ACTIONS, time.perf_counter() - phase_start)
+        # Don't let the scratch regions keep the last sensed objects alive until the next tick
+        sensable_region.clear()
+        context_for_nest[SensableRegion].clear()
+        if instrumentation is not None:
+            phase_start = time.perf_counter()
         for ant in ants_to_remove:
             self._remove_object_at_location(ant, self._ants_and_orientations[ant].location)
             self._ants_and_orientations.pop(ant)
+            if self._ant_grid is not None:
+                self._ant_grid.remove(ant)
+        if instrumentation is not None:
+            instrumentation.add_time(Instrumentation.Phase.ANT_ACTIONS, time.perf_counter() - phase_start)
+            instrumentation.end_tick()
+        if self._recorder is not None:
+            self._recorder.record_tick(self)
+        if self._metrics is not None:
+            self._metrics.record_tick(self)
+
+    def set_instrumentation(self, instrumentation):
+        # Pass None to switch instrumentation off again
+        self._instrumentation = instrumentation
+
+    def get_instrumentation(self):
+        return self._instrumentation
+
+    def set_recorder(self, recorder):
+        # The recorder is told about every tick and event from now on; pass None to stop recording
+        self._recorder = recorder
+        if recorder is not None:
+            recorder.attach(self)
+
+    def get_recorder(self):
+        return self._recorder
+
+    def set_metrics(self, metrics):
+        # Metrics are kept up to date from now on; pass None to stop. Unlike recorders they go into checkpoints.
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.attach(self)
+
+    def get_metrics(self):
+        return self._metrics
+
+    def __getstate__(self):
+        # Instrumentation and recorders belong to the running process, checkpoints leave them out
+        state = self.__dict__.copy()
+        state['_instrumentation'] = None
+        state['_recorder'] = None
+        # Rebuilt on demand
+        state['_pheromone_samples'] = None
+        return state
 
     def _process_ant_action(self, ant, requested_action, ms_elapsed):
         self._action_processing_methods[type(requested_action)](ant, requested_action, ms_elapsed)
@@ -126,42 +385,129 @@ class World(IUpdatable):
                       math.sin(self._ants_and_orientations[acting_ant].heading_rad) * move_action.move_speed * t
         attempted_y = self._ants_and_orientations[acting_ant].location.y + \
                       math.cos(self._ants_and_orientations[acting_ant].heading_rad) * -move_action.move_speed * t
-        attempted_location = Location(attempted_x, attempted_y)
+        attempted_location = self._attempted_location
+        attempted_location.x = attempted_x
+        attempted_location.y = attempted_y
         if attempted_location.x < 0 + acting_ant.get_collision_radius() or \
            self._width - acting_ant.get_collision_radius() < attempted_location.x or \
            attempted_location.y < 0 + acting_ant.get_collision_radius() or \
            self._height - acting_ant.get_collision_radius() < attempted_location.y:
             # Nothing left to do when move goes out of bounds
+            if self._instrumentation is not None:
+                self._instrumentation.count(Instrumentation.Counter.MOVES_OUT_OF_BOUNDS)
+            return
+        if self._ant_grid is not None and self._detect_ant_collision(acting_ant, attempted_location):
+            # Nothing left to do when a collision is detected
+            if self._instrumentation is not None:
+                self._instrumentation.count(Instrumentation.Counter.MOVES_BLOCKED_BY_ANT)
+            return
+        blocking = self._collision_map.get_blocking(attempted_x, attempted_y, acting_ant.get_collision_radius())
+        if blocking is not None:
+            # Nothing left to do when a collision is detected
+            if self._instrumentation is not None:
+                self._instrumentation.count(Instrumentation.Counter.MOVES_BLOCKED_BY_OBSTACLE
+                                            if blocking is CollisionMap.OBSTACLE
+                                            else Instrumentation.Counter.MOVES_BLOCKED_BY_FOOD)
             return
-        ##for other_ant, other_orientation in self._ants_and_orientations.items():
-        ##    if other_ant == acting_ant:
-        ##        continue
-        ##    if self._detect_collision(attempted_location, acting_ant.get_collision_radius(),
-        ##                              other_orientation.location, other_ant.get_collision_radius()):
-        ##        # Nothing left to do when a collision is detected
-        ##        return
-        for food_source, food_location in self._food_sources_and_locations.items():
-            if self._detect_collision(attempted_location, acting_ant.get_collision_radius(),
-                                      food_location, food_source.get_collision_radius()):
-                # Nothing left to do when a collision is detected
-                return
         # If we get here it means the move was valid
-        self._remove_object_at_location(acting_ant, self._ants_and_orientations[acting_ant].location)
         self._ants_and_orientations[acting_ant].location.x = attempted_location.x
         self._ants_and_orientations[acting_ant].location.y = attempted_location.y
-        self._add_object_at_location(acting_ant, self._ants_and_orientations[acting_ant].location)
+        self._objects_in_space.move(acting_ant, self._ants_and_orientations[acting_ant].location)
+        if self._ant_grid is not None:
+            self._ant_grid.move(acting_ant, self._ants_and_orientations[acting_ant].location)
+        if self._metrics is not None:
+            self._metrics.record_move(acting_ant, move_action.move_speed * t)
 
     def _process_turn_around_action(self, ant, turn_around_action, ms_elapsed):
         self._ants_and_orientations[ant].heading_rad += math.pi
 
     def _process_enter_nest_action(self, ant, enter_nest_action, ms_elapsed):
+        if ant.is_carrying_food():
+            self._food_delivered += 1
+        if self._instrumentation is not None:
+            self._instrumentation.count(Instrumentation.Counter.ANTS_ENTERED_NEST)
+        if self._recorder is not None:
+            self._recorder.record_nest_entry(ant)
+        if self._metrics is not None:
+            self._metrics.record_nest_entry(ant, ant.is_carrying_food())
         enter_nest_action.nest.enter_ant(ant)
 
     def _process_deposit_pheromone_action(self, ant, deposit_pheromone_action, ms_elapsed):
-        pheromone = deposit_pheromone_action.pheromone
-        location = copy.deepcopy(self._ants_and_orientations[ant].location)
-        self._pheromones_and_locations[pheromone.get_type()][pheromone] = location
-        self._add_object_at_location(pheromone, location)
+        self.add_pheromone(deposit_pheromone_action.pheromone,
+                           Location(self._ants_and_orientations[ant].location.x,
+                                    self._ants_and_orientations[ant].location.y))
+
+    def _push_pheromone_expiry(self, pheromone):
+        heapq.heappush(self._pheromone_expiry_queue,
+                       (pheromone.get_expiry_time_ms(self._config.ANT_MIN_PHEROMONE_INTENSITY),
+                        self._num_pheromones_deposited,
+                        pheromone))
+        self._num_pheromones_deposited += 1
+
+    def _is_outdated_expiry(self, expiry_time_ms, pheromone):
+        # A merge pushes a later expiry for the same pheromone and leaves the earlier one in the heap
+        return expiry_time_ms != pheromone.get_expiry_time_ms(self._config.ANT_MIN_PHEROMONE_INTENSITY)
+
+    def _remove_pheromone(self, pheromone):
+        pheromone_location = self._pheromones_and_locations[pheromone.get_type()].pop(pheromone)
+        self._remove_object_at_location(pheromone, pheromone_location)
+        if self._pheromone_samples is not None:
+            self._pheromone_samples[pheromone.get_type()].remove(pheromone)
+        if self._pheromones_by_cell is not None:
+            cell_key = (pheromone.get_type(), int(pheromone_location.x), int(pheromone_location.y))
+            if self._pheromones_by_cell.get(cell_key) is pheromone:
+                del self._pheromones_by_cell[cell_key]
+        if self._recorder is not None:
+            self._recorder.record_expiry(pheromone)
+        if self._metrics is not None:
+            self._metrics.record_expiry(pheromone, pheromone_location)
+
+    def _evict_weakest_pheromone(self, new_pheromone):
+        # Makes room for new_pheromone by removing the pheromone that expires soonest, which among pheromones of the
+        # same decay factor is the weakest one. Returns False when new_pheromone would expire sooner still, so that it
+        # is the one to go.
+        new_expiry_time_ms = new_pheromone.get_expiry_time_ms(self._config.ANT_MIN_PHEROMONE_INTENSITY)
+        while self._pheromone_expiry_queue:
+            expiry_time_ms, _, pheromone = self._pheromone_expiry_queue[0]
+            if self._pheromones_by_cell is not None and self._is_outdated_expiry(expiry_time_ms, pheromone):
+                heapq.heappop(self._pheromone_expiry_queue)
+                continue
+            if new_expiry_time_ms <= expiry_time_ms:
+                break
+            heapq.heappop(self._pheromone_expiry_queue)
+            self._remove_pheromone(pheromone)
+            if self._instrumentation is not None:
+                self._instrumentation.count(Instrumentation.Counter.PHEROMONES_EVICTED)
+            return True
+        if self._instrumentation is not None:
+            self._instrumentation.count(Instrumentation.Counter.PHEROMONES_DROPPED)
+        return False
+
+    def _merge_pheromone(self, new_pheromone, location):
+        # Adds new_pheromone's intensity to the pheromone of its type last deposited in the same cell, if any
+        pheromone = self._pheromones_by_cell.get((new_pheromone.get_type(), int(location.x), int(location.y)))
+        if pheromone is None:
+            return False
+        pheromone_location = self._pheromones_and_locations[pheromone.get_type()][pheromone]
+        if self._recorder is not None:
+            # Recorded as the old deposit expiring and one with the merged intensity taking its place
+            self._recorder.record_expiry(pheromone)
+        if self._metrics is not None:
+            self._metrics.record_deposit(new_pheromone, pheromone_location)
+        pheromone.reinforce(new_pheromone.get_intensity())
+        if self._pheromone_samples is not None:
+            self._pheromone_samples[pheromone.get_type()].update(pheromone)
+        if self._recorder is not None:
+            self._recorder.record_deposit(pheromone, pheromone_location, self._clock.ms)
+        self._push_pheromone_expiry(pheromone)
+        if 2 * max(self._MAX_PHEROMONES, 1) < len(self._pheromone_expiry_queue):
+            # Drop the outdated entries before they outgrow the pheromones, so the cap holds for the heap too
+            self._pheromone_expiry_queue = [entry for entry in self._pheromone_expiry_queue
+                                            if not self._is_outdated_expiry(entry[0], entry[2])]
+            heapq.heapify(self._pheromone_expiry_queue)
+        if self._instrumentation is not None:
+            self._instrumentation.count(Instrumentation.Counter.PHEROMONES_MERGED)
+        return True
 
     def _create_drawing_context_for_ant(self, ant):
         return {Orientation: self._ants_and_orientations[ant]}
@@ -180,61 +526,121 @@ class World(IUpdatable):
         loc_y = 0.0
         suitable_loc_found = False
         while not suitable_loc_found:
-            loc_x = rand.randrange(min_dist_to_world_edge, float(self._width) - min_dist_to_world_edge)
-            loc_y = rand.randrange(min_dist_to_world_edge, float(self._height) - min_dist_to_world_edge)
+            loc_x = self._rand.randrange(int(min_dist_to_world_edge), int(self._width - min_dist_to_world_edge))
+            loc_y = self._rand.randrange(int(min_dist_to_world_edge), int(self._height - min_dist_to_world_edge))
             suitable_loc_found = True
             for nest_orientation in self._nests_and_orientations.values():
                 nest_loc = nest_orientation.location
                 dist_to_this_nest_loc = ((loc_x - nest_loc.x)**2.0 + (loc_y - nest_loc.y)**2.0)**0.5
                 suitable_loc_found &= min_dist_to_nest < dist_to_this_nest_loc
-        food_source = Food(const.FOOD_WIDTH, const.FOOD_HEIGHT, const.FOOD_PHEROMONE_INTENSITY)
+            suitable_loc_found &= self._collision_map.get_obstacle_distance(loc_x, loc_y) == math.inf
+        food_source = Food(self._config.FOOD_WIDTH, self._config.FOOD_HEIGHT, self._config.FOOD_PHEROMONE_INTENSITY)
         location = Location(loc_x, loc_y)
         self._food_sources_and_locations[food_source] = location
         self._add_object_at_location(food_source, location)
+        self._collision_map.add_disc(food_source, location.x, location.y, food_source.get_collision_radius())
 
-    def _create_sensable_region(self, orientation, radius, target_object):
+    def _create_sensable_region(self, orientation, radius, target_object, sensing_query=None):
         sensable_region = SensableRegion()
-        bbox_x1 = max(0, int(orientation.location.x - radius))
-        bbox_x2 = min(self._width, math.ceil(orientation.location.x + radius))
-        bbox_y1 = max(0, int(orientation.location.y - radius))
-        bbox_y2 = min(self._height, math.ceil(orientation.location.y + radius))
-        for row in self._objects_at_locations[bbox_y1:bbox_y2]:
-            for objects_list in row[bbox_x1:bbox_x2]:
-                for world_object in objects_list:
-                    if world_object is target_object:
-                        continue
-                    loc_of_object = self._get_object_location_methods[type(world_object)](world_object)
-                    dist_of_obj = compute.euclidean_distance(orientation.location, loc_of_object)
-                    if dist_of_obj < radius:
-                        heading = compute.heading_of_line(orientation.location, loc_of_object)
-                        angle_rad = heading - orientation.heading_rad
-                        sensable_region.add_object(world_object, angle_rad, dist_of_obj)
+        self._fill_sensable_region(sensable_region, orientation, radius, target_object, sensing_query)
         return sensable_region
 
-    def _detect_collision(self, loc_a, collision_rad_a, loc_b, collision_rad_b):
-        d = compute.euclidean_distance(loc_a, loc_b)
-        return d < (collision_rad_a + collision_rad_b)
+    def _fill_sensable_region(self, sensable_region, orientation, radius, target_object, sensing_query=None):
+        # Without a query everything in range is sensed; with one, only the requested categories are looked at
+        if sensing_query is None:
+            self._sense_objects(sensable_region, orientation, radius, target_object, None, False)
+            field_categories_and_forward_flags = [(category, False) for category in self._get_field_categories()]
+        else:
+            if sensing_query.all_around_categories:
+                self._sense_objects(sensable_region, orientation, radius, target_object,
+                                    sensing_query.all_around_categories, False)
+            if sensing_query.forward_categories:
+                self._sense_objects(sensable_region, orientation, radius, target_object,
+                                    sensing_query.forward_categories, True)
+            field_categories = self._get_field_categories()
+            field_categories_and_forward_flags = \
+                [(category, False) for category in sensing_query.all_around_categories
+                 if category in field_categories] + \
+                [(category, True) for category in sensing_query.forward_categories
+                 if category in field_categories]
+        for pheromone_type, forward_only in field_categories_and_forward_flags:
+            sensable_region.add_pheromone_cells(pheromone_type,
+                                                self._pheromone_field.sense(pheromone_type, orientation, radius,
+                                                                            forward_only))
 
-    def _add_object_at_location(self, world_object, location):
-        x = int(location.x)
-        y = int(location.y)
-        if world_object not in self._objects_at_locations[y][x]:
-            self._objects_at_locations[y][x].append(world_object)
+    def _sense_objects(self, sensable_region, orientation, radius, target_object, categories, forward_only):
+        location = orientation.location
+        radius_squared = radius * radius
+        forward_x = math.sin(orientation.heading_rad)
+        forward_y = -math.cos(orientation.heading_rad)
+        half_pi = 0.5 * math.pi
+        one_and_a_half_pi = 1.5 * math.pi
+        for world_object, loc_of_object in self._objects_in_space.query(location, radius, categories):
+            # Cheap rejections first: squared distance, then the half-plane behind the sensor, and only then trig
+            d_x = loc_of_object.x - location.x
+            d_y = loc_of_object.y - location.y
+            dist_squared = d_x * d_x + d_y * d_y
+            if radius_squared <= dist_squared or world_object is target_object:
+                continue
+            if forward_only and d_x * forward_x + d_y * forward_y <= 0.0:
+                continue
+            # compute.heading_of_line(location, loc_of_object), inlined on the offsets already at hand
+            if 0.0 < d_x:
+                heading = half_pi - math.atan(-d_y / d_x)
+            elif d_x == 0.0:
+                heading = math.pi if 0.0 < d_y else 0.0
+            else:
+                heading = one_and_a_half_pi - math.atan(-d_y / d_x)
+            sensable_region.add_object(world_object, heading - orientation.heading_rad, dist_squared**0.5)
 
-    def _remove_object_at_location(self, world_object, location):
-        x = int(location.x)
-        y = int(location.y)
-        if world_object in self._objects_at_locations[y][x]:
-            self._objects_at_locations[y][x].remove(world_object)
+    def _sense_neighbouring_ants(self, sensable_region, orientation, acting_ant):
+        # Adds the ants close enough to avoid, whatever the sensing query; Ant knows what to do with them
+        location = orientation.location
+        radius = self._get_ant_avoidance_radius(acting_ant.get_collision_radius())
+        radius_squared = radius * radius
+        for other_ant, other_location in self._ant_grid.query(location, radius):
+            d_x = other_location.x - location.x
+            d_y = other_location.y - location.y
+            dist_squared = d_x * d_x + d_y * d_y
+            if radius_squared <= dist_squared or other_ant is acting_ant:
+                continue
+            sensable_region.add_object(other_ant, compute.heading_of_line(location, other_location) -
+                                       orientation.heading_rad, dist_squared**0.5)
 
-    def _get_location_of_ant(self, ant):
-        return self._ants_and_orientations[ant].location
+    def _detect_ant_collision(self, acting_ant, attempted_location):
+        # Ants that already overlap, as they do when they come out of the nest, may still move apart
+        location = self._ants_and_orientations[acting_ant].location
+        acting_radius = acting_ant.get_collision_radius()
+        for other_ant, other_location in self._ant_grid.query(attempted_location, 2.0 * acting_radius):
+            if other_ant is acting_ant:
+                continue
+            distance = compute.euclidean_distance(attempted_location, other_location)
+            if distance < acting_radius + other_ant.get_collision_radius() and \
+               distance < compute.euclidean_distance(location, other_location):
+                return True
+        return False
 
-    def _get_location_of_nest(self, nest):
-        return self._nests_and_orientations[nest].location
+    def _get_ant_avoidance_radius(self, ant_collision_radius):
+        # Ant veers away from ants within two collision radii and a bit, see Ant._calculate_heading_delta
+        return 2.0 * ant_collision_radius + 1.0
 
-    def _get_location_of_food_source(self, food_source):
-        return self._food_sources_and_locations[food_source]
+    def _count_sensed_objects(self, sensable_region):
+        return len(sensable_region.objects_and_radial_locations) + \
+            sum(len(cells) for cells in sensable_region.pheromone_cells.values())
+
+    def _get_field_categories(self):
+        if self._pheromone_field is None:
+            return ()
+        return self._pheromone_field.get_types()
+
+    def _add_object_at_location(self, world_object, location):
+        self._objects_in_space.insert(world_object, self._get_category(world_object), location)
+
+    def _remove_object_at_location(self, world_object, location):
+        self._objects_in_space.remove(world_object)
 
-    def _get_location_of_pheromone(self, pheromone):
-        return self._pheromones_and_locations[pheromone.get_type()][pheromone]
+    def _get_category(self, world_object):
+        # Pheromones are bucketed per Pheromone.Type, everything else per class
+        if type(world_object) == Pheromone:
+            return world_object.get_type()
+        return type(world_object)
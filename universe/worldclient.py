@@ -0,0 +1,68 @@
+import universe.worldprotocol as protocol
+
+import socket
+
+
+class WorldServerError(Exception):
+    # A command the server could not run; the message is the server side exception
+    pass
+
+
+class WorldClient:
+    # Blocking client for a WorldServer. The single command methods each cost one round trip; batch() sends any
+    # number of commands (built with the universe.worldprotocol *_command functions) in one.
+    def __init__(self, socket_path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._socket.close()
+
+    def batch(self, commands):
+        # Results in the order of the commands; a command that failed has a WorldServerError in its place
+        self._socket.sendall(protocol.encode_frame(list(commands)))
+        size = protocol.decode_frame_size(self._receive(protocol.FRAME_HEADER_SIZE))
+        return [WorldServerError(result['error']) if 'error' in result else result['ok']
+                for result in protocol.decode(self._receive(size))]
+
+    def create(self, parameters=None, seed=None, ms_per_tick=None, vectorized=False, metrics=False, world_id=None):
+        return self._call(protocol.create_command(parameters, seed, ms_per_tick, vectorized, metrics, world_id))
+
+    def restore(self, data=None, path=None, ms_per_tick=None, world_id=None):
+        return self._call(protocol.restore_command(data, path, ms_per_tick, world_id))
+
+    def step(self, world_id, num_ticks):
+        return self._call(protocol.step_command(world_id, num_ticks))
+
+    def get_state(self, world_id, parts=None):
+        return self._call(protocol.state_command(world_id, parts))
+
+    def checkpoint(self, world_id, path=None):
+        return self._call(protocol.checkpoint_command(world_id, path))
+
+    def destroy(self, world_id):
+        return self._call(protocol.destroy_command(world_id))
+
+    def list_worlds(self):
+        return self._call(protocol.list_command())
+
+    def _call(self, command):
+        result, = self.batch([command])
+        if type(result) == WorldServerError:
+            raise result
+        return result
+
+    def _receive(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._socket.recv(min(size - len(data), 1 << 20))
+            if not chunk:
+                raise ConnectionError('The world server closed the connection')
+            data += chunk
+        return bytes(data)
@@ -0,0 +1,194 @@
+import array
+import struct
+import sys
+
+# Messages between WorldServer and WorldClient are length prefixed frames holding one value in a small tagged binary
+# encoding: None, bools, 64 bit ints, doubles, str, bytes, lists, dicts and array.array, whose items are sent as raw
+# little endian bytes so ant orientations and pheromone grids cost no more than their size. A request is a list of
+# commands (dicts with an 'op'), the response the list of their results, each {'ok': value} or {'error': message}.
+_FRAME_HEADER = struct.Struct('<I')
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_LENGTH = struct.Struct('<I')
+_ARRAY_HEADER = struct.Struct('<cI')
+FRAME_HEADER_SIZE = _FRAME_HEADER.size
+MAX_FRAME_SIZE = 2**31
+# Lists and dicts nested deeper than this are refused rather than decoded recursively
+MAX_NESTING_DEPTH = 32
+
+
+class Op:
+    CREATE = 'create'
+    RESTORE = 'restore'
+    STEP = 'step'
+    STATE = 'state'
+    CHECKPOINT = 'checkpoint'
+    DESTROY = 'destroy'
+    LIST = 'list'
+
+
+class Part:
+    # What a STATE command can ask for
+    ANTS = 'ants'
+    PHEROMONES = 'pheromones'
+    FOOD_DELIVERED = 'food_delivered'
+    TICKS = 'ticks'
+    METRICS = 'metrics'
+
+
+def create_command(parameters=None, seed=None, ms_per_tick=None, vectorized=False, metrics=False, world_id=None):
+    # parameters are named like sweep parameters: upper case ones override universe/constants.py, lower case ones
+    # are World arguments on top of the server's defaults. Without a world_id the server picks one.
+    return {'op': Op.CREATE, 'world': world_id, 'parameters': parameters or {}, 'seed': seed,
+            'ms_per_tick': ms_per_tick, 'vectorized': vectorized, 'metrics': metrics}
+
+
+def restore_command(data=None, path=None, ms_per_tick=None, world_id=None):
+    # From checkpoint bytes (only accepted by a server that trusts its clients), or by the name of a checkpoint file
+    # in the server's checkpoint directory
+    return {'op': Op.RESTORE, 'world': world_id, 'data': data, 'path': path, 'ms_per_tick': ms_per_tick}
+
+
+def step_command(world_id, num_ticks):
+    return {'op': Op.STEP, 'world': world_id, 'ticks': num_ticks}
+
+
+def state_command(world_id, parts=None):
+    return {'op': Op.STATE, 'world': world_id, 'parts': parts}
+
+
+def checkpoint_command(world_id, path=None):
+    # Without a path the checkpoint comes back as bytes, with one it is saved under that name in the server's
+    # checkpoint directory
+    return {'op': Op.CHECKPOINT, 'world': world_id, 'path': path}
+
+
+def destroy_command(world_id):
+    return {'op': Op.DESTROY, 'world': world_id}
+
+
+def list_command():
+    return {'op': Op.LIST}
+
+
+def encode_frame(value):
+    payload = encode(value)
+    if MAX_FRAME_SIZE < len(payload):
+        raise ValueError('Message of {} bytes is too large'.format(len(payload)))
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def decode_frame_size(header):
+    size, = _FRAME_HEADER.unpack(header)
+    if MAX_FRAME_SIZE < size:
+        raise ValueError('Message of {} bytes is too large'.format(size))
+    return size
+
+
+def encode(value):
+    chunks = []
+    _encode_into(chunks, value)
+    return b''.join(chunks)
+
+
+def decode(data):
+    # Raises ValueError for anything that is not a well formed message
+    try:
+        value, offset = _decode_from(memoryview(data), 0, 0)
+    except struct.error:
+        raise ValueError('Message ends inside a value')
+    if offset != len(data):
+        raise ValueError('{} bytes left over after the message'.format(len(data) - offset))
+    return value
+
+
+def _encode_into(chunks, value):
+    # bool before int, as bools are ints too
+    if value is None:
+        chunks.append(b'N')
+    elif value is True:
+        chunks.append(b'T')
+    elif value is False:
+        chunks.append(b'F')
+    elif isinstance(value, int):
+        chunks.append(b'i' + _INT.pack(value))
+    elif isinstance(value, float):
+        chunks.append(b'd' + _FLOAT.pack(value))
+    elif isinstance(value, str):
+        encoded = value.encode('utf-8')
+        chunks.append(b's' + _LENGTH.pack(len(encoded)))
+        chunks.append(encoded)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        chunks.append(b'b' + _LENGTH.pack(len(value)))
+        chunks.append(bytes(value))
+    elif isinstance(value, array.array):
+        if sys.byteorder != 'little':
+            value = array.array(value.typecode, value)
+            value.byteswap()
+        raw = value.tobytes()
+        chunks.append(b'a' + _ARRAY_HEADER.pack(value.typecode.encode('ascii'), len(raw)))
+        chunks.append(raw)
+    elif isinstance(value, (list, tuple)):
+        chunks.append(b'l' + _LENGTH.pack(len(value)))
+        for item in value:
+            _encode_into(chunks, item)
+    elif isinstance(value, dict):
+        chunks.append(b'm' + _LENGTH.pack(len(value)))
+        for key, item in value.items():
+            _encode_into(chunks, key)
+            _encode_into(chunks, item)
+    else:
+        raise TypeError('Can\'t encode {}'.format(type(value).__name__))
+
+
+def _decode_from(data, offset, depth):
+    tag = bytes(data[offset:offset + 1])
+    offset += 1
+    if tag == b'N':
+        return None, offset
+    if tag == b'T':
+        return True, offset
+    if tag == b'F':
+        return False, offset
+    if tag == b'i':
+        return _INT.unpack_from(data, offset)[0], offset + _INT.size
+    if tag == b'd':
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+    if tag in (b's', b'b'):
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        raw = bytes(data[offset:offset + length])
+        if len(raw) != length:
+            raise ValueError('Message ends inside a value')
+        return raw.decode('utf-8') if tag == b's' else raw, offset + length
+    if tag == b'a':
+        typecode, length = _ARRAY_HEADER.unpack_from(data, offset)
+        offset += _ARRAY_HEADER.size
+        if len(data) < offset + length:
+            raise ValueError('Message ends inside a value')
+        value = array.array(typecode.decode('ascii'))
+        value.frombytes(data[offset:offset + length])
+        if sys.byteorder != 'little':
+            value.byteswap()
+        return value, offset + length
+    if tag in (b'l', b'm') and MAX_NESTING_DEPTH <= depth:
+        raise ValueError('Message nested deeper than {} levels'.format(MAX_NESTING_DEPTH))
+    if tag == b'l':
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        items = []
+        for _ in range(length):
+            item, offset = _decode_from(data, offset, depth + 1)
+            items.append(item)
+        return items, offset
+    if tag == b'm':
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        items = {}
+        for _ in range(length):
+            key, offset = _decode_from(data, offset, depth + 1)
+            if type(key) in (list, dict, array.array):
+                raise ValueError('Unhashable {} as a key'.format(type(key).__name__))
+            items[key], offset = _decode_from(data, offset, depth + 1)
+        return items, offset
+    raise ValueError('Unknown tag {!r} at offset {}'.format(tag, offset - 1))
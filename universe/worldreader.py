@@ -0,0 +1,65 @@
+from universe.pheromone import Pheromone
+
+from abc import abstractmethod, ABCMeta
+
+
+class WorldReader(metaclass=ABCMeta):
+    # The read-only part of the World interface that View draws from, for worlds that are only read, like a snapshot
+    # in shared memory or a recorded trajectory. With pheromone grids, subclasses also provide get_pheromone_grid.
+    class AntHandle:
+        def __init__(self, index):
+            self.index = index
+
+    class NestHandle:
+        def __init__(self, index):
+            self.index = index
+
+    class FoodHandle:
+        def __init__(self, index):
+            self.index = index
+
+    def __init__(self, with_pheromone_grids):
+        self._drawing_context_creation_methods = {WorldReader.AntHandle: self._create_drawing_context_for_ant,
+                                                  WorldReader.NestHandle: self._create_drawing_context_for_nest,
+                                                  WorldReader.FoodHandle: self._create_drawing_context_for_food}
+        self._pheromone_field = WorldReaderPheromoneField(self) if with_pheromone_grids else None
+
+    def get_drawing_context(self, world_object):
+        try:
+            return self._drawing_context_creation_methods[type(world_object)](world_object)
+        except KeyError:
+            return {}
+
+    def get_pheromones(self):
+        return ()
+
+    def get_pheromone_field(self):
+        return self._pheromone_field
+
+    @abstractmethod
+    def get_pheromone_samples(self, pheromone_type):
+        pass
+
+    @abstractmethod
+    def _create_drawing_context_for_ant(self, ant):
+        pass
+
+    @abstractmethod
+    def _create_drawing_context_for_nest(self, nest):
+        pass
+
+    @abstractmethod
+    def _create_drawing_context_for_food(self, food_source):
+        pass
+
+
+class WorldReaderPheromoneField:
+    # Stands in for a PheromoneField when the world read carries pheromone grids
+    def __init__(self, reader):
+        self._reader = reader
+
+    def get_grid(self, pheromone_type):
+        return self._reader.get_pheromone_grid(pheromone_type)
+
+    def get_types(self):
+        return (Pheromone.Type.NEST, Pheromone.Type.FOOD)
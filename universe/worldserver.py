@@ -0,0 +1,261 @@
+from universe.world import World
+from universe.simulation import Simulation
+from universe.sweep import split_parameters, create_world
+from universe.checkpoint import dumps_world, loads_world, save_world, load_world
+from universe.colonymetrics import ColonyMetrics
+from universe.pheromone import Pheromone
+from universe.worldprotocol import Op, Part
+import universe.worldprotocol as protocol
+
+from lib.orientation import Orientation
+
+import array
+import asyncio
+import os
+
+
+class WorldServer:
+    # Keeps any number of worlds alive in this process and runs the batched commands of its clients against them
+    # (see universe.worldprotocol), so an outer optimizer pays for imports and world construction once per trial
+    # rather than once per call. Clients are served concurrently: a long step hands the event loop back every
+    # _TICKS_PER_SLICE ticks, so the worlds of all connected clients advance in turn. Commands on one world run one
+    # at a time, in the order they arrived.
+    # Checkpoints are pickles, and unpickling runs code, so clients can only name checkpoint files inside
+    # checkpoint_directory, and restoring from bytes they send is only allowed with trust_clients. The socket is only
+    # accessible to the user running the server.
+    _TICKS_PER_SLICE = 20
+    _SOCKET_MODE = 0o600
+    _DEFAULT_PARTS = (Part.ANTS, Part.PHEROMONES, Part.FOOD_DELIVERED, Part.TICKS)
+
+    class _HostedWorld:
+        __slots__ = ('simulation', 'lock')
+
+        def __init__(self, simulation):
+            self.simulation = simulation
+            self.lock = asyncio.Lock()
+
+    def __init__(self, socket_path, base_world_parameters, ms_per_tick=100.0, checkpoint_directory=None,
+                 trust_clients=False):
+        # base_world_parameters are the World arguments every create starts from. Without a checkpoint_directory,
+        # checkpoints can only be sent as bytes.
+        self._SOCKET_PATH = socket_path
+        self._BASE_WORLD_PARAMETERS = dict(base_world_parameters)
+        self._MS_PER_TICK = ms_per_tick
+        self._CHECKPOINT_DIRECTORY = os.path.realpath(checkpoint_directory) if checkpoint_directory is not None \
+            else None
+        self._TRUST_CLIENTS = trust_clients
+        self._worlds = {}
+        self._num_worlds_created = 0
+        self._server = None
+        self._client_tasks = set()
+        self._command_methods = {Op.CREATE: self._create,
+                                 Op.RESTORE: self._restore,
+                                 Op.STEP: self._step,
+                                 Op.STATE: self._get_state,
+                                 Op.CHECKPOINT: self._checkpoint,
+                                 Op.DESTROY: self._destroy,
+                                 Op.LIST: self._list}
+        self._part_methods = {Part.ANTS: self._get_ants,
+                              Part.PHEROMONES: self._get_pheromones,
+                              Part.FOOD_DELIVERED: lambda simulation: simulation.get_world().get_food_delivered(),
+                              Part.TICKS: lambda simulation: simulation.get_ticks(),
+                              Part.METRICS: self._get_metrics}
+
+    def get_num_worlds(self):
+        return len(self._worlds)
+
+    async def start(self):
+        # A socket file left behind by a server that did not shut down cleanly would make binding fail
+        if os.path.exists(self._SOCKET_PATH):
+            os.unlink(self._SOCKET_PATH)
+        # The umask keeps the socket private from the moment it is bound, chmod states the mode outright
+        previous_umask = os.umask(0o777 & ~self._SOCKET_MODE)
+        try:
+            self._server = await asyncio.start_unix_server(self._serve_client, self._SOCKET_PATH)
+        finally:
+            os.umask(previous_umask)
+        os.chmod(self._SOCKET_PATH, self._SOCKET_MODE)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Connections that are still open would otherwise be cancelled when the event loop ends
+            for task in self._client_tasks:
+                task.cancel()
+            await asyncio.gather(*self._client_tasks, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self._SOCKET_PATH):
+                os.unlink(self._SOCKET_PATH)
+
+    async def _serve_client(self, reader, writer):
+        task = asyncio.current_task()
+        self._client_tasks.add(task)
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(protocol.FRAME_HEADER_SIZE)
+                except asyncio.IncompleteReadError:
+                    break
+                commands = protocol.decode(await reader.readexactly(protocol.decode_frame_size(header)))
+                if type(commands) != list:
+                    raise ValueError('Expected a list of commands')
+                results = []
+                for command in commands:
+                    results.append(await self._run_command(command))
+                writer.write(protocol.encode_frame(results))
+                await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            # A client that breaks the protocol or goes away mid-message loses its connection, not its worlds
+            pass
+        except asyncio.CancelledError:
+            # The server is shutting down
+            pass
+        finally:
+            self._client_tasks.discard(task)
+            writer.close()
+
+    async def _run_command(self, command):
+        try:
+            return {'ok': await self._command_methods[command['op']](command)}
+        except Exception as error:
+            return {'error': '{}: {}'.format(type(error).__name__, error)}
+
+    async def _create(self, command):
+        world_parameters, constant_overrides = split_parameters(command.get('parameters') or {})
+        world = create_world(dict(self._BASE_WORLD_PARAMETERS, **world_parameters), constant_overrides,
+                             command.get('seed'), command.get('vectorized', False))
+        if command.get('metrics', False):
+            world.set_metrics(ColonyMetrics())
+        return self._host(world, command)
+
+    async def _restore(self, command):
+        if command.get('data') is not None:
+            if not self._TRUST_CLIENTS:
+                raise PermissionError('Restoring from bytes is only allowed when the server trusts its clients')
+            world = loads_world(command['data'])
+        else:
+            world = load_world(self._get_checkpoint_path(command.get('path')))
+        if not self._is_world(world):
+            raise ValueError('The checkpoint holds a {}, not a world'.format(type(world).__name__))
+        return self._host(world, command)
+
+    async def _step(self, command):
+        ticks_left = command.get('ticks')
+        if type(ticks_left) != int or ticks_left < 0:
+            raise ValueError('ticks has to be a non-negative integer, not {!r}'.format(ticks_left))
+        hosted_world = self._worlds[command['world']]
+        simulation = hosted_world.simulation
+        async with hosted_world.lock:
+            while 0 < ticks_left:
+                ticks_left -= simulation.run(min(ticks_left, self._TICKS_PER_SLICE))
+                await asyncio.sleep(0)
+        return {'ticks': simulation.get_ticks(), 'food_delivered': simulation.get_world().get_food_delivered()}
+
+    async def _get_state(self, command):
+        hosted_world = self._worlds[command['world']]
+        async with hosted_world.lock:
+            parts = command.get('parts') or self._DEFAULT_PARTS
+            return {part: self._part_methods[part](hosted_world.simulation) for part in parts}
+
+    async def _checkpoint(self, command):
+        hosted_world = self._worlds[command['world']]
+        async with hosted_world.lock:
+            if command.get('path') is not None:
+                save_world(hosted_world.simulation.get_world(), self._get_checkpoint_path(command['path']))
+                return None
+            return dumps_world(hosted_world.simulation.get_world())
+
+    async def _destroy(self, command):
+        hosted_world = self._worlds.pop(command['world'])
+        # Let a step still running on it finish first
+        async with hosted_world.lock:
+            return None
+
+    async def _list(self, command):
+        return {world_id: {'ticks': hosted_world.simulation.get_ticks(),
+                           'food_delivered': hosted_world.simulation.get_world().get_food_delivered()}
+                for world_id, hosted_world in self._worlds.items()}
+
+    def _get_checkpoint_path(self, name):
+        # Clients name checkpoint files, the server decides where they live
+        if self._CHECKPOINT_DIRECTORY is None:
+            raise PermissionError('The server has no checkpoint directory')
+        if type(name) != str or name in ('', '.', '..') or os.path.basename(name) != name:
+            raise ValueError('{!r} is not a checkpoint file name'.format(name))
+        path = os.path.realpath(os.path.join(self._CHECKPOINT_DIRECTORY, name))
+        if os.path.dirname(path) != self._CHECKPOINT_DIRECTORY:
+            raise PermissionError('{!r} leads out of the checkpoint directory'.format(name))
+        return path
+
+    def _is_world(self, world):
+        if type(world) == World:
+            return True
+        try:
+            from universe.vectorizedworld import VectorizedWorld
+        except ImportError:
+            return False
+        return type(world) == VectorizedWorld
+
+    def _host(self, world, command):
+        world_id = command.get('world')
+        if world_id is None:
+            self._num_worlds_created += 1
+            world_id = 'world-{}'.format(self._num_worlds_created)
+        if world_id in self._worlds:
+            raise ValueError('There already is a world {}'.format(world_id))
+        ms_per_tick = command.get('ms_per_tick')
+        self._worlds[world_id] = WorldServer._HostedWorld(
+            Simulation(world, ms_per_tick if ms_per_tick is not None else self._MS_PER_TICK))
+        return world_id
+
+    def _get_ants(self, simulation):
+        # x, y and heading of every ant outside the nest, one after the other
+        world = simulation.get_world()
+        ants = array.array('d')
+        if hasattr(world, 'get_ant_orientations'):
+            xs, ys, headings = world.get_ant_orientations()
+            for x, y, heading in zip(xs.tolist(), ys.tolist(), headings.tolist()):
+                ants.extend((x, y, heading))
+            return ants
+        for ant in world.get_ants():
+            orientation = world.get_drawing_context(ant)[Orientation]
+            ants.extend((orientation.location.x, orientation.location.y, orientation.heading_rad))
+        return ants
+
+    def _get_pheromones(self, simulation):
+        # Per pheromone type, either a grid as {'width', 'height', 'cells'} with cells row by row, or for pheromone
+        # objects their {'x', 'y', 'intensity'}
+        world = simulation.get_world()
+        if not hasattr(world, 'get_pheromone_field'):
+            get_grid = world.get_pheromone_grid
+        elif world.get_pheromone_field() is not None:
+            get_grid = world.get_pheromone_field().get_grid
+        else:
+            pheromones = {}
+            for pheromone_type in (Pheromone.Type.NEST, Pheromone.Type.FOOD):
+                xs, ys, intensities = world.get_pheromone_samples(pheromone_type)
+                pheromones[pheromone_type] = {'x': array.array('f', xs),
+                                              'y': array.array('f', ys),
+                                              'intensity': array.array('f', intensities)}
+            return pheromones
+        pheromones = {}
+        for pheromone_type in (Pheromone.Type.NEST, Pheromone.Type.FOOD):
+            grid = get_grid(pheromone_type)
+            cells = array.array('f')
+            cells.frombytes(grid.astype('float32').tobytes())
+            pheromones[pheromone_type] = {'width': grid.shape[1], 'height': grid.shape[0], 'cells': cells}
+        return pheromones
+
+    def _get_metrics(self, simulation):
+        world = simulation.get_world()
+        metrics = world.get_metrics() if hasattr(world, 'get_metrics') else None
+        return metrics.get_summary() if metrics is not None else None
@@ -0,0 +1,190 @@
+from universe.pheromone import Pheromone
+from universe.worldreader import WorldReader
+from lib.location import Location
+from lib.orientation import Orientation
+
+import numpy as np
+
+
+class WorldSnapshotLayout:
+    # Snapshots live in one flat buffer: a control block followed by two snapshot slots. The control block holds the
+    # index of the latest complete slot, the slot the reader is on and a version per slot, which is odd while that
+    # slot is being written.
+    _CONTROL_LATEST_INDEX = 0
+    _CONTROL_READING_INDEX = 1
+    _CONTROL_VERSIONS = 2
+    _HEADER_TICK = 0
+    _HEADER_NUM_ANTS = 1
+    _HEADER_NUM_NESTS = 2
+    _HEADER_NUM_FOOD_SOURCES = 3
+    _HEADER_FOOD_DELIVERED = 4
+    _HEADER_NUM_PHEROMONES = 5  # One count per pheromone type from here on
+    _NUM_SLOTS = 2
+
+    def __init__(self, width, height, max_ants, max_nests, max_food_sources, max_pheromones, with_pheromone_grids):
+        self.width = width
+        self.height = height
+        self.with_pheromone_grids = with_pheromone_grids
+        pheromone_types = (Pheromone.Type.NEST, Pheromone.Type.FOOD)
+        self._slot_fields = [('header', np.int64, (self._HEADER_NUM_PHEROMONES + len(pheromone_types),)),
+                             ('ants', np.float64, (max_ants, 3)),
+                             ('nests', np.float64, (max_nests, 2)),
+                             ('food_sources', np.float64, (max_food_sources, 2)),
+                             ('pheromones', np.float32, (len(pheromone_types), max_pheromones, 3))]
+        if with_pheromone_grids:
+            self._slot_fields.append(('pheromone_grids', np.float32, (len(pheromone_types), height, width)))
+        self._CONTROL_SIZE = self._aligned(np.dtype(np.int64).itemsize * (self._CONTROL_VERSIONS + self._NUM_SLOTS))
+        self._SLOT_SIZE = sum(self._aligned(np.dtype(dtype).itemsize * int(np.prod(shape)))
+                              for _, dtype, shape in self._slot_fields)
+        self.size = self._CONTROL_SIZE + self._NUM_SLOTS * self._SLOT_SIZE
+
+    def create_control(self, buffer):
+        return np.ndarray((self._CONTROL_VERSIONS + self._NUM_SLOTS,), np.int64, buffer, 0)
+
+    def create_slots(self, buffer):
+        slots = []
+        offset = self._CONTROL_SIZE
+        for _ in range(self._NUM_SLOTS):
+            slot = {}
+            for name, dtype, shape in self._slot_fields:
+                slot[name] = np.ndarray(shape, dtype, buffer, offset)
+                offset += self._aligned(slot[name].nbytes)
+            slots.append(slot)
+        return slots
+
+    def _aligned(self, num_bytes):
+        return (num_bytes + 7) // 8 * 8
+
+
+class WorldSnapshotWriter:
+    def __init__(self, layout, buffer):
+        self._layout = layout
+        self._control = layout.create_control(buffer)
+        self._slots = layout.create_slots(buffer)
+
+    def publish(self, world, tick):
+        # The slot that is not the latest one gets overwritten, bracketed by version increments. While the reader is
+        # still on that slot nothing is published and False is returned; it will move on to the latest one first.
+        slot_index = 1 - self._control[WorldSnapshotLayout._CONTROL_LATEST_INDEX]
+        if slot_index == self._control[WorldSnapshotLayout._CONTROL_READING_INDEX]:
+            return False
+        self._control[WorldSnapshotLayout._CONTROL_VERSIONS + slot_index] += 1
+        slot = self._slots[slot_index]
+        header = slot['header']
+        header[WorldSnapshotLayout._HEADER_TICK] = tick
+        header[WorldSnapshotLayout._HEADER_FOOD_DELIVERED] = world.get_food_delivered()
+        header[WorldSnapshotLayout._HEADER_NUM_ANTS] = self._write_orientations(
+            slot['ants'], [world.get_drawing_context(ant)[Orientation] for ant in world.get_ants()])
+        header[WorldSnapshotLayout._HEADER_NUM_NESTS] = self._write_locations(
+            slot['nests'], [world.get_drawing_context(nest)[Location] for nest in world.get_nests()])
+        header[WorldSnapshotLayout._HEADER_NUM_FOOD_SOURCES] = self._write_locations(
+            slot['food_sources'], [world.get_drawing_context(food)[Location] for food in world.get_food_sources()])
+        pheromone_field = world.get_pheromone_field()
+        for pheromone_type in range(len(slot['pheromones'])):
+            num_pheromones = 0
+            if pheromone_field is not None:
+                if self._layout.with_pheromone_grids:
+                    slot['pheromone_grids'][pheromone_type] = pheromone_field.get_grid(pheromone_type)
+            else:
+                num_pheromones = self._write_samples(slot['pheromones'][pheromone_type],
+                                                     world.get_pheromone_samples(pheromone_type))
+            header[WorldSnapshotLayout._HEADER_NUM_PHEROMONES + pheromone_type] = num_pheromones
+        self._control[WorldSnapshotLayout._CONTROL_VERSIONS + slot_index] += 1
+        self._control[WorldSnapshotLayout._CONTROL_LATEST_INDEX] = slot_index
+        return True
+
+    def _write_orientations(self, array, orientations):
+        # Anything beyond the slot's capacity is left out of the snapshot
+        count = min(len(orientations), len(array))
+        for i in range(count):
+            array[i] = (orientations[i].location.x, orientations[i].location.y, orientations[i].heading_rad)
+        return count
+
+    def _write_locations(self, array, locations):
+        count = min(len(locations), len(array))
+        for i in range(count):
+            array[i] = (locations[i].x, locations[i].y)
+        return count
+
+    def _write_samples(self, array, samples):
+        xs, ys, intensities = samples
+        count = min(len(intensities), len(array))
+        array[:count, 0] = xs[:count]
+        array[:count, 1] = ys[:count]
+        array[:count, 2] = intensities[:count]
+        return count
+
+
+class WorldSnapshot(WorldReader):
+    # Reads the latest snapshot in place and offers the part of the World interface that View uses
+    def __init__(self, layout, buffer):
+        WorldReader.__init__(self, layout.with_pheromone_grids)
+        self._layout = layout
+        self._control = layout.create_control(buffer)
+        self._slots = layout.create_slots(buffer)
+        self._slot_index = 0
+        self._version = 0
+
+    def refresh(self):
+        # Switches to the latest complete snapshot. Returns False when none has been published yet.
+        slot_index = int(self._control[WorldSnapshotLayout._CONTROL_LATEST_INDEX])
+        self._control[WorldSnapshotLayout._CONTROL_READING_INDEX] = slot_index
+        version = int(self._control[WorldSnapshotLayout._CONTROL_VERSIONS + slot_index])
+        if version == 0 or version % 2 == 1:
+            self._control[WorldSnapshotLayout._CONTROL_READING_INDEX] = self._slot_index
+            return False
+        self._slot_index = slot_index
+        self._version = version
+        return True
+
+    def release(self):
+        # Drops all arrays into the buffer, which has to happen before the shared memory can be closed
+        self._control = None
+        self._slots = None
+        self._pheromone_field = None
+
+    def is_torn(self):
+        # True when the writer has started on the current slot since refresh(), so what was read may be mixed
+        return int(self._control[WorldSnapshotLayout._CONTROL_VERSIONS + self._slot_index]) != self._version
+
+    def get_tick(self):
+        return int(self._get_header()[WorldSnapshotLayout._HEADER_TICK])
+
+    def get_food_delivered(self):
+        return int(self._get_header()[WorldSnapshotLayout._HEADER_FOOD_DELIVERED])
+
+    def get_ants(self):
+        return [WorldReader.AntHandle(i) for i in range(self._get_header()[WorldSnapshotLayout._HEADER_NUM_ANTS])]
+
+    def get_nests(self):
+        return [WorldReader.NestHandle(i)
+                for i in range(self._get_header()[WorldSnapshotLayout._HEADER_NUM_NESTS])]
+
+    def get_food_sources(self):
+        return [WorldReader.FoodHandle(i)
+                for i in range(self._get_header()[WorldSnapshotLayout._HEADER_NUM_FOOD_SOURCES])]
+
+    def get_pheromone_samples(self, pheromone_type):
+        # Views into the shared buffer, nothing is copied
+        count = self._get_header()[WorldSnapshotLayout._HEADER_NUM_PHEROMONES + pheromone_type]
+        samples = self._slots[self._slot_index]['pheromones'][pheromone_type, :count]
+        return samples[:, 0], samples[:, 1], samples[:, 2]
+
+    def get_pheromone_grid(self, pheromone_type):
+        return self._slots[self._slot_index]['pheromone_grids'][pheromone_type]
+
+    def _get_header(self):
+        return self._slots[self._slot_index]['header']
+
+    def _create_drawing_context_for_ant(self, ant):
+        x, y, heading = self._slots[self._slot_index]['ants'][ant.index]
+        return {Orientation: Orientation(float(x), float(y), float(heading))}
+
+    def _create_drawing_context_for_nest(self, nest):
+        x, y = self._slots[self._slot_index]['nests'][nest.index]
+        return {Location: Location(float(x), float(y))}
+
+    def _create_drawing_context_for_food(self, food_source):
+        x, y = self._slots[self._slot_index]['food_sources'][food_source.index]
+        return {Location: Location(float(x), float(y))}
+